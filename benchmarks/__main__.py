@@ -0,0 +1,188 @@
+# benchmarks/__main__.py
+# Запуск набора бенчмарков без сети: python -m benchmarks (из корня репозитория).
+#
+#   python -m benchmarks                          # 10k, 100k и 1M свечей M5, все бенчмарки
+#   python -m benchmarks --sizes 10000 100000     # только малые размеры
+#   python -m benchmarks --only backtest pois     # фильтр по подстроке имени
+#   python -m benchmarks --compare 3adc629        # сравнить с сохраненными результатами коммита
+#
+# Время — минимум и медиана по --repeat запускам (perf_counter); пиковая память — отдельный
+# запуск под tracemalloc (его замедление не попадает во время). Результаты пишутся в
+# benchmarks/results/<коммит>.json (с суффиксом -dirty при незакоммиченных изменениях)
+# и дополняются при повторных запусках того же коммита.
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.suite import BENCHMARKS, make_data
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def git_commit():
+    """(коммит, есть ли незакоммиченные изменения) или ('unknown', False) вне git."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short=12', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD', '--', 'src', 'benchmarks', 'main.py'],
+                               cwd=root).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def measure(setup, data, repeat, memory=True):
+    """
+    Время вызова (min/median по repeat запускам), пиковая память отдельного запуска
+    и число свечей, которое обрабатывает вызов (в таймфрейме бенчмарка).
+    """
+    func, n_bars = setup(data)
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {'min_sec': min(times), 'median_sec': statistics.median(times), 'repeat': repeat, 'peak_bytes': peak,
+            'bars_measured': n_bars}
+
+
+def run_suite(sizes, names, repeat=None, memory=True, seed=0):
+    """
+    Прогоняет бенчмарки names на каждом размере sizes.
+
+    Args:
+        repeat (int, optional): Запусков на замер (по умолчанию 3, для 1M свечей и больше — 1).
+
+    Returns:
+        list: Записи {'name', 'bars', 'min_sec', 'median_sec', 'repeat', 'peak_bytes', 'bars_measured',
+              'bars_per_sec'}. bars — размер набора в свечах M5 (ключ сравнения), bars_measured
+              и bars_per_sec — в свечах таймфрейма бенчмарка (у бенчмарков M15 втрое меньше).
+    """
+    results = []
+    for n_bars in sizes:
+        started = time.perf_counter()
+        data = make_data(n_bars, seed=seed)
+        print(f"\n{n_bars} свечей M5 ({len(data['context'])} M15): данные за {time.perf_counter() - started:.1f} с")
+        runs = repeat if repeat is not None else (1 if n_bars >= 1_000_000 else 3)
+        for name in names:
+            row = {'name': name, 'bars': n_bars}
+            row.update(measure(BENCHMARKS[name], data, runs, memory=memory))
+            row['bars_per_sec'] = row['bars_measured'] / row['min_sec'] if row['min_sec'] > 0 else float('nan')
+            peak = f"{row['peak_bytes'] / 2 ** 20:9.1f} МБ" if row['peak_bytes'] is not None else ''
+            print(f"  {name:<56} {row['min_sec']:9.4f} с {row['bars_per_sec']:14,.0f} свечей/с {peak}")
+            results.append(row)
+        del data
+    return results
+
+
+def save_results(results, commit, dirty, directory=RESULTS_DIR):
+    """Дописывает результаты в JSON коммита (замеры с тем же именем и размером заменяются)."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{commit}{'-dirty' if dirty else ''}.json")
+    stored = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            stored = json.load(f)
+    merged = {(row['name'], row['bars']): row for row in stored.get('results', [])}
+    merged.update({(row['name'], row['bars']): row for row in results})
+    data = {
+        'commit': commit,
+        'dirty': dirty,
+        'updated': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPU)",
+        'results': sorted(merged.values(), key=lambda row: (row['bars'], row['name'])),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_results(reference, directory=RESULTS_DIR):
+    """Результаты по пути к файлу или по префиксу коммита (файл в benchmarks/results)."""
+    path = reference
+    if not os.path.exists(path):
+        matches = sorted(name for name in os.listdir(directory) if name.startswith(reference)) \
+            if os.path.isdir(directory) else []
+        if not matches:
+            raise FileNotFoundError(f"Нет сохраненных результатов для {reference} в {directory}")
+        path = os.path.join(directory, matches[0])
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, reference):
+    """Таблица отношения времени к эталону (> 1 — стало медленнее)."""
+    base = {(row['name'], row['bars']): row for row in reference['results']}
+    rows = []
+    for row in results:
+        ref = base.get((row['name'], row['bars']))
+        if ref is None:
+            continue
+        rows.append({
+            'name': row['name'], 'bars': row['bars'],
+            'ref_sec': ref['min_sec'], 'sec': row['min_sec'], 'time_ratio': row['min_sec'] / ref['min_sec'],
+            'memory_ratio': (row['peak_bytes'] / ref['peak_bytes']
+                             if row.get('peak_bytes') and ref.get('peak_bytes') else float('nan')),
+        })
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Бенчмарки src.core и бэктеста")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Размеры в свечах M5")
+    parser.add_argument('--only', nargs='+', default=None, help="Подстроки имен бенчмарков")
+    parser.add_argument('--repeat', type=int, default=None, help="Запусков на замер")
+    parser.add_argument('--no-memory', action='store_true', help="Не замерять пиковую память")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compare', default=None, help="Коммит (префикс) или JSON для сравнения")
+    parser.add_argument('--no-save', action='store_true', help="Не сохранять результаты")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.only is None or any(part in name for part in args.only)]
+    if not names:
+        print(f"Нет бенчмарков для {args.only}. Доступны: {', '.join(BENCHMARKS)}")
+        return 1
+
+    commit, dirty = git_commit()
+    print(f"Коммит {commit}{' (есть изменения)' if dirty else ''}, Python {platform.python_version()}, "
+          f"NumPy {np.__version__}, pandas {pd.__version__}")
+    results = run_suite(args.sizes, names, repeat=args.repeat, memory=not args.no_memory, seed=args.seed)
+
+    if not args.no_save:
+        print(f"\nРезультаты сохранены в {save_results(results, commit, dirty)}")
+    if args.compare:
+        table = compare(results, load_results(args.compare))
+        print(f"\nСравнение с {args.compare} (time_ratio > 1 — медленнее):")
+        print(table.to_string(index=False, float_format='{:.3f}'.format) if not table.empty else "Нет общих замеров")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
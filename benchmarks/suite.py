@@ -0,0 +1,186 @@
+# benchmarks/suite.py
+# Набор бенчмарков: примитивы src.core (векторные и вызываемые на каждой свече),
+# фильтр сессий, ресемплинг и полный прогон бэктеста. Каждый бенчмарк — функция
+# setup(data) -> (callable, свечей): подготовка (данные, ATR) не входит в замер, замеряется
+# вызов; свечей — сколько свечей своего таймфрейма (M5 или M15) обрабатывает вызов,
+# по ним считается скорость.
+import contextlib
+import io
+
+from src.backtest.engine import BacktestEngine, ListSignalSink, index_to_utc_datetimes
+from src.backtest.optimizer import min_context_bars_for
+from src.config import get_strategy_config_params
+from src.core.amd_cycle import find_accumulation_ranges, label_amd_phases
+from src.core.bars import BarSeries
+from src.core.indicators import atr
+from src.core.liquidity import identify_significant_liquidity_levels, liquidity_levels_batch
+from src.core.market_structure import get_swing_highs_lows
+from src.core.poi_registry import POIRegistry
+from src.core.pois import find_fvg, scan_fvgs
+from src.strategies.amd_smc_strategy import AmdSMCStrategy
+from src.utils.resampling import resample_ohlcv
+from src.utils.time_utils import get_session_calendar, interval_to_timedelta, is_within_trading_session
+
+from benchmarks.synthetic import synthetic_ohlcv
+
+EXECUTION_INTERVAL = "5min"
+CONTEXT_INTERVAL = "15min"
+LIQUIDITY_LOOKBACK = 100 # Свечей M15 в окне identify_significant_liquidity_levels
+
+
+def make_data(n_bars, seed=0):
+    """Данные одного размера: n_bars свечей M5, M15 из них, ATR обоих таймфреймов."""
+    df_execution = synthetic_ohlcv(n_bars, freq=EXECUTION_INTERVAL, seed=seed)
+    df_context = resample_ohlcv(df_execution, CONTEXT_INTERVAL, EXECUTION_INTERVAL)
+    df_execution = df_execution[df_execution.index >= df_context.index.min()]
+    execution = BarSeries.from_dataframe(df_execution)
+    context = BarSeries.from_dataframe(df_context)
+    config = get_strategy_config_params()
+    return {
+        'df_execution': df_execution,
+        'df_context': df_context,
+        'execution': execution,
+        'context': context,
+        'atr_execution': atr(execution['High'], execution['Low'], execution['Close']),
+        'atr_context': atr(context['High'], context['Low'], context['Close']),
+        'config': config,
+    }
+
+
+def _bench_atr(data):
+    bars = data['execution']
+    return (lambda: atr(bars['High'], bars['Low'], bars['Close'])), len(bars)
+
+
+def _bench_resample(data):
+    df = data['df_execution']
+    return (lambda: resample_ohlcv(df, CONTEXT_INTERVAL, EXECUTION_INTERVAL)), len(df)
+
+
+def _bench_swing_points(data):
+    df = data['df_execution']
+    return (lambda: get_swing_highs_lows(df)), len(df)
+
+
+def _bench_scan_fvgs(data):
+    bars = data['execution']
+    atr_values = data['atr_execution']
+    return (lambda: scan_fvgs(bars['High'], bars['Low'], atr_values, fvg_min_size_atr_factor=0.1)), len(bars)
+
+
+def _bench_find_fvg_per_bar(data):
+    # Как в стратегии до векторизации: проверка FVG на каждой свече
+    bars = data['execution']
+    atr_values = data['atr_execution']
+
+    def run():
+        for i in range(2, len(bars)):
+            find_fvg(bars, i, True, 0.1, atr_values)
+    return run, len(bars)
+
+
+def _bench_liquidity_levels_per_bar(data):
+    # Уровни BSL/SSL на каждой закрытой M15 по срезу истории (BarSeries-view)
+    bars = data['context']
+
+    def run():
+        for stop in range(LIQUIDITY_LOOKBACK, len(bars) + 1):
+            identify_significant_liquidity_levels(bars[:stop], LIQUIDITY_LOOKBACK, num_levels=3)
+    return run, len(bars)
+
+
+def _bench_liquidity_levels_batch(data):
+    bars = data['context']
+    return (lambda: liquidity_levels_batch(bars['High'], bars['Low'], LIQUIDITY_LOOKBACK, num_levels=3)), len(bars)
+
+
+def _bench_session_check_per_bar(data):
+    times = index_to_utc_datetimes(data['execution'].index)
+    sessions = data['config']['TRADING_SESSIONS_UTC']
+
+    def run():
+        for current_time in times:
+            is_within_trading_session(current_time, sessions)
+    return run, len(times)
+
+
+def _bench_session_calendar_lookup(data):
+    times = index_to_utc_datetimes(data['execution'].index)
+    lookup = get_session_calendar(data['config']['TRADING_SESSIONS_UTC']).lookup
+
+    def run():
+        for current_time in times:
+            lookup(current_time)
+    return run, len(times)
+
+
+def _bench_session_mask(data):
+    index = data['execution'].index
+    calendar = get_session_calendar(data['config']['TRADING_SESSIONS_UTC'])
+    return (lambda: calendar.in_session_mask(index)), len(index)
+
+
+def _bench_accumulation_ranges(data):
+    bars = data['context']
+    atr_values = data['atr_context']
+    return (lambda: find_accumulation_ranges(bars['High'], bars['Low'], bars['Close'], atr_values)), len(bars)
+
+
+def _bench_label_amd_phases(data):
+    bars = data['context']
+    atr_values = data['atr_context']
+
+    def run():
+        return label_amd_phases(bars['High'], bars['Low'], bars['Close'], atr_values, recovery_bars=3,
+                                sweep_depth_atr_factor=0.1)
+    return run, len(bars)
+
+
+def _bench_poi_registry(data):
+    bars = data['execution']
+    rows = list(zip(range(len(bars)), bars['Open'].tolist(), bars['High'].tolist(), bars['Low'].tolist(),
+                    bars['Close'].tolist(), data['atr_execution'].tolist()))
+
+    def run():
+        registry = POIRegistry(fvg_min_size_atr_factor=0.1)
+        for position, open_price, high, low, close, atr_value in rows:
+            registry.update(position, high, low, close, atr_value=atr_value, open_price=open_price)
+    return run, len(rows)
+
+
+def _bench_backtest(data):
+    # Полный прогон: стратегия (ATR передается готовым) + движок с фильтром сессий
+    config = data['config']
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            strategy = AmdSMCStrategy(data['context'], data['execution'], config,
+                                      atr_context=data['atr_context'], atr_execution=data['atr_execution'])
+            engine = BacktestEngine(
+                strategy, data['execution'], data['context'], signal_sink=ListSignalSink(),
+                min_context_bars=min_context_bars_for(config),
+                session_calendar=strategy.session_calendar if config.get('FILTER_BY_TRADING_SESSIONS') else None,
+                context_bar_duration=interval_to_timedelta(CONTEXT_INTERVAL),
+                execution_bar_duration=interval_to_timedelta(EXECUTION_INTERVAL),
+            )
+            return engine.run()
+    return run, len(data['execution'])
+
+
+# Имя -> setup. Имена стабильны: по ним сравниваются результаты разных коммитов
+BENCHMARKS = {
+    'indicators.atr': _bench_atr,
+    'resampling.resample_ohlcv': _bench_resample,
+    'market_structure.get_swing_highs_lows': _bench_swing_points,
+    'pois.scan_fvgs': _bench_scan_fvgs,
+    'pois.find_fvg_per_bar': _bench_find_fvg_per_bar,
+    'liquidity.identify_significant_liquidity_levels_per_bar': _bench_liquidity_levels_per_bar,
+    'liquidity.liquidity_levels_batch': _bench_liquidity_levels_batch,
+    'time_utils.is_within_trading_session_per_bar': _bench_session_check_per_bar,
+    'time_utils.session_calendar_lookup_per_bar': _bench_session_calendar_lookup,
+    'time_utils.in_session_mask': _bench_session_mask,
+    'amd_cycle.find_accumulation_ranges': _bench_accumulation_ranges,
+    'amd_cycle.label_amd_phases': _bench_label_amd_phases,
+    'poi_registry.update_per_bar': _bench_poi_registry,
+    'backtest.engine_run': _bench_backtest,
+}
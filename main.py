@@ -1,85 +1,89 @@
 # main.py
+import asyncio
 import os
 import pandas as pd
 from datetime import datetime, timedelta
 
-from src.utils.data_loader import load_historical_data_twelvedata
+from src.utils.data_loader import TwelveDataFetcher
+from src.utils.data_cache import OHLCVCache
+from src.utils.history_downloader import ChunkedFetcher
+from src.utils.resampling import resample_ohlcv
+from src.utils.time_utils import interval_to_timedelta
 from src.strategies.amd_smc_strategy import AmdSMCStrategy
+from src.backtest.engine import BacktestEngine, ListSignalSink
+from src.backtest.portfolio import prefetch_symbols, run_portfolio_backtest
+from src.backtest.simulator import compute_metrics, simulate_trades
+from src.core.bars import BarSeries
+from src.live.runner import LiveRunner, ReplayFeed
 from src.config import (
     TRADING_PAIR, TIMEFRAME_CONTEXT, TIMEFRAME_EXECUTION, TWELVE_DATA_API_KEY,
-    # Импортируем все параметры, которые могут понадобиться стратегии
-    TRADING_SESSIONS_UTC, FILTER_BY_TRADING_SESSIONS,
-    ACC_DIST_BARS_MIN, ACC_DIST_BARS_MAX, ACC_DIST_VOLATILITY_THRESHOLD, ACC_DIST_PRIOR_TREND_LOOKBACK,
-    MANIPULATION_SWEEP_DEPTH_ATR_FACTOR, MANIPULATION_RECOVERY_BARS,
-    CHOSHBOS_IMPULSE_ATR_FACTOR,
-    POI_DISCOUNT_THRESHOLD, POI_PREMIUM_THRESHOLD, FVG_MIN_SIZE_ATR_FACTOR,
-    SL_ATR_MULTIPLIER_EXECUTION, SL_OFFSET_POINTS, TAKE_PROFIT_RR_RATIO
+    DATA_CACHE_DIR, BACKTEST_HISTORY_DAYS,
+    HISTORY_BARS_PER_REQUEST, HISTORY_DOWNLOAD_MAX_WORKERS, HISTORY_DOWNLOAD_CALLS_PER_MINUTE,
+    HISTORY_DOWNLOAD_MAX_RETRIES,
+    FILTER_BY_TRADING_SESSIONS, get_strategy_config_params,
+    TRADING_PAIRS, RUN_PORTFOLIO_BACKTEST, PORTFOLIO_MAX_WORKERS, RUN_LIVE_REPLAY, LIVE_REPLAY_BARS,
+    RISK_PER_TRADE_FRACTION, MAX_HOLDING_BARS_EXECUTION, PROFILING_OUTPUT_JSON
 )
 
+def build_data_cache():
+    """Локальный кэш свечей; без API ключа работаем только с тем, что уже лежит в кэше."""
+    fetcher = None
+    if not TWELVE_DATA_API_KEY or TWELVE_DATA_API_KEY == "YOUR_TWELVE_DATA_API_KEY_PLACEHOLDER":
+        print("ПРЕДУПРЕЖДЕНИЕ: API ключ для Twelve Data не настроен, используются только данные из локального кэша.")
+    else:
+        # История длиннее одного outputsize качается окнами по датам с лимитом запросов
+        fetcher = ChunkedFetcher(
+            TwelveDataFetcher(api_key=TWELVE_DATA_API_KEY, outputsize=HISTORY_BARS_PER_REQUEST),
+            bars_per_request=HISTORY_BARS_PER_REQUEST,
+            max_workers=HISTORY_DOWNLOAD_MAX_WORKERS,
+            max_calls_per_minute=HISTORY_DOWNLOAD_CALLS_PER_MINUTE,
+            max_retries=HISTORY_DOWNLOAD_MAX_RETRIES,
+        )
+    return OHLCVCache(DATA_CACHE_DIR, fetcher=fetcher)
+
 def run_strategy_backtest():
     print("Запуск бэктеста стратегии AMD SMC с двумя таймфреймами...")
 
-    if not TWELVE_DATA_API_KEY or TWELVE_DATA_API_KEY == "YOUR_TWELVE_DATA_API_KEY_PLACEHOLDER":
-        print("ОШИБКА: API ключ для Twelve Data не настроен.")
-        return
+    cache = build_data_cache()
 
     # Собираем все параметры конфигурации в один словарь для передачи в стратегию
-    strategy_config_params = {
-        "FILTER_BY_TRADING_SESSIONS": FILTER_BY_TRADING_SESSIONS,
-        "TRADING_SESSIONS_UTC": TRADING_SESSIONS_UTC,
-        "ACC_DIST_BARS_MIN": ACC_DIST_BARS_MIN,
-        "ACC_DIST_BARS_MAX": ACC_DIST_BARS_MAX,
-        "ACC_DIST_VOLATILITY_THRESHOLD": ACC_DIST_VOLATILITY_THRESHOLD,
-        "ACC_DIST_PRIOR_TREND_LOOKBACK": ACC_DIST_PRIOR_TREND_LOOKBACK,
-        "MANIPULATION_SWEEP_DEPTH_ATR_FACTOR": MANIPULATION_SWEEP_DEPTH_ATR_FACTOR,
-        "MANIPULATION_RECOVERY_BARS": MANIPULATION_RECOVERY_BARS,
-        "CHOSHBOS_IMPULSE_ATR_FACTOR": CHOSHBOS_IMPULSE_ATR_FACTOR,
-        "POI_DISCOUNT_THRESHOLD": POI_DISCOUNT_THRESHOLD,
-        "POI_PREMIUM_THRESHOLD": POI_PREMIUM_THRESHOLD,
-        "FVG_MIN_SIZE_ATR_FACTOR": FVG_MIN_SIZE_ATR_FACTOR,
-        "SL_ATR_MULTIPLIER_EXECUTION": SL_ATR_MULTIPLIER_EXECUTION,
-        "SL_OFFSET_POINTS": SL_OFFSET_POINTS,
-        "TAKE_PROFIT_RR_RATIO": TAKE_PROFIT_RR_RATIO,
-        # Добавьте другие параметры из config.py по мере необходимости
-    }
-
-    # 1. Загрузка данных для обоих таймфреймов
-    # Увеличьте outputsize для достаточной истории
-    print(f"Загрузка данных M15 ({TIMEFRAME_CONTEXT}) для {TRADING_PAIR}...")
-    data_m15 = load_historical_data_twelvedata(
-        api_key=TWELVE_DATA_API_KEY,
-        symbol=TRADING_PAIR,
-        interval=TIMEFRAME_CONTEXT,
-        outputsize=1500 # Примерно 15 дней для M15
-    )
-    if data_m15 is None or data_m15.empty:
-        print(f"Не удалось загрузить данные M15 для {TRADING_PAIR}.")
-        return
+    # (список параметров — STRATEGY_PARAM_NAMES в src/config.py)
+    strategy_config_params = get_strategy_config_params()
 
+    # 1. Загрузка базового ряда M5
+    # Из сети догружается только то, чего нет в кэше (голова и хвост диапазона)
+    history_start = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=BACKTEST_HISTORY_DAYS)
     print(f"Загрузка данных M5 ({TIMEFRAME_EXECUTION}) для {TRADING_PAIR}...")
-    data_m5 = load_historical_data_twelvedata(
-        api_key=TWELVE_DATA_API_KEY,
-        symbol=TRADING_PAIR,
-        interval=TIMEFRAME_EXECUTION,
-        outputsize=4500 # Столько же по времени, 15 дней * 3 (M15/M5)
-    )
+    try:
+        data_m5 = cache.get(TRADING_PAIR, TIMEFRAME_EXECUTION, start=history_start)
+    except RuntimeError as e:
+        print(f"Ошибка загрузки данных M5: {e}")
+        return
     if data_m5 is None or data_m5.empty:
         print(f"Не удалось загрузить данные M5 для {TRADING_PAIR}.")
         return
-    
-    print(f"Данные M15: {len(data_m15)} свечей, M5: {len(data_m5)} свечей.")
 
-    # 2. Инициализация стратегии
-    strategy = AmdSMCStrategy(df_context=data_m15, df_execution=data_m5, config_params=strategy_config_params)
+    # 2. Контекст M15 строится из тех же M5 (только закрытые свечи), поэтому ряды
+    # всегда согласованы и отдельная загрузка M15 не нужна
+    data_m15 = resample_ohlcv(data_m5, TIMEFRAME_CONTEXT, TIMEFRAME_EXECUTION)
+    if data_m15.empty:
+        print(f"Недостаточно данных M5 для построения M15 для {TRADING_PAIR}.")
+        return
+    print(f"Данные M15: {len(data_m15)} свечей (из M5), M5: {len(data_m5)} свечей.")
+
+    # M5 до первой полной свечи M15 не нужны
+    data_m5_aligned = data_m5[data_m5.index >= data_m15.index.min()]
+
+    # Компактные массивы свечей вместо DataFrame; одни и те же объекты получают стратегия и движок
+    bars_m15 = BarSeries.from_dataframe(data_m15)
+    bars_m5 = BarSeries.from_dataframe(data_m5_aligned)
+
+    # 3. Инициализация стратегии
+    # Стратегия получает те же M5 данные, что и движок: позиции свечей (Bar.position) совпадают с ATR и реестром POI
+    strategy = AmdSMCStrategy(df_context=bars_m15, df_execution=bars_m5, config_params=strategy_config_params)
     print("Стратегия инициализирована.")
 
-    # 3. Цикл по свечам M5 для бэктестинга
-    # Убедимся, что начинаем с момента, когда есть достаточно истории на M15
-    # Найдем общую начальную дату, чтобы синхронизировать данные
-    common_start_time = max(data_m15.index.min(), data_m5.index.min())
-    
-    # Отфильтруем данные, чтобы они начинались с общего времени
-    data_m5_aligned = data_m5[data_m5.index >= common_start_time]
+    # 4. Цикл по свечам M5 для бэктестинга
     
     # Начальный lookback для M15 (например, ACC_DIST_PRIOR_TREND_LOOKBACK + ACC_DIST_BARS_MAX)
     # чтобы у стратегии было достаточно данных для анализа M15 контекста с первой же M5 свечи.
@@ -88,34 +92,90 @@ def run_strategy_backtest():
     min_m15_history_needed_for_start = strategy_config_params.get("ACC_DIST_PRIOR_TREND_LOOKBACK", 100) + \
                                        strategy_config_params.get("ACC_DIST_BARS_MAX", 50)
 
-    signals_generated = []
+    # Прогон стратегии движком бэктеста: OHLCV переводится в массивы один раз,
+    # срез M15 берется по заранее посчитанной позиции (только свечи M15, закрывшиеся к закрытию свечи M5)
+    signal_sink = ListSignalSink(verbose=True)
+    engine = BacktestEngine(
+        strategy, bars_m5, bars_m15,
+        signal_sink=signal_sink,
+        min_context_bars=min_m15_history_needed_for_start,
+        # Свечи вне торговых сессий отсекаются одной маской по всему индексу
+        session_calendar=strategy.session_calendar if FILTER_BY_TRADING_SESSIONS else None,
+        context_bar_duration=interval_to_timedelta(TIMEFRAME_CONTEXT),
+        execution_bar_duration=interval_to_timedelta(TIMEFRAME_EXECUTION),
+    )
 
     print(f"\nНачало бэктеста по свечам M5 с {data_m5_aligned.index.min()}...")
-    for m5_candle_timestamp, m5_candle in data_m5_aligned.iterrows():
-        # Получаем актуальный срез данных M15 до текущего времени M5
-        # ВАЖНО: m15_slice должен содержать только ЗАКРЫТЫЕ M15 свечи
-        # То есть, если m5_candle в 10:05, последняя закрытая M15 свеча - это 10:00.
-        # Если m5_candle в 10:15, то M15 свеча 10:15 только что закрылась.
-        
-        # Округляем время M5 свечи вниз до ближайшего M15 интервала
-        # (или берем M15 свечи, чье время <= времени M5 свечи)
-        m15_slice_end_time = m5_candle_timestamp
-        m15_relevant_slice = data_m15[data_m15.index <= m15_slice_end_time]
-
-        if len(m15_relevant_slice) < min_m15_history_needed_for_start:
-            continue # Недостаточно истории M15 для анализа
-
-        # Передаем текущее время UTC (время закрытия M5 свечи)
-        current_utc_time = pd.to_datetime(m5_candle_timestamp).tz_localize('UTC') # Убедимся, что UTC
-
-        signal = strategy.process_new_candle(current_utc_time, m5_candle, m15_relevant_slice)
-        
-        if signal:
-            signals_generated.append(signal)
-            print(f"Сгенерирован сигнал: {signal}")
+    summary = engine.run()
+    signals_generated = signal_sink.signals
 
     print(f"\nБэктест завершен. Всего сигналов: {len(signals_generated)}")
-    # Дальнейший анализ сигналов...
+    print(f"Обработано свечей M5: {summary['bars_processed']} из {summary['bars_total']} "
+          f"за {summary['elapsed_sec']:.2f} с ({summary['bars_per_sec']:.0f} свечей/с)")
+    if strategy.profiler is not None:
+        strategy.profiler.finish(summary)
+        strategy.profiler.print_summary()
+        if PROFILING_OUTPUT_JSON:
+            strategy.profiler.save_json(PROFILING_OUTPUT_JSON, pair=TRADING_PAIR, timeframe=TIMEFRAME_EXECUTION,
+                                        start=summary['start'], end=summary['end'])
+            print(f"Итоги профилирования сохранены в {PROFILING_OUTPUT_JSON}")
+
+    # 5. Исполнение сигналов на свечах M5 и метрики
+    trades = simulate_trades(signals_generated, bars_m5, max_holding_bars=MAX_HOLDING_BARS_EXECUTION)
+    metrics = compute_metrics(trades, risk_fraction=RISK_PER_TRADE_FRACTION)
+    print_trade_metrics(metrics)
+
+def print_trade_metrics(metrics):
+    print(f"Сделок: {metrics['trades']}")
+    if not metrics['trades']:
+        return
+    print(f"Винрейт: {metrics['win_rate']:.1%} | Матожидание: {metrics['expectancy_r']:.2f}R | "
+          f"Итого: {metrics['total_r']:.2f}R | Profit factor: {metrics['profit_factor']:.2f}")
+    print(f"Средний выигрыш: {metrics['avg_win_r']:.2f}R | Средний проигрыш: {metrics['avg_loss_r']:.2f}R | "
+          f"Макс. просадка: {metrics['max_drawdown_r']:.2f}R")
+    if 'final_equity' in metrics:
+        print(f"Капитал (риск {RISK_PER_TRADE_FRACTION:.1%} на сделку): x{metrics['final_equity']:.3f}, "
+              f"макс. просадка {metrics['max_drawdown_pct']:.1%}")
+
+def run_portfolio():
+    print(f"Запуск портфельного бэктеста по {len(TRADING_PAIRS)} символам: {', '.join(TRADING_PAIRS)}")
+    history_start = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=BACKTEST_HISTORY_DAYS)
+
+    # Сеть — только в этом процессе (лимит запросов общий), воркеры читают готовый кэш
+    cache = build_data_cache()
+    if cache.fetcher is not None:
+        prefetch_symbols(cache, TRADING_PAIRS, TIMEFRAME_EXECUTION, start=history_start)
+
+    result = run_portfolio_backtest(
+        TRADING_PAIRS, DATA_CACHE_DIR, get_strategy_config_params(),
+        TIMEFRAME_CONTEXT, TIMEFRAME_EXECUTION,
+        start=history_start, max_workers=PORTFOLIO_MAX_WORKERS
+    )
+    print(f"\nПортфельный бэктест завершен. Всего сигналов: {len(result['signals'])}")
+    if not result['summary'].empty:
+        print(result['summary'].to_string(index=False))
+
+def run_live_replay():
+    print(f"Проигрывание последних {LIVE_REPLAY_BARS} свечей M5 {TRADING_PAIR} через live-режим...")
+    history_start = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=BACKTEST_HISTORY_DAYS)
+    try:
+        data_m5 = build_data_cache().get(TRADING_PAIR, TIMEFRAME_EXECUTION, start=history_start)
+    except RuntimeError as e:
+        print(f"Ошибка загрузки данных M5: {e}")
+        return
+    if data_m5 is None or len(data_m5) <= LIVE_REPLAY_BARS:
+        print(f"Недостаточно данных M5 для {TRADING_PAIR}.")
+        return
+
+    # История до потока обрабатывается пакетно, хвост подается по одной свече как из websocket
+    runner = LiveRunner(get_strategy_config_params(), data_m5.iloc[:-LIVE_REPLAY_BARS],
+                        execution_interval=TIMEFRAME_EXECUTION, context_interval=TIMEFRAME_CONTEXT,
+                        signal_sink=ListSignalSink(verbose=True))
+    summary = asyncio.run(runner.run(ReplayFeed(data_m5.iloc[-LIVE_REPLAY_BARS:])))
+    latency = summary['latency']
+    print(f"\nLive-проигрывание завершено. Свечей: {summary['bars_processed']}, сигналов: {summary['signals']}")
+    print(f"Задержка решения, мкс: p50 {latency['p50_us']:.0f} | p99 {latency['p99_us']:.0f} | "
+          f"макс. {latency['max_us']:.0f}")
 
 if __name__ == "__main__":
     # Для отладки путей и загрузки .env
@@ -124,4 +184,9 @@ if __name__ == "__main__":
     env_p = os.path.join(project_r, '.env')
     print(f"Ожидаемый путь к .env: {env_p}, существует ли: {os.path.exists(env_p)}")
     
-    run_strategy_backtest()
+    if RUN_PORTFOLIO_BACKTEST:
+        run_portfolio()
+    elif RUN_LIVE_REPLAY:
+        run_live_replay()
+    else:
+        run_strategy_backtest()
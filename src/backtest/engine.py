@@ -0,0 +1,195 @@
+# src/backtest/engine.py
+# Событийный движок бэктеста: прогоняет стратегию по свечам исполнения (M5)
+# без DataFrame.iterrows и построения pd.Series на каждую свечу.
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.core.bars import OHLCV_COLUMNS, Bar, as_bar_series
+from src.utils.context_alignment import ContextCursor
+
+
+def index_to_utc_datetimes(index):
+    """Переводит индекс в массив timezone-aware datetime (UTC). Наивный индекс считается UTC."""
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    else:
+        index = index.tz_convert('UTC')
+    return index.to_pydatetime()
+
+
+class ListSignalSink:
+    """Приемник сигналов по умолчанию: складывает сигналы в список."""
+
+    def __init__(self, verbose=False):
+        self.signals = []
+        self.verbose = verbose
+
+    def __call__(self, signal):
+        self.signals.append(signal)
+        if self.verbose:
+            print(f"Сгенерирован сигнал: {signal}")
+
+
+class BacktestEngine:
+    """
+    Прогоняет стратегию по свечам исполнения.
+
+    Оба таймфрейма один раз переводятся в BarSeries, позиции контекстных свечей считаются
+    ContextCursor, а стратегия получает записи Bar и срез контекста как BarSeries-view
+    (без копирования). Сигналы отдаются в приемник (любой callable, принимающий dict сигнала).
+    """
+
+    def __init__(self, strategy, df_execution, df_context, signal_sink=None, min_context_bars=0,
+                 session_calendar=None, context_bar_duration=None, execution_bar_duration=None):
+        """
+        Args:
+            strategy: Объект с методом process_new_candle(current_time_utc, candle, context_slice).
+            df_execution (pd.DataFrame or BarSeries): Свечи исполнения (M5).
+            df_context (pd.DataFrame or BarSeries): Свечи контекста (M15).
+            signal_sink (callable, optional): Приемник сигналов. По умолчанию ListSignalSink.
+            min_context_bars (int): Минимум закрытых контекстных свечей для начала обработки.
+            session_calendar (SessionCalendar, optional): Если задан, свечи вне торговых сессий
+                пропускаются пачкой: стратегия получает только первую свечу каждого
+                внесессионного отрезка (чтобы перейти в ожидание сессии), остальные не вызываются.
+            context_bar_duration, execution_bar_duration (pd.Timedelta, optional): Длительности свечей.
+                Если заданы обе, контекстная свеча доступна только после своего закрытия
+                (см. ContextCursor), иначе сравниваются метки времени открытия.
+        """
+        self.strategy = strategy
+        self.df_execution = df_execution
+        self.df_context = df_context
+        self.execution_bars = as_bar_series(df_execution)
+        self.context_bars = as_bar_series(df_context)
+        self.signal_sink = signal_sink if signal_sink is not None else ListSignalSink()
+        self.min_context_bars = min_context_bars
+
+        execution_index = self.execution_bars.index
+        self.times_utc = index_to_utc_datetimes(execution_index)
+        self.context_cursor = ContextCursor(self.context_bars.index, execution_index,
+                                            context_bar_duration, execution_bar_duration)
+
+        # Какие свечи передаются в стратегию (маска считается один раз по всему индексу)
+        self.session_calendar = session_calendar
+        self.call_mask = self._build_call_mask(session_calendar, execution_index)
+
+    @staticmethod
+    def _build_call_mask(session_calendar, execution_index):
+        call_mask = np.ones(len(execution_index), dtype=bool)
+        if session_calendar is not None and len(execution_index):
+            in_session = session_calendar.in_session_mask(execution_index)
+            first_out_of_session = ~in_session
+            first_out_of_session[1:] &= in_session[:-1]
+            call_mask = in_session | first_out_of_session
+        return call_mask
+
+    def clone(self, strategy, signal_sink=None, min_context_bars=None, session_calendar=None):
+        """
+        Движок для другой стратегии на тех же данных: массивы свечей, время и выравнивание
+        контекста не пересчитываются (нужно для серий прогонов в оптимизаторе).
+        Маска сессий пересчитывается, только если передан другой календарь.
+        """
+        engine = copy.copy(self)
+        engine.strategy = strategy
+        engine.signal_sink = signal_sink if signal_sink is not None else ListSignalSink()
+        if min_context_bars is not None:
+            engine.min_context_bars = min_context_bars
+        if session_calendar is not None and session_calendar is not self.session_calendar:
+            engine.session_calendar = session_calendar
+            engine.call_mask = self._build_call_mask(session_calendar, self.execution_bars.index)
+        return engine
+
+    def run(self, checkpoint_every=None, checkpoint_sink=None, resume_from=None, start_position=None,
+            stop_position=None):
+        """
+        Запускает бэктест.
+
+        Args:
+            checkpoint_every (int, optional): Сохранять состояние стратегии раз в столько свечей
+                исполнения (на первой переданной в стратегию свече после границы интервала).
+            checkpoint_sink (callable, optional): Приемник checkpoint'ов, например
+                checkpoint.CheckpointStore. Checkpoint — словарь 'position', 'timestamp', 'strategy'.
+            resume_from (dict, optional): Checkpoint, с которого продолжить прогон: состояние
+                стратегии восстанавливается, обработка начинается со следующей свечи.
+            start_position, stop_position (int, optional): Обработать только свечи исполнения
+                [start_position, stop_position) — отрезок общей истории (walk-forward). Контекст
+                и ATR по-прежнему берутся из всей истории до текущей свечи.
+
+        Returns:
+            dict: Сводка прогона (количество свечей, сигналов, время, скорость).
+                  bars_processed — свечи после прогрева истории, bars_called — из них переданные в стратегию.
+        """
+        n_bars = len(self.times_utc)
+        stop = n_bars if stop_position is None else min(stop_position, n_bars)
+        first_position = self.context_cursor.first_position_with_history(self.min_context_bars)
+        if start_position is not None:
+            first_position = max(first_position, start_position)
+
+        process_new_candle = self.strategy.process_new_candle
+        signal_sink = self.signal_sink
+        context_bars = self.context_bars
+
+        if resume_from is not None:
+            self.strategy.set_state(resume_from['strategy'])
+            first_position = max(first_position, resume_from['position'] + 1)
+
+        # Свечи прогрева истории стратегия не получает, но реестр POI должен их видеть — как в live-режиме
+        # (после checkpoint'а или warm-up отрезка walk-forward реестр уже на месте, вызов ничего не делает)
+        warm_up = getattr(self.strategy, 'warm_up_m5_poi_registry', None)
+        if warm_up is not None:
+            warm_up(first_position)
+
+        # Первая свеча после прогрева передается всегда, чтобы стратегия увидела начальный статус сессии
+        # (при продолжении с checkpoint статус сессии уже в восстановленном состоянии)
+        call_mask = self.call_mask[first_position:stop].copy()
+        if resume_from is None:
+            call_mask[:1] = True
+        selected = np.flatnonzero(call_mask) + first_position
+
+        # Граница следующего checkpoint'а; без checkpoint_every — недостижимая позиция
+        next_checkpoint = n_bars
+        if checkpoint_every and checkpoint_sink is not None:
+            next_checkpoint = (first_position // checkpoint_every + 1) * checkpoint_every
+
+        # tolist() один раз дает питоновские float, итерация по ним дешевле индексации numpy на каждой свече
+        columns = [self.execution_bars[col][selected].tolist() for col in OHLCV_COLUMNS]
+        bar_times = self.times_utc[selected]
+        context_counts = self.context_cursor.positions[selected].tolist()
+
+        signals_count = 0
+        context_count = -1
+        context_slice = None
+
+        started = time.perf_counter()
+        bars_iter = zip(selected.tolist(), bar_times, context_counts, *columns)
+        for position, bar_time, bar_context_count, o, h, l, c, v in bars_iter:
+            # Срез контекста меняется только при закрытии новой M15 свечи (раз в 3 свечи M5)
+            if bar_context_count != context_count:
+                context_count = bar_context_count
+                context_slice = context_bars[:context_count]
+
+            bar = Bar(bar_time, o, h, l, c, v, position)
+            signal = process_new_candle(bar_time, bar, context_slice)
+            if signal:
+                signals_count += 1
+                signal_sink(signal)
+            if position >= next_checkpoint:
+                checkpoint_sink({'position': position, 'timestamp': bar_time, 'strategy': self.strategy.get_state()})
+                next_checkpoint = (position // checkpoint_every + 1) * checkpoint_every
+        elapsed = time.perf_counter() - started
+
+        bars_processed = max(0, stop - first_position)
+        return {
+            'bars_total': n_bars,
+            'bars_processed': bars_processed,
+            'bars_called': len(selected),
+            'bars_skipped_history': min(first_position, n_bars),
+            'signals': signals_count,
+            'elapsed_sec': elapsed,
+            'bars_per_sec': bars_processed / elapsed if elapsed > 0 else float('nan'),
+            'start': self.times_utc[first_position] if first_position < stop else None,
+            'end': self.times_utc[stop - 1] if stop else None,
+        }
@@ -0,0 +1,289 @@
+# src/backtest/optimizer.py
+# Перебор параметров стратегии (сетка или случайный поиск) в пуле процессов.
+# Свечи один раз сохраняются в .npy и открываются воркерами через memory-map (без pickle
+# данных на каждую задачу); ATR, выравнивание M15/M5 и маска сессий считаются один раз на воркер,
+# диапазоны M15, зоны FVG/OB и прогретый реестр POI — один раз на воркер для каждого сочетания
+# параметров, от которых они зависят.
+import contextlib
+import itertools
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.backtest.engine import BacktestEngine, ListSignalSink
+from src.backtest.simulator import compute_metrics, simulate_trades
+from src.config import TIMEFRAME_CONTEXT, TIMEFRAME_EXECUTION
+from src.core.bars import OHLCV_COLUMNS, BarSeries, as_bar_series
+from src.core.indicators import atr
+from src.strategies.amd_smc_strategy import (
+    ACC_DIST_PARAM_NAMES, M5_ZONE_PARAM_NAMES, AmdSMCStrategy, build_m15_accumulation_ranges, build_m5_zone_schedule,
+)
+from src.utils.time_utils import get_session_calendar, interval_to_timedelta
+
+# Состояние воркера: заполняется в _init_worker один раз на процесс
+_WORKER = {}
+WORKER_CACHE_SIZE = 8 # Сколько результатов каждого вида (диапазоны, зоны, реестр) хранит воркер
+
+
+def parameter_grid(grid):
+    """
+    Все комбинации значений сетки.
+
+    Args:
+        grid (dict): {имя параметра: список значений}.
+
+    Returns:
+        list: Список словарей параметров.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_search(space, n_iter, seed=None):
+    """
+    Случайные наборы параметров.
+
+    Args:
+        space (dict): {имя: список значений (равновероятный выбор) или кортеж (low, high)}.
+            Для кортежа из двух int значение берется целым из [low, high], иначе равномерно из [low, high).
+        n_iter (int): Количество наборов.
+        seed (int, optional): Зерно генератора.
+
+    Returns:
+        list: Список словарей параметров.
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n_iter):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    params[name] = rng.randint(low, high)
+                else:
+                    params[name] = rng.uniform(low, high)
+            else:
+                params[name] = rng.choice(list(values))
+        samples.append(params)
+    return samples
+
+
+def signal_count_metrics(signals, summary, execution_bars=None):
+    """Минимальные метрики прогона: количество сигналов и скорость."""
+    return {
+        'signals': len(signals),
+        'bars_processed': summary['bars_processed'],
+        'elapsed_sec': summary['elapsed_sec'],
+    }
+
+
+def trade_metrics(signals, summary, execution_bars):
+    """Метрики по умолчанию: сигналы исполняются симулятором на свечах M5, метрики в R."""
+    metrics = signal_count_metrics(signals, summary)
+    metrics.update(compute_metrics(simulate_trades(signals, execution_bars)))
+    return metrics
+
+
+def min_context_bars_for(config):
+    """Сколько закрытых свечей M15 нужно стратегии до начала обработки (как в main.py)."""
+    return config.get('ACC_DIST_PRIOR_TREND_LOOKBACK', 100) + config.get('ACC_DIST_BARS_MAX', 50)
+
+
+def engine_kwargs_with_durations(engine_kwargs, context_interval, execution_interval):
+    """
+    Аргументы BacktestEngine с длительностями свечей по интервалам таймфреймов, как в main.py:
+    без них контекстная свеча доступна с момента открытия (заглядывание в незакрытую M15).
+    Длительности, явно заданные в engine_kwargs, не перезаписываются.
+    """
+    engine_kwargs = dict(engine_kwargs or {})
+    engine_kwargs.setdefault('context_bar_duration', interval_to_timedelta(context_interval))
+    engine_kwargs.setdefault('execution_bar_duration', interval_to_timedelta(execution_interval))
+    return engine_kwargs
+
+
+def _save_bar_series(bars, directory, name):
+    """Сохраняет колонки BarSeries в отдельные .npy, возвращает описание для воркеров."""
+    paths = {}
+    for key, values in [('timestamps', bars.timestamps)] + [(col, bars[col]) for col in OHLCV_COLUMNS]:
+        paths[key] = os.path.join(directory, f"{name}_{key}.npy")
+        np.save(paths[key], np.ascontiguousarray(values))
+    return {'paths': paths, 'tz': bars.tz}
+
+
+def _load_bar_series(descriptor):
+    """BarSeries поверх memory-mapped .npy (только чтение, страницы общие для всех воркеров)."""
+    # view(np.ndarray): те же страницы файла, но без накладных расходов подкласса np.memmap
+    # на каждое обращение к элементу или срезу в цикле по свечам
+    arrays = {key: np.load(path, mmap_mode='r').view(np.ndarray) for key, path in descriptor['paths'].items()}
+    timestamps = arrays.pop('timestamps')
+    return BarSeries.from_buffers(timestamps, arrays, tz=descriptor['tz'])
+
+
+def _init_worker(execution_descriptor, context_descriptor, base_config, engine_kwargs, metrics_fn, quiet):
+    execution_bars = _load_bar_series(execution_descriptor)
+    context_bars = _load_bar_series(context_descriptor)
+
+    # ATR не зависит от перебираемых параметров — один расчет на воркер
+    atr_execution = atr(execution_bars['High'], execution_bars['Low'], execution_bars['Close'])
+    atr_context = atr(context_bars['High'], context_bars['Low'], context_bars['Close'])
+
+    session_calendar = None
+    if base_config.get('FILTER_BY_TRADING_SESSIONS', True):
+        session_calendar = get_session_calendar(base_config.get('TRADING_SESSIONS_UTC', {}))
+
+    # Шаблон движка: время, выравнивание контекста и маска сессий считаются один раз
+    template = BacktestEngine(None, execution_bars, context_bars,
+                              min_context_bars=min_context_bars_for(base_config),
+                              session_calendar=session_calendar, **engine_kwargs)
+
+    _WORKER.update(
+        execution_bars=execution_bars, context_bars=context_bars,
+        atr_execution=atr_execution, atr_context=atr_context,
+        base_config=base_config, template=template, metrics_fn=metrics_fn, quiet=quiet,
+        cache={'ranges': {}, 'zones': {}, 'registry': {}},
+    )
+
+
+def _worker_cached(kind, key, compute):
+    """
+    Результат compute() из кэша воркера: диапазоны M15 и зоны FVG/OB зависят только от части
+    параметров, поэтому считаются один раз на воркер для каждого их сочетания (key).
+    """
+    cache = _WORKER['cache'][kind]
+    if key not in cache:
+        if len(cache) >= WORKER_CACHE_SIZE:
+            cache.pop(next(iter(cache))) # Самый старый
+        cache[key] = compute()
+    return cache[key]
+
+
+def _warm_up_registry(strategy, engine, config, start_position, warmup_bars):
+    """
+    Прогревает реестр POI стратегии до первой обрабатываемой свечи (как BacktestEngine.run:
+    с начала истории или с warmup_bars свечей перед отрезком). Реестр зависит только от
+    параметров FVG/OB, поэтому его состояние после прогрева кэшируется и восстанавливается
+    в остальных прогонах воркера с теми же параметрами вместо повторного прохода по свечам.
+    """
+    stop = engine.context_cursor.first_position_with_history(engine.min_context_bars)
+    start = None
+    if start_position is not None:
+        stop = max(stop, start_position)
+        if start_position and warmup_bars:
+            start = max(0, start_position - warmup_bars)
+    key = (tuple(config.get(name) for name in M5_ZONE_PARAM_NAMES), config.get('POI_MAX_AGE_BARS'), start, stop)
+
+    def warm_up():
+        strategy.warm_up_m5_poi_registry(stop=stop, start=start)
+        return strategy.m5_poi_registry.get_state()
+
+    state = _worker_cached('registry', key, warm_up)
+    if strategy.m5_last_position < stop - 1:
+        strategy.m5_poi_registry.set_state(state)
+        strategy.m5_last_position = stop - 1
+
+
+@contextlib.contextmanager
+def _task_output():
+    """Вывод задачи воркера: при quiet подавляется на время задачи (стратегия печатает смену состояний)."""
+    if not _WORKER['quiet']:
+        yield
+        return
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _run_params(params, start_position=None, stop_position=None, warmup_bars=None):
+    """
+    Прогон одного набора параметров на данных воркера (вся история или отрезок
+    [start_position, stop_position), см. walk_forward). Реестр POI перед отрезком
+    прогревается на warmup_bars предыдущих свечах.
+    """
+    config = dict(_WORKER['base_config'])
+    config.update(params)
+
+    with _task_output():
+        context_bars, execution_bars = _WORKER['context_bars'], _WORKER['execution_bars']
+        atr_context, atr_execution = _WORKER['atr_context'], _WORKER['atr_execution']
+        m15_ranges = _worker_cached('ranges', tuple(config.get(name) for name in ACC_DIST_PARAM_NAMES),
+                                    lambda: build_m15_accumulation_ranges(context_bars, atr_context, config))
+        m5_zone_schedule = _worker_cached('zones', tuple(config.get(name) for name in M5_ZONE_PARAM_NAMES),
+                                          lambda: build_m5_zone_schedule(execution_bars, atr_execution, config))
+        strategy = AmdSMCStrategy(context_bars, execution_bars, config, atr_context=atr_context,
+                                  atr_execution=atr_execution, m15_ranges=m15_ranges, m5_zone_schedule=m5_zone_schedule)
+
+        session_calendar = None
+        if config.get('FILTER_BY_TRADING_SESSIONS', True):
+            session_calendar = get_session_calendar(config.get('TRADING_SESSIONS_UTC', {}))
+        signal_sink = ListSignalSink()
+        engine = _WORKER['template'].clone(strategy, signal_sink,
+                                           min_context_bars=min_context_bars_for(config),
+                                           session_calendar=session_calendar)
+        if session_calendar is None:
+            # Фильтр сессий выключен в этом наборе параметров — стратегия получает все свечи
+            engine.call_mask = np.ones(len(engine.call_mask), dtype=bool)
+
+        _warm_up_registry(strategy, engine, config, start_position, warmup_bars)
+        summary = engine.run(start_position=start_position, stop_position=stop_position)
+        result = dict(params)
+        result.update(_WORKER['metrics_fn'](signal_sink.signals, summary, execution_bars))
+    return result
+
+
+def _run_task(params):
+    return _run_params(params)
+
+
+def run_optimization(df_execution, df_context, base_config, param_sets, max_workers=None,
+                     metrics_fn=trade_metrics, engine_kwargs=None, sort_by=None, ascending=False,
+                     quiet=True, chunksize=1, context_interval=TIMEFRAME_CONTEXT,
+                     execution_interval=TIMEFRAME_EXECUTION):
+    """
+    Прогоняет бэктест для каждого набора параметров в пуле процессов.
+
+    Args:
+        df_execution, df_context (pd.DataFrame or BarSeries): Свечи M5 и M15.
+        base_config (dict): Базовые параметры стратегии (get_strategy_config_params()).
+        param_sets (list): Наборы параметров (parameter_grid / random_search), перекрывают base_config.
+        max_workers (int, optional): Число процессов (по умолчанию os.cpu_count()).
+        metrics_fn (callable): metrics_fn(signals, summary, execution_bars) -> dict. Должна быть
+            функцией уровня модуля, чтобы передаваться в процессы.
+        engine_kwargs (dict, optional): Доп. аргументы BacktestEngine; длительности свечей в них
+            перекрывают вычисленные по интервалам.
+        sort_by (str, optional): Колонка для сортировки результатов.
+        ascending (bool): Направление сортировки.
+        quiet (bool): Подавить вывод стратегии в воркерах.
+        chunksize (int): Наборов параметров на одну отправку в воркер.
+        context_interval, execution_interval (str): Интервалы свечей M15 и M5 (длительности свечей движка).
+
+    Returns:
+        pd.DataFrame: Строка на набор параметров: параметры и метрики.
+    """
+    execution_bars = as_bar_series(df_execution)
+    context_bars = as_bar_series(df_context)
+    engine_kwargs = engine_kwargs_with_durations(engine_kwargs, context_interval, execution_interval)
+    param_sets = list(param_sets)
+    if not param_sets:
+        return pd.DataFrame()
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='amd_optimizer_') as directory:
+        execution_descriptor = _save_bar_series(execution_bars, directory, 'execution')
+        context_descriptor = _save_bar_series(context_bars, directory, 'context')
+        initargs = (execution_descriptor, context_descriptor, base_config, engine_kwargs, metrics_fn, quiet)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=initargs) as pool:
+            rows = list(pool.map(_run_task, param_sets, chunksize=chunksize))
+
+    results = pd.DataFrame(rows)
+    if sort_by is not None and sort_by in results.columns:
+        results = results.sort_values(sort_by, ascending=ascending, kind='stable').reset_index(drop=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"Оптимизация: {len(param_sets)} прогонов за {elapsed:.1f} с "
+          f"({len(param_sets) / elapsed:.2f} прогонов/с)")
+    return results
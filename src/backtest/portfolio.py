@@ -0,0 +1,149 @@
+# src/backtest/portfolio.py
+# Бэктест корзины символов: на каждый символ — независимый AmdSMCStrategy в отдельном
+# процессе, сигналы всех символов сливаются в один поток, упорядоченный по времени.
+import contextlib
+import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from src.backtest.engine import BacktestEngine, ListSignalSink
+from src.backtest.optimizer import min_context_bars_for
+from src.core.bars import BarSeries
+from src.strategies.amd_smc_strategy import AmdSMCStrategy
+from src.utils.data_cache import OHLCVCache
+from src.utils.resampling import resample_ohlcv
+from src.utils.time_utils import interval_to_timedelta
+
+
+def run_symbol_backtest(symbol, data_execution, config, context_interval, execution_interval):
+    """
+    Бэктест одного символа: контекст строится из свечей исполнения, стратегия прогоняется движком.
+
+    Returns:
+        tuple: (список сигналов с полем 'symbol', сводка engine.run() или None, если данных мало).
+    """
+    data_context = resample_ohlcv(data_execution, context_interval, execution_interval)
+    if data_context.empty:
+        return [], None
+    data_execution = data_execution[data_execution.index >= data_context.index.min()]
+
+    bars_context = BarSeries.from_dataframe(data_context)
+    bars_execution = BarSeries.from_dataframe(data_execution)
+    strategy = AmdSMCStrategy(df_context=bars_context, df_execution=bars_execution, config_params=config)
+
+    signal_sink = ListSignalSink()
+    engine = BacktestEngine(
+        strategy, bars_execution, bars_context,
+        signal_sink=signal_sink,
+        min_context_bars=min_context_bars_for(config),
+        session_calendar=strategy.session_calendar if config.get('FILTER_BY_TRADING_SESSIONS', True) else None,
+        context_bar_duration=interval_to_timedelta(context_interval),
+        execution_bar_duration=interval_to_timedelta(execution_interval),
+    )
+    summary = engine.run()
+
+    signals = [dict(signal, symbol=symbol) for signal in signal_sink.signals]
+    return signals, summary
+
+
+def _run_symbol_task(symbol, cache_dir, start, end, config, context_interval, execution_interval, quiet):
+    args = (symbol, cache_dir, start, end, config, context_interval, execution_interval)
+    if not quiet:
+        return _symbol_task(*args)
+    # Вывод стратегии подавляется только на время задачи, stdout процесса не подменяется
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return _symbol_task(*args)
+
+
+def _symbol_task(symbol, cache_dir, start, end, config, context_interval, execution_interval):
+    # Воркер читает только локальный кэш: загрузка из сети делается в родительском процессе
+    data_execution = OHLCVCache(cache_dir).get(symbol, execution_interval, start=start, end=end)
+    if data_execution.empty:
+        return symbol, [], None
+    signals, summary = run_symbol_backtest(symbol, data_execution, config, context_interval, execution_interval)
+    return symbol, signals, summary
+
+
+def merge_signal_streams(streams):
+    """
+    Сливает отсортированные по времени потоки сигналов в один (heapq.merge, без сортировки
+    общего списка). При равном времени порядок определяется символом.
+    """
+    return heapq.merge(*streams, key=lambda signal: (signal['timestamp'], signal.get('symbol', '')))
+
+
+def prefetch_symbols(cache, symbols, interval, start=None, end=None):
+    """Догружает в кэш недостающую историю по всем символам (последовательно, с лимитами fetcher)."""
+    for symbol in symbols:
+        try:
+            df = cache.get(symbol, interval, start=start, end=end)
+            print(f"{symbol} {interval}: {len(df)} свечей в кэше")
+        except RuntimeError as e:
+            print(f"Ошибка загрузки данных {symbol} {interval}: {e}")
+
+
+def run_portfolio_backtest(symbols, cache_dir, config, context_interval, execution_interval,
+                           start=None, end=None, max_workers=None, max_tasks_per_child=1, quiet=True):
+    """
+    Прогоняет стратегию по каждому символу в пуле процессов.
+
+    Данные каждый воркер читает из локального кэша сам (в родителе история всех символов
+    одновременно не держится). max_tasks_per_child=1 перезапускает воркер после каждого символа,
+    чтобы память одного прогона не накапливалась в процессе.
+
+    Args:
+        symbols (list): Символы в формате Twelve Data ("EUR/USD", ...).
+        cache_dir (str): Каталог OHLCVCache с базовыми свечами (execution_interval).
+        config (dict): Параметры стратегии (get_strategy_config_params()).
+        context_interval, execution_interval (str): Интервалы контекста и исполнения.
+        start, end: Границы истории (None — вся история в кэше).
+        max_workers (int, optional): Число процессов (по умолчанию os.cpu_count()).
+        max_tasks_per_child (int or None): Символов на процесс до перезапуска.
+        quiet (bool): Подавить вывод стратегии в воркерах.
+
+    Returns:
+        dict: 'signals' — сигналы всех символов в порядке времени,
+              'summary' — pd.DataFrame со сводкой по символам.
+    """
+    started = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=max_tasks_per_child) as pool:
+        futures = {
+            pool.submit(_run_symbol_task, symbol, cache_dir, start, end, config,
+                        context_interval, execution_interval, quiet): symbol
+            for symbol in symbols
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                _, signals, summary = future.result()
+            except Exception as e:
+                print(f"{symbol}: ошибка бэктеста: {e}")
+                continue
+            results[symbol] = (signals, summary)
+            if summary is None:
+                print(f"{symbol}: нет данных в кэше")
+            else:
+                print(f"{symbol}: {len(signals)} сигналов, {summary['bars_processed']} свечей "
+                      f"за {summary['elapsed_sec']:.2f} с")
+
+    # Порядок символов в summary — как во входном списке, независимо от порядка завершения
+    streams = [results[symbol][0] for symbol in symbols if symbol in results]
+    rows = []
+    for symbol in symbols:
+        if symbol not in results or results[symbol][1] is None:
+            continue
+        summary = results[symbol][1]
+        rows.append({'symbol': symbol, 'signals': len(results[symbol][0]),
+                     'bars_processed': summary['bars_processed'], 'elapsed_sec': summary['elapsed_sec'],
+                     'start': summary['start'], 'end': summary['end']})
+
+    elapsed = time.perf_counter() - started
+    print(f"Портфель: {len(rows)} из {len(symbols)} символов с данными за {elapsed:.1f} с")
+    return {
+        'signals': list(merge_signal_streams(streams)),
+        'summary': pd.DataFrame(rows),
+    }
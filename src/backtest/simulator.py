@@ -0,0 +1,251 @@
+# src/backtest/simulator.py
+# Симулятор исполнения сигналов: для каждой сделки ищется первое касание SL или TP
+# на свечах после сигнала. Поиск идет блоками свечей сразу по всем открытым сделкам
+# (матрица сделки x свечи блока), без цикла Python по сделкам и свечам.
+import numpy as np
+import pandas as pd
+
+from src.core.bars import as_bar_series
+from src.utils.context_alignment import _index_to_utc_ns
+
+EXIT_NONE = 0
+EXIT_SL = 1
+EXIT_TP = 2
+EXIT_TIMEOUT = 3 # Истек max_holding_bars, выход по Close
+EXIT_END_OF_DATA = 4 # Данные закончились, выход по последнему Close
+
+EXIT_REASONS = {
+    EXIT_NONE: 'none',
+    EXIT_SL: 'sl',
+    EXIT_TP: 'tp',
+    EXIT_TIMEOUT: 'timeout',
+    EXIT_END_OF_DATA: 'end_of_data',
+}
+
+# Верхняя граница размера матрицы сделки x свечи одного блока
+_MAX_BLOCK_CELLS = 1 << 22
+
+
+def signals_to_arrays(signals):
+    """
+    Список словарей сигналов -> массивы: время (нс UTC), направление (+1 BUY / -1 SELL), вход, SL, TP.
+    """
+    timestamps = _index_to_utc_ns(pd.DatetimeIndex([signal['timestamp'] for signal in signals]))
+    direction = np.array([1 if signal['signal'] == 'BUY' else -1 for signal in signals], dtype=np.int8)
+    entry = np.array([signal['price'] for signal in signals], dtype=np.float64)
+    sl = np.array([signal['sl'] for signal in signals], dtype=np.float64)
+    tp = np.array([signal['tp'] for signal in signals], dtype=np.float64)
+    return timestamps, direction, entry, sl, tp
+
+
+def resolve_first_touch(open_, high, low, close, start, direction, sl, tp, max_holding_bars=None,
+                        block_size=64, sl_first_on_same_bar=True):
+    """
+    Находит для каждой сделки свечу выхода: первое касание SL или TP начиная с позиции start.
+
+    Сделки обрабатываются пачкой: на каждом шаге для всех еще открытых сделок берется
+    окно из block_size следующих свечей, касания ищутся векторно, argmax по маске дает
+    первую свечу с касанием. Нерешенные сделки сдвигаются на следующий блок, размер блока
+    удваивается, поэтому число шагов — O(log длины самой долгой сделки).
+
+    Args:
+        open_, high, low, close (np.ndarray): Свечи, по которым сопровождаются сделки.
+        start (np.ndarray): Первая свеча сопровождения для каждой сделки (свеча после сигнала).
+        direction (np.ndarray): +1 лонг, -1 шорт.
+        sl, tp (np.ndarray): Уровни стоп-лосса и тейк-профита.
+        max_holding_bars (int, optional): Принудительный выход по Close через столько свечей.
+        block_size (int): Начальный размер блока свечей.
+        sl_first_on_same_bar (bool): Если SL и TP задеты одной свечой, считать, что первым
+            сработал SL (консервативно; порядок внутри свечи по OHLC неизвестен).
+
+    Returns:
+        tuple: (exit_position, exit_price, exit_reason) — массивы длины числа сделок.
+    """
+    n = len(high)
+    k = len(start)
+    start = np.asarray(start, dtype=np.int64)
+    limit = np.full(k, n, dtype=np.int64)
+    if max_holding_bars is not None:
+        limit = np.minimum(limit, start + max_holding_bars)
+
+    exit_position = np.full(k, -1, dtype=np.int64)
+    exit_price = np.full(k, np.nan)
+    exit_reason = np.zeros(k, dtype=np.int8)
+    is_long = np.asarray(direction) > 0
+
+    cursor = start.copy()
+    active = np.flatnonzero(cursor < limit)
+    width = max(1, block_size)
+    while active.size:
+        width = max(1, min(width, _MAX_BLOCK_CELLS // active.size))
+        idx = cursor[active, None] + np.arange(width)
+        in_range = idx < limit[active, None]
+        idx = np.minimum(idx, n - 1)
+
+        block_high = high[idx]
+        block_low = low[idx]
+        long_rows = is_long[active, None]
+        sl_rows = sl[active, None]
+        tp_rows = tp[active, None]
+        sl_hit = np.where(long_rows, block_low <= sl_rows, block_high >= sl_rows) & in_range
+        tp_hit = np.where(long_rows, block_high >= tp_rows, block_low <= tp_rows) & in_range
+        any_hit = sl_hit | tp_hit
+
+        hit_rows = any_hit.any(axis=1)
+        if hit_rows.any():
+            rows = np.flatnonzero(hit_rows)
+            first = any_hit[rows].argmax(axis=1)
+            trades = active[rows]
+            positions = idx[rows, first]
+            by_sl = sl_hit[rows, first]
+            by_tp = tp_hit[rows, first]
+            stop_out = by_sl & (sl_first_on_same_bar | ~by_tp)
+
+            # Гэп за уровень стопа: исполнение по Open, а не по SL
+            bar_open = open_[positions]
+            trade_sl = sl[trades]
+            gapped = np.where(is_long[trades], bar_open < trade_sl, bar_open > trade_sl)
+            sl_fill = np.where(gapped & ~np.isnan(bar_open), bar_open, trade_sl)
+
+            exit_position[trades] = positions
+            exit_reason[trades] = np.where(stop_out, EXIT_SL, EXIT_TP)
+            exit_price[trades] = np.where(stop_out, sl_fill, tp[trades])
+
+        # Открытые сделки, у которых закончилось окно сопровождения
+        open_rows = ~hit_rows
+        done = open_rows & (cursor[active] + width >= limit[active])
+        if done.any():
+            trades = active[done]
+            last = limit[trades] - 1
+            exit_position[trades] = last
+            exit_price[trades] = close[last]
+            exit_reason[trades] = np.where(limit[trades] < n, EXIT_TIMEOUT, EXIT_END_OF_DATA)
+
+        active = active[open_rows & ~done]
+        cursor[active] += width
+        width *= 2
+
+    return exit_position, exit_price, exit_reason
+
+
+def simulate_trades(signals, bars, max_holding_bars=None, block_size=64, sl_first_on_same_bar=True):
+    """
+    Исполняет сигналы на свечах bars.
+
+    Вход считается исполненным на свече сигнала по цене 'price', сопровождение начинается
+    со следующей свечи. Сигналы с нулевым или отрицательным риском пропускаются.
+
+    Args:
+        signals (list): Сигналы стратегии: {'signal': 'BUY'/'SELL', 'timestamp', 'price', 'sl', 'tp', ...}.
+        bars (BarSeries or pd.DataFrame): Свечи исполнения (M5 или младше).
+        max_holding_bars, block_size, sl_first_on_same_bar: См. resolve_first_touch.
+
+    Returns:
+        pd.DataFrame: Сделка на строку: entry_time, exit_time, direction, entry, sl, tp,
+                      exit_price, exit_reason, bars_held, r_multiple (+ symbol, если есть в сигнале).
+    """
+    columns = ['entry_time', 'exit_time', 'direction', 'entry', 'sl', 'tp',
+               'exit_price', 'exit_reason', 'bars_held', 'r_multiple']
+    if not signals:
+        return pd.DataFrame(columns=columns)
+
+    bars = as_bar_series(bars)
+    timestamps, direction, entry, sl, tp = signals_to_arrays(signals)
+    risk = np.where(direction > 0, entry - sl, sl - entry)
+    valid = risk > 0
+
+    # Первая свеча после свечи сигнала
+    start = np.searchsorted(bars.timestamps, timestamps, side='right')
+    keep = np.flatnonzero(valid)
+    exit_position, exit_price, exit_reason = resolve_first_touch(
+        bars['Open'], bars['High'], bars['Low'], bars['Close'],
+        start[keep], direction[keep], sl[keep], tp[keep],
+        max_holding_bars=max_holding_bars, block_size=block_size,
+        sl_first_on_same_bar=sl_first_on_same_bar)
+
+    resolved = exit_position >= 0 # Сигнал на последней свече: сопровождать не на чем
+    keep = keep[resolved]
+    exit_position = exit_position[resolved]
+    exit_price = exit_price[resolved]
+    exit_reason = exit_reason[resolved]
+
+    pnl = np.where(direction[keep] > 0, exit_price - entry[keep], entry[keep] - exit_price)
+    bar_index = bars.index
+    trades = pd.DataFrame({
+        'entry_time': pd.DatetimeIndex([signals[i]['timestamp'] for i in keep]),
+        'exit_time': bar_index[exit_position],
+        'direction': direction[keep],
+        'entry': entry[keep],
+        'sl': sl[keep],
+        'tp': tp[keep],
+        'exit_price': exit_price,
+        'exit_reason': [EXIT_REASONS[reason] for reason in exit_reason],
+        'bars_held': exit_position - start[keep] + 1,
+        'r_multiple': pnl / risk[keep],
+    })
+    if any('symbol' in signal for signal in signals):
+        trades.insert(0, 'symbol', [signals[i].get('symbol') for i in keep])
+    return trades
+
+
+def equity_curve(trades, initial_equity=1.0, risk_fraction=None):
+    """
+    Кривая капитала по времени выхода сделок.
+
+    Без risk_fraction — накопленный результат в R. С risk_fraction (доля капитала под риском
+    на сделку) — капитал с реинвестированием: equity *= 1 + risk_fraction * R.
+    """
+    if trades.empty:
+        return pd.Series(dtype=np.float64, name='equity')
+    ordered = trades.sort_values('exit_time', kind='stable')
+    r = ordered['r_multiple'].to_numpy()
+    if risk_fraction is None:
+        values = np.cumsum(r)
+    else:
+        values = initial_equity * np.cumprod(1.0 + risk_fraction * r)
+    return pd.Series(values, index=pd.DatetimeIndex(ordered['exit_time']), name='equity')
+
+
+def _max_drawdown(values, start_value, relative):
+    peaks = np.maximum.accumulate(np.concatenate(([start_value], values)))[1:]
+    drawdowns = (peaks - values) / peaks if relative else peaks - values
+    return float(drawdowns.max()) if len(drawdowns) else 0.0
+
+
+def compute_metrics(trades, risk_fraction=None):
+    """
+    Сводные метрики по сделкам.
+
+    Returns:
+        dict: trades, win_rate, avg_win_r, avg_loss_r, expectancy_r (средний R), total_r,
+              profit_factor, max_drawdown_r (в R от пика накопленного результата),
+              avg_bars_held и при заданном risk_fraction — final_equity и max_drawdown_pct.
+    """
+    metrics = {
+        'trades': len(trades), 'win_rate': np.nan, 'avg_win_r': np.nan, 'avg_loss_r': np.nan,
+        'expectancy_r': np.nan, 'total_r': 0.0, 'profit_factor': np.nan, 'max_drawdown_r': 0.0,
+        'avg_bars_held': np.nan,
+    }
+    if risk_fraction is not None:
+        metrics.update(final_equity=1.0, max_drawdown_pct=0.0)
+    if trades.empty:
+        return metrics
+
+    r = trades['r_multiple'].to_numpy()
+    wins = r[r > 0]
+    losses = r[r <= 0]
+    gross_loss = -losses.sum()
+    metrics.update(
+        win_rate=len(wins) / len(r),
+        avg_win_r=float(wins.mean()) if len(wins) else np.nan,
+        avg_loss_r=float(losses.mean()) if len(losses) else np.nan,
+        expectancy_r=float(r.mean()),
+        total_r=float(r.sum()),
+        profit_factor=float(wins.sum() / gross_loss) if gross_loss > 0 else np.inf,
+        max_drawdown_r=_max_drawdown(equity_curve(trades).to_numpy(), 0.0, relative=False),
+        avg_bars_held=float(trades['bars_held'].mean()),
+    )
+    if risk_fraction is not None:
+        equity = equity_curve(trades, 1.0, risk_fraction).to_numpy()
+        metrics.update(final_equity=float(equity[-1]), max_drawdown_pct=_max_drawdown(equity, 1.0, relative=True))
+    return metrics
@@ -0,0 +1,205 @@
+# src/backtest/walk_forward.py
+# Walk-forward анализ: скользящие окна in-sample / out-of-sample. На каждом in-sample отрезке
+# перебираются параметры, лучший набор проверяется на следующем out-of-sample отрезке.
+# Все отрезки всех окон выполняются в одном пуле процессов оптимизатора: свечи, ATR,
+# выравнивание M15/M5 и маска сессий считаются один раз на воркер по всей истории,
+# отрезок — это только диапазон позиций для BacktestEngine.run().
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from src.backtest.optimizer import (
+    _init_worker, _run_params, _save_bar_series, engine_kwargs_with_durations, min_context_bars_for, trade_metrics,
+)
+from src.config import TIMEFRAME_CONTEXT, TIMEFRAME_EXECUTION
+from src.core.bars import as_bar_series
+from src.utils.context_alignment import ContextCursor
+
+WALK_FORWARD_WARMUP_BARS = 2000 # Свечей M5 перед отрезком для прогрева реестра POI
+
+
+def walk_forward_windows(timestamps_ns, in_sample, out_of_sample, step=None, anchored=False, start_position=0):
+    """
+    Разбивает историю на окна walk-forward.
+
+    Args:
+        timestamps_ns (np.ndarray): Время свечей исполнения (int64 нс UTC, отсортировано).
+        in_sample, out_of_sample (int, str or pd.Timedelta): Длина отрезков: int — в свечах,
+            иначе — во времени ("30D", pd.Timedelta(weeks=2)).
+        step (int, str or pd.Timedelta, optional): Сдвиг окна (по умолчанию длина out-of-sample,
+            т.е. out-of-sample отрезки идут встык без перекрытия).
+        anchored (bool): In-sample всегда начинается с начала истории (расширяющееся окно).
+        start_position (int): Первая свеча, с которой можно начинать окна (например, после прогрева M15).
+
+    Returns:
+        list: Окна {'fold', 'is_start', 'is_stop', 'oos_start', 'oos_stop'} — позиции
+              [start, stop) в массивах свечей исполнения. Неполное последнее окно отбрасывается.
+    """
+    timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+    n = len(timestamps_ns)
+    step = out_of_sample if step is None else step
+    windows = []
+    if n <= start_position:
+        return windows
+
+    if isinstance(in_sample, (int, np.integer)):
+        if not isinstance(out_of_sample, (int, np.integer)) or not isinstance(step, (int, np.integer)):
+            raise ValueError("Длины отрезков и шаг задаются либо все в свечах, либо все во времени")
+        offset = start_position
+        while offset + in_sample + out_of_sample <= n:
+            is_start = start_position if anchored else offset
+            is_stop = offset + in_sample
+            windows.append({'fold': len(windows), 'is_start': is_start, 'is_stop': is_stop,
+                            'oos_start': is_stop, 'oos_stop': is_stop + out_of_sample})
+            offset += step
+        return windows
+
+    in_ns, out_ns, step_ns = (pd.Timedelta(size).value for size in (in_sample, out_of_sample, step))
+    origin = int(timestamps_ns[start_position])
+    offset = origin
+    # Окно полное, если история доходит до конца его out-of-sample отрезка
+    while offset + in_ns + out_ns <= timestamps_ns[-1]:
+        bounds = np.searchsorted(timestamps_ns, [origin if anchored else offset, offset + in_ns,
+                                                 offset + in_ns + out_ns], side='left')
+        is_start, is_stop, oos_stop = (int(b) for b in bounds)
+        if is_stop > is_start and oos_stop > is_stop:
+            windows.append({'fold': len(windows), 'is_start': is_start, 'is_stop': is_stop,
+                            'oos_start': is_stop, 'oos_stop': oos_stop})
+        offset += step_ns
+    return windows
+
+
+def _run_segment_task(task):
+    fold, phase, order, params, start, stop, warmup_bars = task
+    result = _run_params(params, start_position=start, stop_position=stop, warmup_bars=warmup_bars)
+    return fold, phase, order, params, result
+
+
+def _select_best(runs, select_by, ascending):
+    """
+    Лучший прогон (order, params, result) по метрике select_by; NaN не выбирается, пока есть другие.
+    При равенстве (и если метрика везде NaN) берется набор, раньше идущий в param_sets.
+    """
+    runs = sorted(runs, key=lambda run: run[0])
+    scored = [run for run in runs if not pd.isna(run[2].get(select_by, np.nan))]
+    if not scored:
+        return runs[0]
+    pick = min if ascending else max
+    return pick(scored, key=lambda run: run[2][select_by])
+
+
+def run_walk_forward(df_execution, df_context, base_config, param_sets, in_sample, out_of_sample, step=None,
+                     anchored=False, select_by='expectancy_r', ascending=False, max_workers=None,
+                     metrics_fn=trade_metrics, engine_kwargs=None, warmup_bars=WALK_FORWARD_WARMUP_BARS,
+                     quiet=True, windows=None, context_interval=TIMEFRAME_CONTEXT,
+                     execution_interval=TIMEFRAME_EXECUTION):
+    """
+    Walk-forward: оптимизация на in-sample, проверка лучшего набора на out-of-sample.
+
+    Задачи in-sample всех окон отправляются в пул сразу; прогон out-of-sample окна запускается, как
+    только завершены все его in-sample прогоны. Данные и вычисления, не зависящие от
+    параметров, готовятся один раз на воркер (см. optimizer._init_worker); диапазоны M15,
+    зоны FVG/OB и реестр POI, прогретый перед отрезком, — один раз на воркер для каждого
+    сочетания параметров, от которых они зависят (см. optimizer._warm_up_registry).
+
+    Args:
+        df_execution, df_context (pd.DataFrame or BarSeries): Свечи M5 и M15 за всю историю.
+        base_config (dict): Базовые параметры стратегии.
+        param_sets (list): Наборы параметров (parameter_grid / random_search).
+        in_sample, out_of_sample, step, anchored: Разметка окон, см. walk_forward_windows.
+        select_by (str): Метрика выбора лучшего набора на in-sample.
+        ascending (bool): True — лучший набор с минимальной метрикой.
+        max_workers (int, optional): Число процессов.
+        metrics_fn (callable): metrics_fn(signals, summary, execution_bars) -> dict (уровня модуля).
+        engine_kwargs (dict, optional): Доп. аргументы BacktestEngine; длительности свечей в них
+            перекрывают вычисленные по интервалам.
+        warmup_bars (int): Свечей перед отрезком для прогрева реестра POI.
+        quiet (bool): Подавить вывод стратегии в воркерах.
+        windows (list, optional): Готовые окна (иначе строятся walk_forward_windows).
+        context_interval, execution_interval (str): Интервалы свечей M15 и M5 (длительности свечей движка
+            и выравнивание первого окна).
+
+    Returns:
+        dict: 'windows' — окна, 'in_sample' — все прогоны in-sample (fold + параметры + метрики),
+              'out_of_sample' — прогоны лучших наборов на out-of-sample,
+              'summary' — строка на окно: границы, лучшие параметры, метрика in-sample и out-of-sample.
+    """
+    execution_bars = as_bar_series(df_execution)
+    context_bars = as_bar_series(df_context)
+    engine_kwargs = engine_kwargs_with_durations(engine_kwargs, context_interval, execution_interval)
+    param_sets = list(param_sets)
+
+    if windows is None:
+        # Окна начинаются после прогрева M15, как обработка в движке
+        cursor = ContextCursor(context_bars.index, execution_bars.index,
+                               engine_kwargs.get('context_bar_duration'), engine_kwargs.get('execution_bar_duration'))
+        first_position = cursor.first_position_with_history(min_context_bars_for(base_config))
+        windows = walk_forward_windows(execution_bars.timestamps, in_sample, out_of_sample,
+                                       step=step, anchored=anchored, start_position=first_position)
+    if not windows or not param_sets:
+        print("Walk-forward: нет окон или наборов параметров")
+        return {'windows': windows, 'in_sample': pd.DataFrame(), 'out_of_sample': pd.DataFrame(),
+                'summary': pd.DataFrame()}
+
+    started = time.perf_counter()
+    in_sample_runs = {window['fold']: [] for window in windows}
+    out_of_sample_rows = {}
+    best = {}
+    with tempfile.TemporaryDirectory(prefix='amd_walk_forward_') as directory:
+        execution_descriptor = _save_bar_series(execution_bars, directory, 'execution')
+        context_descriptor = _save_bar_series(context_bars, directory, 'context')
+        initargs = (execution_descriptor, context_descriptor, base_config, engine_kwargs, metrics_fn, quiet)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=initargs) as pool:
+            pending = {
+                pool.submit(_run_segment_task, (window['fold'], 'is', order, params, window['is_start'],
+                                                window['is_stop'], warmup_bars))
+                for window in windows for order, params in enumerate(param_sets)
+            }
+            windows_by_fold = {window['fold']: window for window in windows}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    fold, phase, order, params, result = future.result()
+                    if phase == 'oos':
+                        out_of_sample_rows[fold] = result
+                        continue
+                    in_sample_runs[fold].append((order, params, result))
+                    if len(in_sample_runs[fold]) == len(param_sets):
+                        window = windows_by_fold[fold]
+                        best[fold] = _select_best(in_sample_runs[fold], select_by, ascending)
+                        pending.add(pool.submit(_run_segment_task, (fold, 'oos', best[fold][0], best[fold][1],
+                                                                    window['oos_start'], window['oos_stop'],
+                                                                    warmup_bars)))
+
+    times = execution_bars.index
+    summary_rows = []
+    for window in windows:
+        fold = window['fold']
+        oos = out_of_sample_rows[fold]
+        row = {
+            'fold': fold,
+            'is_start': times[window['is_start']], 'is_end': times[window['is_stop'] - 1],
+            'oos_start': times[window['oos_start']], 'oos_end': times[window['oos_stop'] - 1],
+        }
+        _, best_params, best_result = best[fold]
+        row.update(best_params)
+        row['is_' + select_by] = best_result.get(select_by, np.nan)
+        row['oos_' + select_by] = oos.get(select_by, np.nan)
+        if 'signals' in oos:
+            row['oos_signals'] = oos['signals']
+        summary_rows.append(row)
+
+    in_sample = pd.DataFrame([dict(result, fold=fold) for fold in sorted(in_sample_runs)
+                              for _, _, result in sorted(in_sample_runs[fold], key=lambda run: run[0])])
+    out_of_sample = pd.DataFrame([dict(out_of_sample_rows[fold], fold=fold) for fold in sorted(out_of_sample_rows)])
+    elapsed = time.perf_counter() - started
+    print(f"Walk-forward: {len(windows)} окон x {len(param_sets)} наборов за {elapsed:.1f} с")
+    return {
+        'windows': windows,
+        'in_sample': in_sample,
+        'out_of_sample': out_of_sample,
+        'summary': pd.DataFrame(summary_rows),
+    }
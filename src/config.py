@@ -29,8 +29,33 @@ if not TWELVE_DATA_API_KEY:
 
 # Формат символа для Twelve Data (например, "EUR/USD")
 TRADING_PAIR = "EUR/USD"
+# Корзина символов для портфельного бэктеста (src/backtest/portfolio.py)
+TRADING_PAIRS = ["EUR/USD", "GBP/USD", "USD/JPY", "AUD/USD", "USD/CHF"]
+RUN_PORTFOLIO_BACKTEST = False # True — main.py прогоняет всю корзину TRADING_PAIRS вместо TRADING_PAIR
+PORTFOLIO_MAX_WORKERS = None # Процессов для портфельного бэктеста (None — по числу ядер)
+RUN_LIVE_REPLAY = False # True — main.py проигрывает хвост истории через live-режим (src/live/runner.py)
+LIVE_REPLAY_BARS = 2000 # Сколько последних свечей M5 подается в live-режим как поток
 # Интервалы для Twelve Data: 1min, 5min, 15min, 30min, 45min, 1h, 2h, 4h, 1day, 1week, 1month
 TIMEFRAME = "1h" # Используем "1h" вместо "H1" для совместимости с Twelve Data
+TIMEFRAME_CONTEXT = "15min" # Контекстный таймфрейм (M15): аккумуляция, ликвидность, манипуляция
+TIMEFRAME_EXECUTION = "5min" # Таймфрейм исполнения (M5): CHoCH/BOS, POI, вход
+
+# --- Локальный кэш исторических данных ---
+DATA_CACHE_DIR = os.path.join(project_root, "data_cache") # Один .npy файл на пару символ/интервал
+BACKTEST_HISTORY_DAYS = 60 # Глубина истории для бэктеста в main.py (дней)
+
+# --- Постраничная загрузка истории (src/utils/history_downloader.py) ---
+HISTORY_BARS_PER_REQUEST = 5000 # Максимальный outputsize одного запроса Twelve Data
+HISTORY_DOWNLOAD_MAX_WORKERS = 4 # Параллельных запросов
+HISTORY_DOWNLOAD_CALLS_PER_MINUTE = 8 # Лимит запросов в минуту (бесплатный тариф Twelve Data)
+HISTORY_DOWNLOAD_MAX_RETRIES = 3 # Повторов при ошибке запроса окна
+
+# --- Торговые сессии (время UTC, формат HH:MM) ---
+FILTER_BY_TRADING_SESSIONS = True
+TRADING_SESSIONS_UTC = {
+    "London": {"start": "07:00", "end": "16:00"},
+    "NewYork": {"start": "12:00", "end": "21:00"},
+}
 
 # --- Параметры стратегии ---
 ACCUMULATION_RANGE_BARS = 50  # Количество свечей для анализа диапазона накопления/распределения
@@ -40,8 +65,61 @@ ACCUMULATION_VOLATILITY_THRESHOLD = 0.005 # Примерный порог для
 ORDER_BLOCK_REFINEMENT_PERCENT = 0.5 # Для определения тела ордер-блока (не используется в текущем упрощенном коде)
 FVG_IMBALANCE_THRESHOLD = 0.001 # Минимальный размер дисбаланса (в пунктах или процентах, не используется в текущем коде)
 
+# Параметры стратегии AMD SMC (используются AmdSMCStrategy и main.py)
+ACC_DIST_BARS_MIN = 10 # Минимальная длина диапазона накопления/распределения (свечи M15)
+ACC_DIST_BARS_MAX = 50 # Максимальная длина диапазона накопления/распределения (свечи M15)
+ACC_DIST_VOLATILITY_THRESHOLD = 3.0 # Максимальная ширина диапазона в единицах ATR M15
+ACC_DIST_PRIOR_TREND_LOOKBACK = 100 # Свечей M15 для проверки тренда перед диапазоном
+ACC_DIST_PRIOR_TREND_MIN_ATR = 5.0 # Минимальное изменение Close за этот lookback (в ATR M15), чтобы считать его трендом
+
+MANIPULATION_SWEEP_DEPTH_ATR_FACTOR = 0.1 # Минимальная глубина свипа ликвидности в ATR M15
+MANIPULATION_RECOVERY_BARS = 3 # За сколько свечей M15 цена должна вернуться за уровень после свипа
+
+CHOSHBOS_IMPULSE_ATR_FACTOR = 1.5 # Минимальный импульс пробоя CHoCH/BOS в ATR M5
+
+POI_DISCOUNT_THRESHOLD = 0.5 # POI для лонга должен быть ниже этого уровня Фибо (дискаунт)
+POI_PREMIUM_THRESHOLD = 0.5 # POI для шорта должен быть выше этого уровня Фибо (премиум)
+FVG_MIN_SIZE_ATR_FACTOR = 0.1 # Минимальный размер FVG в ATR M5
+OB_DISPLACEMENT_ATR_FACTOR = 1.0 # Минимальное смещение цены после Order Block в ATR M5
+OB_DISPLACEMENT_BARS = 3 # За сколько свечей M5 после OB должно произойти смещение (и FVG/BOS)
+POI_MAX_AGE_BARS = 2016 # Через сколько свечей M5 зона POI снимается с учета (неделя; None — никогда)
+
+SL_ATR_MULTIPLIER_EXECUTION = 1.5 # Множитель ATR M5 для стоп-лосса
+SL_OFFSET_POINTS = 0.1 # Отступ SL за экстремум манипуляции (доля ATR M5)
+
+STATE_TRACE_CAPACITY = 0 # Начальная емкость трассы переходов автомата стратегии (0 — трасса выключена)
+
+# --- Профилирование горячего пути (src/utils/profiling.py) ---
+PROFILING_ENABLED = False # Счетчики вызовов и время по функциям/состояниям стратегии
+PROFILING_ALLOC_SAMPLE_START = 1000 # С какой свечи, переданной в стратегию, начинать выборку аллокаций
+PROFILING_ALLOC_SAMPLE_BARS = 500 # Длина окна выборки аллокаций в свечах (0 — не считать)
+PROFILING_OUTPUT_JSON = None # Путь для JSON с итогами профилирования в main.py (None — только печать)
+
 # Параметры риска (примерные, для будущей реализации)
 STOP_LOSS_ATR_MULTIPLIER = 1.5
 TAKE_PROFIT_RR_RATIO = 2.0 # Соотношение риск/прибыль
 
+# --- Симулятор сделок (src/backtest/simulator.py) ---
+RISK_PER_TRADE_FRACTION = 0.01 # Доля капитала под риском на сделку (для кривой капитала)
+MAX_HOLDING_BARS_EXECUTION = None # Принудительный выход через N свечей M5 (None — только SL/TP)
+
 LOG_LEVEL = "INFO" # Уровни логирования: DEBUG, INFO, WARNING, ERROR
+
+# Параметры, которые передаются в AmdSMCStrategy (main.py, оптимизатор параметров)
+STRATEGY_PARAM_NAMES = (
+    "FILTER_BY_TRADING_SESSIONS", "TRADING_SESSIONS_UTC",
+    "ACC_DIST_BARS_MIN", "ACC_DIST_BARS_MAX", "ACC_DIST_VOLATILITY_THRESHOLD", "ACC_DIST_PRIOR_TREND_LOOKBACK",
+    "ACC_DIST_PRIOR_TREND_MIN_ATR",
+    "MANIPULATION_SWEEP_DEPTH_ATR_FACTOR", "MANIPULATION_RECOVERY_BARS",
+    "CHOSHBOS_IMPULSE_ATR_FACTOR",
+    "POI_DISCOUNT_THRESHOLD", "POI_PREMIUM_THRESHOLD", "FVG_MIN_SIZE_ATR_FACTOR",
+    "OB_DISPLACEMENT_ATR_FACTOR", "OB_DISPLACEMENT_BARS", "POI_MAX_AGE_BARS",
+    "SL_ATR_MULTIPLIER_EXECUTION", "SL_OFFSET_POINTS", "TAKE_PROFIT_RR_RATIO",
+    "STATE_TRACE_CAPACITY",
+    "PROFILING_ENABLED", "PROFILING_ALLOC_SAMPLE_START", "PROFILING_ALLOC_SAMPLE_BARS",
+)
+
+
+def get_strategy_config_params():
+    """Словарь параметров стратегии из текущих значений config.py."""
+    return {name: globals()[name] for name in STRATEGY_PARAM_NAMES}
@@ -2,7 +2,11 @@
 # Этот файл будет содержать логику для определения фаз AMD:
 # Накопление (Accumulation), Манипуляция (Manipulation), Распределение (Distribution)
 
+import numpy as np
 import pandas as pd
+
+from src.core.bars import column, timestamp_at
+from src.core.indicators import atr
 # Можно импортировать другие модули из core, если нужно
 # from .market_structure import ...
 # from .liquidity import ...
@@ -17,6 +21,377 @@ AMD_STATE_MANIPULATION_SWEEP_LOOKING_FOR_SHORT = "MANIPULATION_SWEEP_LOOKING_FOR
 AMD_STATE_TREND_CONFIRMED_UP = "TREND_CONFIRMED_UP" # После BOS вверх из манипуляции
 AMD_STATE_TREND_CONFIRMED_DOWN = "TREND_CONFIRMED_DOWN" # После BOS вниз из манипуляции
 
+# Целочисленные коды фаз для пакетной разметки истории (массив int8 на свечу)
+PHASE_UNKNOWN = 0
+PHASE_ACCUMULATION = 1
+PHASE_MANIPULATION_LONG = 2
+PHASE_DISTRIBUTION = 3
+PHASE_MANIPULATION_SHORT = 4
+PHASE_TREND_UP = 5
+PHASE_TREND_DOWN = 6
+
+PHASE_STATES = {
+    PHASE_UNKNOWN: AMD_STATE_UNKNOWN,
+    PHASE_ACCUMULATION: AMD_STATE_ACCUMULATION_CANDIDATE,
+    PHASE_MANIPULATION_LONG: AMD_STATE_MANIPULATION_SWEEP_LOOKING_FOR_LONG,
+    PHASE_DISTRIBUTION: AMD_STATE_DISTRIBUTION_CANDIDATE,
+    PHASE_MANIPULATION_SHORT: AMD_STATE_MANIPULATION_SWEEP_LOOKING_FOR_SHORT,
+    PHASE_TREND_UP: AMD_STATE_TREND_CONFIRMED_UP,
+    PHASE_TREND_DOWN: AMD_STATE_TREND_CONFIRMED_DOWN,
+}
+STATE_PHASES = {state: phase for phase, state in PHASE_STATES.items()}
+
+# Направление тренда перед диапазоном: вниз — диапазон считается накоплением, вверх — распределением
+PRIOR_TREND_DOWN = -1
+PRIOR_TREND_NONE = 0
+PRIOR_TREND_UP = 1
+
+
+def _sparse_table(values, levels, reduce):
+    """
+    Таблица для O(1) запроса max/min на отрезке: table[j, i] = reduce(values[i:i + 2**j]).
+    Хвост строки j (позиции, где окно 2**j выходит за конец массива) не используется.
+    """
+    table = np.empty((levels, len(values)), dtype=np.float64)
+    table[0] = values
+    for j in range(1, levels):
+        half = 1 << (j - 1)
+        table[j, :len(values) - half] = reduce(table[j - 1, :-half], table[j - 1, half:])
+        table[j, len(values) - half:] = table[j - 1, len(values) - half:]
+    return table
+
+
+def _range_query(table, log2, start, end, reduce):
+    """reduce по отрезкам [start, end] включительно (массивы позиций одинаковой длины)."""
+    j = log2[end - start + 1]
+    return reduce(table[j, start], table[j, end - (1 << j) + 1])
+
+
+def find_accumulation_ranges(high, low, close, atr_values, min_bars=10, max_bars=50, volatility_threshold=3.0,
+                             prior_trend_lookback=100, prior_trend_min_atr=5.0, ends=None):
+    """
+    Диапазоны накопления/распределения, заканчивающиеся на каждой свече.
+
+    Для свечи e подходят диапазоны [e - L + 1, e] с min_bars <= L <= max_bars, у которых
+    max(High) - min(Low) <= volatility_threshold * ATR[e]. Ширина не убывает с ростом L, поэтому
+    подходят все длины от min_bars до самой длинной узкой; она находится бинарным поиском сразу
+    для всех свечей, а max/min отрезка берется из sparse table за O(1).
+
+    Тренд перед диапазоном: изменение Close за prior_trend_lookback свечей до начала диапазона,
+    в ATR[e]. Тренд есть, если |изменение| >= prior_trend_min_atr; вниз — накопление, вверх — распределение.
+    Из узких длин выбирается самая длинная с трендом перед ней; если тренда нет ни перед одной —
+    самая длинная узкая (qualified = False). Итого O(N log W + N x W) вместо перебора O(N x W^2).
+
+    Args:
+        high, low, close, atr_values (array-like): Свечи M15 и ATR M15.
+        min_bars, max_bars (int): ACC_DIST_BARS_MIN / ACC_DIST_BARS_MAX.
+        volatility_threshold (float): ACC_DIST_VOLATILITY_THRESHOLD — макс. ширина в ATR.
+        prior_trend_lookback (int): ACC_DIST_PRIOR_TREND_LOOKBACK.
+        prior_trend_min_atr (float): ACC_DIST_PRIOR_TREND_MIN_ATR.
+        ends (array-like, optional): Позиции свечей, для которых искать диапазон (по умолчанию все).
+
+    Returns:
+        dict: Массивы по ends (или по всем свечам): 'end', 'length' (0 — диапазона нет), 'start',
+              'range_high', 'range_low', 'width_atr', 'prior_move_atr', 'prior_trend'
+              (PRIOR_TREND_DOWN / NONE / UP), 'qualified' (диапазон есть и тренд перед ним есть).
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    atr_values = np.asarray(atr_values, dtype=np.float64)
+    n = len(close)
+    ends = np.arange(n, dtype=np.int64) if ends is None else np.asarray(ends, dtype=np.int64)
+    k = len(ends)
+
+    length = np.zeros(k, dtype=np.int64)
+    range_high = np.full(k, np.nan)
+    range_low = np.full(k, np.nan)
+    prior_move_atr = np.full(k, np.nan)
+    prior_trend = np.zeros(k, dtype=np.int8)
+
+    max_bars = min(max_bars, n)
+    if k and max_bars >= min_bars >= 1:
+        log2 = np.zeros(max_bars + 1, dtype=np.int64)
+        log2[2:] = np.floor(np.log2(np.arange(2, max_bars + 1))).astype(np.int64)
+        levels = int(log2[max_bars]) + 1
+        high_table = _sparse_table(high, levels, np.maximum)
+        low_table = _sparse_table(low, levels, np.minimum)
+        limit = volatility_threshold * atr_values[ends]
+
+        def width_ok(rows, lengths):
+            start = ends[rows] - lengths + 1
+            width = (_range_query(high_table, log2, start, ends[rows], np.maximum)
+                     - _range_query(low_table, log2, start, ends[rows], np.minimum))
+            return width <= limit[rows] # NaN (нет ATR) — диапазон не проходит
+
+        # Кандидаты: хватает свечей на минимальную длину и узкий диапазон минимальной длины
+        rows = np.flatnonzero(ends >= min_bars - 1)
+        rows = rows[width_ok(rows, np.full(len(rows), min_bars))]
+        lo = np.full(len(rows), min_bars, dtype=np.int64) # Самая длинная проверенная подходящая длина
+        hi = np.minimum(max_bars, ends[rows] + 1)
+        searching = np.flatnonzero(lo < hi)
+        while searching.size:
+            mid = (lo[searching] + hi[searching] + 1) // 2
+            ok = width_ok(rows[searching], mid)
+            lo[searching] = np.where(ok, mid, lo[searching])
+            hi[searching] = np.where(ok, hi[searching], mid - 1)
+            searching = searching[lo[searching] < hi[searching]]
+
+        # Тренд перед диапазоном: Close[start - 1] - Close[start - lookback]. Все длины от min_bars до
+        # найденной проходят по ширине, а начало (и тренд перед ним) у каждой свое: берется самая
+        # длинная, перед которой есть тренд; если тренда нет ни перед одной — самая длинная (без тренда).
+        # Перебор длин векторный: на каждом шаге проверяются только еще не найденные свечи
+        length[rows] = lo
+        current = lo.copy()
+        pending = np.arange(len(rows))
+        while pending.size:
+            pending_rows = rows[pending]
+            start = ends[pending_rows] - current[pending] + 1
+            has_prior = start - prior_trend_lookback >= 0
+            move = np.full(len(pending), np.nan)
+            move[has_prior] = close[start[has_prior] - 1] - close[start[has_prior] - prior_trend_lookback]
+            move_atr = move / atr_values[ends[pending_rows]]
+            if pending.size == len(rows):
+                prior_move_atr[pending_rows] = move_atr # Самая длинная длина — на случай, если тренда нет
+            strong = np.abs(move_atr) >= prior_trend_min_atr # NaN — тренда нет
+            found_rows = pending_rows[strong]
+            length[found_rows] = current[pending[strong]]
+            prior_move_atr[found_rows] = move_atr[strong]
+            prior_trend[found_rows] = np.sign(move[strong])
+            pending = pending[~strong]
+            current[pending] -= 1
+            pending = pending[current[pending] >= min_bars]
+
+        start = ends[rows] - length[rows] + 1
+        range_high[rows] = _range_query(high_table, log2, start, ends[rows], np.maximum)
+        range_low[rows] = _range_query(low_table, log2, start, ends[rows], np.minimum)
+
+    found = length > 0
+    return {
+        'end': ends,
+        'length': length,
+        'start': np.where(found, ends - length + 1, -1),
+        'range_high': range_high,
+        'range_low': range_low,
+        'width_atr': (range_high - range_low) / atr_values[ends],
+        'prior_move_atr': prior_move_atr,
+        'prior_trend': prior_trend,
+        'qualified': found & (prior_trend != PRIOR_TREND_NONE),
+    }
+
+
+def latest_accumulation_range(df, atr_values=None, min_bars=10, max_bars=50, volatility_threshold=3.0,
+                              prior_trend_lookback=100, prior_trend_min_atr=5.0, atr_period=14):
+    """
+    Диапазон, заканчивающийся на последней свече df (для вызова на каждой закрытой M15).
+
+    Нужны только последние max_bars + prior_trend_lookback свечей, поэтому стоимость вызова
+    не зависит от длины истории. Без atr_values ATR считается по этому хвосту.
+
+    Returns:
+        dict or None: 'phase' ('accumulation' / 'distribution'), 'high', 'low', 'length',
+                      'start_time', 'end_time', 'low_time', 'high_time', 'width_atr', 'prior_move_atr'
+                      или None, если диапазона с трендом перед ним нет.
+    """
+    n = len(df)
+    tail = max_bars + prior_trend_lookback
+    # Запас на сходимость ATR, если он считается по хвосту
+    first = max(0, n - tail - (0 if atr_values is not None else 10 * atr_period))
+    high = column(df, 'High')[first:]
+    low = column(df, 'Low')[first:]
+    close = column(df, 'Close')[first:]
+    if atr_values is None:
+        atr_values = atr(high, low, close, atr_period)
+    else:
+        atr_values = np.asarray(atr_values, dtype=np.float64)[first:n]
+    if not len(close):
+        return None
+
+    result = find_accumulation_ranges(high, low, close, atr_values, min_bars, max_bars, volatility_threshold,
+                                      prior_trend_lookback, prior_trend_min_atr, ends=[len(close) - 1])
+    if not result['qualified'][0]:
+        return None
+    start = int(result['start'][0])
+    end = len(close) - 1
+    low_position = start + int(np.argmin(low[start:end + 1]))
+    high_position = start + int(np.argmax(high[start:end + 1]))
+    return {
+        'phase': 'accumulation' if result['prior_trend'][0] == PRIOR_TREND_DOWN else 'distribution',
+        'high': float(result['range_high'][0]),
+        'low': float(result['range_low'][0]),
+        'length': int(result['length'][0]),
+        'start_time': timestamp_at(df, first + start),
+        'end_time': timestamp_at(df, first + end),
+        'low_time': timestamp_at(df, first + low_position),
+        'high_time': timestamp_at(df, first + high_position),
+        'width_atr': float(result['width_atr'][0]),
+        'prior_move_atr': float(result['prior_move_atr'][0]),
+    }
+
+
+def _first_true(condition, start, n, block=64):
+    """
+    Первая позиция >= start, где condition(a, b) (булев массив для свечей [a, b)) истинна, иначе n.
+    Окно проверки удваивается, поэтому стоимость пропорциональна расстоянию до события.
+    """
+    a = start
+    while a < n:
+        b = min(n, a + block)
+        mask = condition(a, b)
+        if mask.any():
+            return a + int(mask.argmax())
+        a = b
+        block *= 2
+    return n
+
+
+def label_amd_phases(high, low, close, atr_values, min_bars=10, max_bars=50, volatility_threshold=3.0,
+                     prior_trend_lookback=100, prior_trend_min_atr=5.0, recovery_bars=1,
+                     sweep_depth_atr_factor=0.0, index=None, ranges=None):
+    """
+    Разметка всей истории по фазам AMD.
+
+    Правила (те же, что у AMDAnalyzer.update_state):
+    - UNKNOWN / TREND_*: первая свеча с диапазоном и трендом перед ним (find_accumulation_ranges)
+      открывает ACCUMULATION (тренд вниз) или DISTRIBUTION (тренд вверх) с границами диапазона;
+    - ACCUMULATION: Low ниже минимума диапазона начинает свип; возврат Close выше минимума
+      за recovery_bars свечей (и глубина >= sweep_depth_atr_factor * ATR на начале свипа)
+      дает MANIPULATION_LONG, мелкий свип оставляет накопление, отсутствие возврата — UNKNOWN.
+      Close выше максимума диапазона без свипа — UNKNOWN;
+    - MANIPULATION_LONG: Low ниже экстремума свипа — UNKNOWN, Close выше максимума
+      диапазона — TREND_UP;
+    - DISTRIBUTION / MANIPULATION_SHORT — зеркально (свип максимума, TREND_DOWN).
+
+    Цикл Python идет по событиям, а не по свечам: следующее событие ищется векторно
+    (_first_true), поэтому разметка линейна по длине истории.
+
+    Args:
+        high, low, close, atr_values (array-like): Свечи M15 и ATR.
+        min_bars ... prior_trend_min_atr: Параметры find_accumulation_ranges.
+        recovery_bars (int): MANIPULATION_RECOVERY_BARS (>= 1).
+        sweep_depth_atr_factor (float): MANIPULATION_SWEEP_DEPTH_ATR_FACTOR.
+        index (pd.Index, optional): Время свечей для колонки 'timestamp' переходов.
+        ranges (dict, optional): Готовый результат find_accumulation_ranges по тем же свечам.
+
+    Returns:
+        dict: 'phases' — np.int8 на свечу (PHASE_*), 'transitions' — колонки переходов:
+              'index', 'timestamp', 'from_phase', 'to_phase', 'range_low', 'range_high', 'extremum'.
+    """
+    if recovery_bars < 1:
+        raise ValueError(f"recovery_bars должен быть >= 1, получено {recovery_bars}")
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    atr_values = np.asarray(atr_values, dtype=np.float64)
+    n = len(close)
+    if ranges is None:
+        ranges = find_accumulation_ranges(high, low, close, atr_values, min_bars, max_bars, volatility_threshold,
+                                          prior_trend_lookback, prior_trend_min_atr)
+    candidates = np.flatnonzero(ranges['qualified'])
+
+    # Распределение сводится к накоплению сменой знака цен: "минимум" — это -High
+    signed = {1: (low, close), -1: (-high, -close)}
+    rows = []
+    phase = PHASE_UNKNOWN
+    range_low = range_high = np.nan
+    extremum = np.nan
+    pos = 0
+
+    def transition(i, to_phase, extreme=np.nan):
+        rows.append((i, phase, to_phase, range_low, range_high, extreme))
+        return to_phase, i + 1
+
+    while pos < n:
+        if phase in (PHASE_UNKNOWN, PHASE_TREND_UP, PHASE_TREND_DOWN):
+            k = np.searchsorted(candidates, pos)
+            if k == len(candidates):
+                break
+            d = int(candidates[k])
+            range_low = float(ranges['range_low'][d])
+            range_high = float(ranges['range_high'][d])
+            to_phase = PHASE_ACCUMULATION if ranges['prior_trend'][d] == PRIOR_TREND_DOWN else PHASE_DISTRIBUTION
+            phase, pos = transition(d, to_phase)
+            continue
+
+        sign = 1 if phase in (PHASE_ACCUMULATION, PHASE_MANIPULATION_LONG) else -1
+        lows, closes = signed[sign]
+        level_low, level_high = (range_low, range_high) if sign > 0 else (-range_high, -range_low)
+
+        if phase in (PHASE_ACCUMULATION, PHASE_DISTRIBUTION):
+            j = _first_true(lambda a, b: (lows[a:b] < level_low) | (closes[a:b] > level_high), pos, n)
+            if j == n:
+                break
+            if not lows[j] < level_low:
+                phase, pos = transition(j, PHASE_UNKNOWN) # Выход из диапазона без свипа
+                continue
+            window_end = min(n, j + recovery_bars)
+            recovered = closes[j:window_end] > level_low
+            if not recovered.any():
+                if j + recovery_bars > n:
+                    break # Возврат еще возможен после конца истории
+                phase, pos = transition(j + recovery_bars - 1, PHASE_UNKNOWN)
+                continue
+            k = j + int(recovered.argmax())
+            extreme = float(lows[j:k + 1].min())
+            depth_ok = True
+            if sweep_depth_atr_factor > 0 and atr_values[j] == atr_values[j]:
+                depth_ok = (level_low - extreme) >= sweep_depth_atr_factor * atr_values[j]
+            if depth_ok:
+                extremum = extreme
+                to_phase = PHASE_MANIPULATION_LONG if sign > 0 else PHASE_MANIPULATION_SHORT
+                phase, pos = transition(k, to_phase, extreme * sign)
+            else:
+                pos = k + 1 # Мелкий свип: диапазон остается в силе
+            continue
+
+        # MANIPULATION_*: пробой экстремума свипа или закрытие за противоположной границей диапазона
+        j = _first_true(lambda a, b: (lows[a:b] < extremum) | (closes[a:b] > level_high), pos, n)
+        if j == n:
+            break
+        if lows[j] < extremum:
+            phase, pos = transition(j, PHASE_UNKNOWN)
+        else:
+            phase, pos = transition(j, PHASE_TREND_UP if sign > 0 else PHASE_TREND_DOWN)
+
+    columns = list(zip(*rows)) if rows else [[]] * 6
+    transitions = {
+        'index': np.asarray(columns[0], dtype=np.int64),
+        'from_phase': np.asarray(columns[1], dtype=np.int8),
+        'to_phase': np.asarray(columns[2], dtype=np.int8),
+        'range_low': np.asarray(columns[3], dtype=np.float64),
+        'range_high': np.asarray(columns[4], dtype=np.float64),
+        'extremum': np.asarray(columns[5], dtype=np.float64),
+    }
+    transitions['timestamp'] = np.asarray(index)[transitions['index']] if index is not None else None
+
+    # Фаза свечи — фаза после последнего перехода на ней или раньше
+    last = np.searchsorted(transitions['index'], np.arange(n), side='right') - 1
+    phases = np.where(last >= 0, transitions['to_phase'][np.maximum(last, 0)], PHASE_UNKNOWN).astype(np.int8)
+    return {'phases': phases, 'transitions': transitions}
+
+
+def transition_follow_rate(transitions, from_phase, to_phase, within_bars):
+    """
+    Как часто за переходом в from_phase в пределах within_bars свечей следует переход в to_phase
+    (например, свип после накопления), без повторного прогона автомата.
+
+    Returns:
+        dict: 'count' (переходов в from_phase), 'followed', 'rate', 'lag' (свечей до to_phase,
+              -1 — не последовал).
+    """
+    starts = transitions['index'][transitions['to_phase'] == from_phase]
+    targets = transitions['index'][transitions['to_phase'] == to_phase]
+    lag = np.full(len(starts), -1, dtype=np.int64)
+    if len(targets):
+        k = np.searchsorted(targets, starts, side='right')
+        has_next = k < len(targets)
+        lag[has_next] = targets[k[has_next]] - starts[has_next]
+    followed = (lag >= 0) & (lag <= within_bars)
+    lag = np.where(followed, lag, -1)
+    count = len(starts)
+    return {'count': count, 'followed': int(followed.sum()),
+            'rate': followed.sum() / count if count else np.nan, 'lag': lag}
+
 
 class AMDAnalyzer:
     def __init__(self, config):
@@ -25,59 +400,185 @@ class AMDAnalyzer:
         self.accumulation_range = None # {'low': float, 'high': float, 'start_time': datetime, 'end_time': datetime}
         self.distribution_range = None # Аналогично
         self.last_manipulation_details = None # Детали последнего свипа
+        self.manipulation_extremum = None # Экстремум подтвержденного свипа (Low для лонга, High для шорта)
+        self._sweep = None # Незавершенный свип: {'start', 'extreme', 'atr'} (цены со знаком направления)
 
-    def identify_accumulation_phase(self, df_slice):
+    def identify_accumulation_phase(self, df_slice, atr_values=None):
         """
-        Пытается идентифицировать фазу накопления.
-        Должен анализировать консолидацию, возможно, объемы (если доступны и надежны).
-        Возвращает True и детали диапазона, если найдено, иначе False.
+        Ищет диапазон накопления/распределения, заканчивающийся на последней свече среза
+        (см. latest_accumulation_range): ширина в ATR не больше ACC_DIST_VOLATILITY_THRESHOLD,
+        длина ACC_DIST_BARS_MIN..ACC_DIST_BARS_MAX, перед диапазоном — тренд.
+        Тренд вниз дает накопление, вверх — распределение.
+
+        Returns:
+            bool: True, если диапазон найден.
+            dict: Детали диапазона или None.
         """
-        # Упрощенная логика: если цена находится в узком диапазоне N свечей
-        # Требует ACCUMULATION_RANGE_BARS, ACCUMULATION_VOLATILITY_THRESHOLD из config
-        
-        # Placeholder:
-        # if len(df_slice) < self.config.get('ACCUMULATION_RANGE_BARS', 50):
-        #     return False, None
-        # recent_data = df_slice.tail(self.config.get('ACCUMULATION_RANGE_BARS', 50))
-        # price_range = recent_data['High'].max() - recent_data['Low'].min()
-        # avg_price = (recent_data['High'].max() + recent_data['Low'].min()) / 2
-        # if price_range / avg_price < self.config.get('ACCUMULATION_VOLATILITY_THRESHOLD', 0.01): # 1% диапазон
-        #     self.accumulation_range = {'low': recent_data['Low'].min(), 'high': recent_data['High'].max()}
-        #     self.current_amd_state = AMD_STATE_ACCUMULATION_CANDIDATE
-        #     print(f"Обнаружен кандидат на накопление: {self.accumulation_range}")
-        #     return True, self.accumulation_range
-        return False, None # Заглушка
-
-    def identify_manipulation_phase(self, df_slice, accumulation_low, distribution_high):
+        details = latest_accumulation_range(df_slice, atr_values=atr_values, **self._accumulation_params())
+        if details is None:
+            return False, None
+
+        range_info = {'low': details['low'], 'high': details['high'],
+                      'start_time': details['start_time'], 'end_time': details['end_time']}
+        if details['phase'] == 'accumulation':
+            self.accumulation_range = range_info
+            self.current_amd_state = AMD_STATE_ACCUMULATION_CANDIDATE
+        else:
+            self.distribution_range = range_info
+            self.current_amd_state = AMD_STATE_DISTRIBUTION_CANDIDATE
+        return True, details
+
+    def _accumulation_params(self):
+        return {
+            'min_bars': self.config.get('ACC_DIST_BARS_MIN', 10),
+            'max_bars': self.config.get('ACC_DIST_BARS_MAX', 50),
+            'volatility_threshold': self.config.get('ACC_DIST_VOLATILITY_THRESHOLD', 3.0),
+            'prior_trend_lookback': self.config.get('ACC_DIST_PRIOR_TREND_LOOKBACK', 100),
+            'prior_trend_min_atr': self.config.get('ACC_DIST_PRIOR_TREND_MIN_ATR', 5.0),
+        }
+
+    def _tail_atr(self, df_slice):
+        """ATR по хвосту среза, достаточному для диапазона и тренда перед ним (остальное — NaN)."""
+        params = self._accumulation_params()
+        n = len(df_slice)
+        first = max(0, n - params['max_bars'] - params['prior_trend_lookback'] - 10 * 14)
+        values = np.full(n, np.nan)
+        values[first:] = atr(column(df_slice, 'High')[first:], column(df_slice, 'Low')[first:],
+                             column(df_slice, 'Close')[first:])
+        return values
+
+    def identify_manipulation_phase(self, df_slice, accumulation_low=None, distribution_high=None,
+                                    atr_values=None, current_candle_index=None):
         """
-        Идентифицирует манипуляцию (свип ликвидности) после фазы накопления/распределения.
+        Идентифицирует манипуляцию (свип ликвидности) после фазы накопления/распределения
+        по последней свече среза.
+
+        Свип начинается свечой с Low ниже accumulation_low (High выше distribution_high),
+        манипуляция подтверждается, когда Close возвращается за уровень не позже чем через
+        MANIPULATION_RECOVERY_BARS свечей и глубина свипа не меньше
+        MANIPULATION_SWEEP_DEPTH_ATR_FACTOR * ATR свечи начала свипа. Незавершенный свип
+        хранится между вызовами.
+
+        Args:
+            df_slice (pd.DataFrame or BarSeries): Свечи M15 до текущей включительно.
+            accumulation_low (float, optional): Минимум диапазона накопления (свип вниз).
+            distribution_high (float, optional): Максимум диапазона распределения (свип вверх).
+            atr_values (np.ndarray, optional): ATR по свечам среза.
+            current_candle_index (int, optional): Позиция текущей свечи в истории (по умолчанию
+                len(df_slice) - 1); по ней считается возраст свипа.
+
+        Returns:
+            bool: True, если на этой свече манипуляция подтверждена.
+        """
+        if accumulation_low is not None:
+            sign, level = 1, accumulation_low
+        elif distribution_high is not None:
+            sign, level = -1, -distribution_high
+        else:
+            return False
+        i = len(df_slice) - 1
+        position = i if current_candle_index is None else current_candle_index
+        low = float(column(df_slice, 'Low')[i]) if sign > 0 else -float(column(df_slice, 'High')[i])
+        close = sign * float(column(df_slice, 'Close')[i])
+
+        sweep = self._sweep
+        if sweep is None:
+            if not low < level:
+                return False
+            if atr_values is None:
+                atr_values = self._tail_atr(df_slice)
+            sweep = self._sweep = {'start': position, 'extreme': low, 'atr': float(np.asarray(atr_values)[i])}
+        else:
+            sweep['extreme'] = min(sweep['extreme'], low)
+
+        if not close > level:
+            if position - sweep['start'] + 1 >= self.config.get('MANIPULATION_RECOVERY_BARS', 1):
+                self._sweep = None
+                self.current_amd_state = AMD_STATE_UNKNOWN # Цена не вернулась: это пробой, а не свип
+            return False
+
+        self._sweep = None
+        depth_factor = self.config.get('MANIPULATION_SWEEP_DEPTH_ATR_FACTOR', 0.0)
+        if depth_factor > 0 and sweep['atr'] == sweep['atr'] and (level - sweep['extreme']) < depth_factor * sweep['atr']:
+            return False # Мелкий свип: диапазон остается в силе
+
+        self.manipulation_extremum = sign * sweep['extreme']
+        self.last_manipulation_details = {
+            'direction': 'long' if sign > 0 else 'short',
+            'level': sign * level,
+            'extremum': self.manipulation_extremum,
+            'sweep_start': sweep['start'],
+            'confirmed_at': position,
+        }
+        self.current_amd_state = (AMD_STATE_MANIPULATION_SWEEP_LOOKING_FOR_LONG if sign > 0
+                                  else AMD_STATE_MANIPULATION_SWEEP_LOOKING_FOR_SHORT)
+        return True
+
+    def update_state(self, df_slice, current_candle_index=None, atr_values=None):
+        """
+        Обновляет состояние анализатора AMD по последней закрытой свече среза — по тем же
+        правилам, что label_amd_phases (не больше одного перехода на свечу):
+        диапазон -> свип с возвратом -> закрытие за противоположной границей диапазона.
+
+        Args:
+            df_slice (pd.DataFrame or BarSeries): Свечи M15 до текущей включительно.
+            current_candle_index (int, optional): Позиция текущей свечи в истории.
+            atr_values (np.ndarray, optional): ATR по свечам среза (иначе считается по срезу).
+
+        Returns:
+            str: Текущее состояние AMD_STATE_*.
         """
-        # Placeholder:
-        # if self.current_amd_state == AMD_STATE_ACCUMULATION_CANDIDATE and accumulation_low:
-        #     if check_liquidity_sweep(df_slice, len(df_slice)-1, accumulation_low, is_sweeping_below=True):
-        #         self.current_amd_state = AMD_STATE_MANIPULATION_SWEEP_LOOKING_FOR_LONG
-        #         print(f"Обнаружена манипуляция (свип) ниже {accumulation_low}")
-        #         return True
-        # ... аналогично для шорта ...
-        return False # Заглушка
-
-    def update_state(self, df_slice, current_candle_index):
+        if len(df_slice) == 0:
+            return self.current_amd_state
+        if atr_values is None:
+            atr_values = self._tail_atr(df_slice)
+        state = self.current_amd_state
+
+        if state in (AMD_STATE_UNKNOWN, AMD_STATE_TREND_CONFIRMED_UP, AMD_STATE_TREND_CONFIRMED_DOWN):
+            self.identify_accumulation_phase(df_slice, atr_values=atr_values)
+            return self.current_amd_state
+
+        i = len(df_slice) - 1
+        high = float(column(df_slice, 'High')[i])
+        low = float(column(df_slice, 'Low')[i])
+        close = float(column(df_slice, 'Close')[i])
+
+        if state == AMD_STATE_ACCUMULATION_CANDIDATE:
+            acc = self.accumulation_range
+            if self._sweep is None and not low < acc['low'] and close > acc['high']:
+                self.current_amd_state = AMD_STATE_UNKNOWN # Выход из диапазона вверх без свипа
+            else:
+                self.identify_manipulation_phase(df_slice, accumulation_low=acc['low'], atr_values=atr_values,
+                                                 current_candle_index=current_candle_index)
+        elif state == AMD_STATE_DISTRIBUTION_CANDIDATE:
+            dist = self.distribution_range
+            if self._sweep is None and not high > dist['high'] and close < dist['low']:
+                self.current_amd_state = AMD_STATE_UNKNOWN
+            else:
+                self.identify_manipulation_phase(df_slice, distribution_high=dist['high'], atr_values=atr_values,
+                                                 current_candle_index=current_candle_index)
+        elif state == AMD_STATE_MANIPULATION_SWEEP_LOOKING_FOR_LONG:
+            if low < self.manipulation_extremum:
+                self.current_amd_state = AMD_STATE_UNKNOWN # Экстремум свипа обновлен: манипуляция сломана
+            elif close > self.accumulation_range['high']:
+                self.current_amd_state = AMD_STATE_TREND_CONFIRMED_UP
+        elif state == AMD_STATE_MANIPULATION_SWEEP_LOOKING_FOR_SHORT:
+            if high > self.manipulation_extremum:
+                self.current_amd_state = AMD_STATE_UNKNOWN
+            elif close < self.distribution_range['low']:
+                self.current_amd_state = AMD_STATE_TREND_CONFIRMED_DOWN
+        return self.current_amd_state
+
+    def label_history(self, df, atr_values=None):
         """
-        Обновляет состояние анализатора AMD на основе последней свечи/среза данных.
+        Пакетная разметка всей истории M15 по фазам AMD (label_amd_phases) с параметрами
+        анализатора: результат совпадает с update_state, вызванным на каждой свече.
         """
-        # Эта функция будет вызывать другие методы для определения фаз
-        # и изменять self.current_amd_state
-        
-        # Пример очень упрощенной логики:
-        # 1. Искать накопление
-        # 2. Если есть накопление, искать манипуляцию (свип)
-        # 3. Если есть манипуляция, ждать BOS/CHoCH (это уже в стратегии)
-        
-        # if self.current_amd_state in [AMD_STATE_UNKNOWN, AMD_STATE_TREND_CONFIRMED_UP, AMD_STATE_TREND_CONFIRMED_DOWN]:
-        #     found, details = self.identify_accumulation_phase(df_slice)
-        #     # ... и так далее
-        
-        # print(f"AMD State on {df_slice.index[-1]}: {self.current_amd_state}") # Для отладки
-        pass # Заглушка
-
-# TODO: Реализовать полную логику определения фаз AMD.
+        if atr_values is None:
+            atr_values = atr(column(df, 'High'), column(df, 'Low'), column(df, 'Close'))
+        return label_amd_phases(
+            column(df, 'High'), column(df, 'Low'), column(df, 'Close'), atr_values,
+            recovery_bars=self.config.get('MANIPULATION_RECOVERY_BARS', 1),
+            sweep_depth_atr_factor=self.config.get('MANIPULATION_SWEEP_DEPTH_ATR_FACTOR', 0.0),
+            index=df.index, **self._accumulation_params(),
+        )
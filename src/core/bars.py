@@ -0,0 +1,262 @@
+# src/core/bars.py
+# Компактное хранилище свечей: колонки OHLCV как массивы NumPy (float64 или float32)
+# и время как int64 (наносекунды UTC). Заменяет DataFrame/pd.Series в горячем пути:
+# доступ к свече — индексация массива, срез — view без копирования.
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+class Bar(NamedTuple):
+    """
+    Легковесная запись свечи, которую движок передает в стратегию вместо pd.Series.
+    Поля названы как колонки DataFrame, поэтому работают оба стиля доступа:
+    bar.Close и bar['Close']. Поле name повторяет pd.Series.name из iterrows (время свечи).
+    """
+    name: object
+    Open: float
+    High: float
+    Low: float
+    Close: float
+    Volume: float
+    position: int # Позиция свечи в массивах таймфрейма исполнения
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+
+def _timestamp_to_ns(timestamp):
+    """Время свечи в int64 наносекунд UTC (наивное время считается UTC)."""
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    ts = pd.Timestamp(timestamp)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return ts.value
+
+
+def _read_only(view):
+    """Помечает view только для чтения (исходный буфер остается изменяемым)."""
+    view.flags.writeable = False
+    return view
+
+
+class BarSeries:
+    """
+    Растущий ряд свечей одного таймфрейма.
+
+    Данные лежат в предвыделенных массивах, append() дописывает свечу за амортизированное
+    O(1) (емкость удваивается). Доступ:
+    - bars['High'] — view колонки (np.ndarray) длиной len(bars);
+    - bars[i] — запись Bar (i может быть отрицательным);
+    - bars[a:b] — BarSeries-view на те же буферы без копирования (только чтение:
+      дописывать в срез нельзя, а последующий рост исходного ряда срез не меняет);
+    - bars.timestamps — int64 наносекунды UTC, bars.index — pd.DatetimeIndex (строится по запросу).
+    Колонки, timestamps и буферы срезов отдаются с writeable=False: запись через них
+    изменила бы историю у всех, кто держит тот же буфер (стратегия, движок, воркеры).
+    Свечи меняются только через append() / extend().
+
+    На свечу приходится 8 байт времени плюс 5 колонок по 8 (float64) или 4 (float32) байта.
+    """
+
+    def __init__(self, capacity=1024, dtype=np.float64, tz=None):
+        """
+        Args:
+            capacity (int): Начальная емкость буферов (свечей).
+            dtype: Тип цен, np.float64 или np.float32.
+            tz: Часовой пояс, в котором отдается index (None — наивное UTC, как в data_loader).
+        """
+        self.dtype = np.dtype(dtype)
+        self.tz = tz
+        self._length = 0
+        self._is_view = False
+        self._timestamps = np.empty(max(1, capacity), dtype=np.int64)
+        self._columns = {col: np.empty(max(1, capacity), dtype=self.dtype) for col in OHLCV_COLUMNS}
+
+    @classmethod
+    def from_arrays(cls, timestamps_ns, open_, high, low, close, volume=None, dtype=np.float64, tz=None):
+        """Ряд из готовых массивов (копируются в буферы нужного типа)."""
+        n = len(timestamps_ns)
+        bars = cls(capacity=n, dtype=dtype, tz=tz)
+        bars._timestamps[:n] = timestamps_ns
+        for col, values in zip(OHLCV_COLUMNS, (open_, high, low, close, volume)):
+            bars._columns[col][:n] = np.nan if values is None else values
+        bars._length = n
+        return bars
+
+    @classmethod
+    def from_buffers(cls, timestamps_ns, columns, tz=None):
+        """
+        Ряд поверх готовых массивов без копирования (например, np.load(..., mmap_mode='r')
+        или буферов shared memory). Такой ряд, как и срез, только для чтения.
+        """
+        bars = cls.__new__(cls)
+        bars.dtype = np.dtype(columns['Close'].dtype)
+        bars.tz = tz
+        bars._length = len(timestamps_ns)
+        bars._is_view = True
+        bars._timestamps = timestamps_ns
+        bars._columns = {col: columns[col] for col in OHLCV_COLUMNS}
+        return bars
+
+    @classmethod
+    def from_dataframe(cls, df, dtype=np.float64):
+        """Ряд из DataFrame OHLCV (отсутствующие колонки, например Volume у FX, заполняются NaN)."""
+        index = pd.DatetimeIndex(df.index)
+        tz = index.tz
+        if tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        columns = [df[col].to_numpy(dtype=np.float64) if col in df.columns else None for col in OHLCV_COLUMNS]
+        return cls.from_arrays(index.as_unit('ns').asi8, *columns, dtype=dtype, tz=tz)
+
+    def to_dataframe(self):
+        """DataFrame в формате data_loader (индекс 'Timestamp')."""
+        return pd.DataFrame({col: self[col] for col in OHLCV_COLUMNS}, index=self.index)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def empty(self):
+        return self._length == 0
+
+    @property
+    def nbytes(self):
+        """Объем занятых данных (без учета незаполненной емкости)."""
+        return self._length * (self._timestamps.itemsize + len(OHLCV_COLUMNS) * self.dtype.itemsize)
+
+    @property
+    def timestamps(self):
+        return _read_only(self._timestamps[:self._length])
+
+    @property
+    def index(self):
+        index = pd.DatetimeIndex(self.timestamps.view('datetime64[ns]'), name='Timestamp')
+        if self.tz is not None:
+            index = index.tz_localize('UTC').tz_convert(self.tz)
+        return index
+
+    def timestamp(self, i):
+        """Время i-й свечи как pd.Timestamp (в tz ряда)."""
+        ts = pd.Timestamp(int(self.timestamps[i]))
+        return ts.tz_localize('UTC').tz_convert(self.tz) if self.tz is not None else ts
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return _read_only(self._columns[key][:self._length])
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            if step != 1:
+                raise ValueError("BarSeries поддерживает только срезы с шагом 1")
+            return self._view(start, max(start, stop))
+        i = int(key)
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError(f"Позиция {key} вне ряда длиной {self._length}")
+        cols = self._columns
+        return Bar(self.timestamp(i), float(cols['Open'][i]), float(cols['High'][i]), float(cols['Low'][i]),
+                   float(cols['Close'][i]), float(cols['Volume'][i]), i)
+
+    def _view(self, start, stop):
+        view = BarSeries.__new__(BarSeries)
+        view.dtype = self.dtype
+        view.tz = self.tz
+        view._length = stop - start
+        view._is_view = True
+        view._timestamps = _read_only(self._timestamps[start:stop])
+        view._columns = {col: _read_only(values[start:stop]) for col, values in self._columns.items()}
+        return view
+
+    def _reserve(self, capacity):
+        if capacity <= len(self._timestamps):
+            return
+        new_capacity = max(capacity, 2 * len(self._timestamps))
+        timestamps = np.empty(new_capacity, dtype=np.int64)
+        timestamps[:self._length] = self._timestamps[:self._length]
+        self._timestamps = timestamps
+        for col, values in self._columns.items():
+            grown = np.empty(new_capacity, dtype=self.dtype)
+            grown[:self._length] = values[:self._length]
+            self._columns[col] = grown
+
+    def append(self, timestamp, open_, high, low, close, volume=float('nan')):
+        """Дописывает закрытую свечу. timestamp — int64 наносекунд UTC, datetime или pd.Timestamp."""
+        if self._is_view:
+            raise ValueError("Нельзя дописывать свечи в срез BarSeries")
+        n = self._length
+        if n == len(self._timestamps):
+            self._reserve(n + 1)
+        self._timestamps[n] = _timestamp_to_ns(timestamp)
+        cols = self._columns
+        cols['Open'][n] = open_
+        cols['High'][n] = high
+        cols['Low'][n] = low
+        cols['Close'][n] = close
+        cols['Volume'][n] = volume
+        self._length = n + 1
+
+    def extend(self, other):
+        """Дописывает свечи из другого BarSeries или DataFrame одной операцией копирования."""
+        if self._is_view:
+            raise ValueError("Нельзя дописывать свечи в срез BarSeries")
+        if not isinstance(other, BarSeries):
+            other = BarSeries.from_dataframe(other, dtype=self.dtype)
+        n, m = self._length, len(other)
+        self._reserve(n + m)
+        self._timestamps[n:n + m] = other.timestamps
+        for col in OHLCV_COLUMNS:
+            self._columns[col][n:n + m] = other[col]
+        self._length = n + m
+
+
+class GrowableArray:
+    """Одномерный массив с дозаписью за амортизированное O(1) (например, ATR в live-режиме)."""
+
+    def __init__(self, values=None, capacity=1024, dtype=np.float64):
+        values = np.empty(0, dtype=dtype) if values is None else np.asarray(values, dtype=dtype)
+        self._length = len(values)
+        self._data = np.empty(max(capacity, 2 * self._length, 1), dtype=dtype)
+        self._data[:self._length] = values
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def values(self):
+        """View заполненной части (после следующего append может указывать на старый буфер)."""
+        return self._data[:self._length]
+
+    def append(self, value):
+        if self._length == len(self._data):
+            grown = np.empty(2 * len(self._data), dtype=self._data.dtype)
+            grown[:self._length] = self._data
+            self._data = grown
+        self._data[self._length] = value
+        self._length += 1
+
+
+def as_bar_series(data, dtype=np.float64):
+    """BarSeries как есть, DataFrame — конвертируется (один раз, вне горячего пути)."""
+    if isinstance(data, BarSeries):
+        return data
+    return BarSeries.from_dataframe(data, dtype=dtype)
+
+
+def column(data, name):
+    """Колонка свечей как np.ndarray: view для BarSeries, to_numpy() для DataFrame."""
+    if isinstance(data, BarSeries):
+        return data[name]
+    return data[name].to_numpy()
+
+
+def timestamp_at(data, i):
+    """Время i-й свечи для BarSeries или DataFrame."""
+    if isinstance(data, BarSeries):
+        return data.timestamp(i)
+    return data.index[i]
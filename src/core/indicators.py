@@ -0,0 +1,168 @@
+# src/core/indicators.py
+# Индикаторы на NumPy: пакетный расчет по массивам за один проход
+# и потоковые версии с обновлением за O(1) на новую свечу.
+import math
+
+import numpy as np
+import pandas as pd
+
+from src.core.state import Checkpointable
+
+# Внутри блока сглаживания масштаб d^-j не превышает 1e12, поэтому кумулятивная сумма
+# неотрицательных слагаемых остается точной в float64.
+_MAX_BLOCK_SCALE_LOG = math.log(1e12)
+
+
+def _as_float_array(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def _forward_fill(values):
+    """Заполняет NaN последним валидным значением (ведущие NaN остаются NaN)."""
+    mask = np.isnan(values)
+    if not mask.any():
+        return values
+    idx = np.where(mask, 0, np.arange(len(values)))
+    np.maximum.accumulate(idx, out=idx)
+    return values[idx]
+
+
+def true_range(high, low, close):
+    """
+    True Range: max(High - Low, |High - Close[-1]|, |Low - Close[-1]|).
+    Для первой свечи предыдущего Close нет, TR = High - Low.
+
+    Args:
+        high, low, close (array-like): Массивы (или pd.Series) одинаковой длины.
+
+    Returns:
+        np.ndarray: Массив TR (float64).
+    """
+    high = _as_float_array(high)
+    low = _as_float_array(low)
+    close = _as_float_array(close)
+
+    prev_close = np.empty_like(close)
+    if len(close):
+        prev_close[0] = np.nan
+        prev_close[1:] = close[:-1]
+
+    # fmax игнорирует NaN, как max(axis=1) в pandas
+    tr = high - low
+    tr = np.fmax(tr, np.abs(high - prev_close))
+    tr = np.fmax(tr, np.abs(low - prev_close))
+    return tr
+
+
+def wilder_smooth(values, period):
+    """
+    Сглаживание Уайлдера (EMA с alpha = 1/period, adjust=False):
+    out[0] = values[0], out[i] = out[i-1] + (values[i] - out[i-1]) / period.
+
+    Рекуррентность считается блоками: внутри блока out выражается через кумулятивную
+    сумму values[k] * d^-k (d = 1 - 1/period), поэтому цикл Python идет по блокам,
+    а не по свечам. NaN внутри ряда заменяются последним валидным значением.
+
+    Args:
+        values (array-like): Неотрицательный ряд (например, TR).
+        period (int): Период сглаживания.
+
+    Returns:
+        np.ndarray: Сглаженный ряд той же длины.
+    """
+    values = _forward_fill(_as_float_array(values))
+    n = len(values)
+    out = np.full(n, np.nan)
+    if n == 0:
+        return out
+
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) == 0:
+        return out
+    first = valid[0]
+    values = values[first:]
+    n_valid = len(values)
+
+    alpha = 1.0 / period
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[first:] = values
+        return out
+
+    block = max(1, min(n_valid, int(_MAX_BLOCK_SCALE_LOG / -math.log(decay))))
+    powers = decay ** np.arange(block)
+    inv_powers = 1.0 / powers
+
+    smoothed = out[first:]
+    prev = values[0] # out[0] = values[0]: то же самое, что prev = values[0] перед первым блоком
+    for start in range(0, n_valid, block):
+        chunk = values[start:start + block]
+        m = len(chunk)
+        # out[j] = d^(j+1) * prev + alpha * sum_{k<=j} d^(j-k) * chunk[k]
+        acc = np.cumsum(chunk * inv_powers[:m])
+        acc *= powers[:m]
+        acc *= alpha
+        acc += powers[:m] * (decay * prev)
+        smoothed[start:start + m] = acc
+        prev = acc[-1]
+    return out
+
+
+def atr(high, low, close, period=14):
+    """
+    Average True Range (сглаживание Уайлдера), один проход по массивам.
+
+    Args:
+        high, low, close (array-like or pd.Series): Цены.
+        period (int): Период ATR.
+
+    Returns:
+        pd.Series, если high передан как pd.Series (с тем же индексом), иначе np.ndarray.
+        Первые period значений — период прогрева.
+    """
+    values = wilder_smooth(true_range(high, low, close), period)
+    if isinstance(high, pd.Series):
+        return pd.Series(values, index=high.index, name='ATR')
+    return values
+
+
+class StreamingATR(Checkpointable):
+    """
+    Потоковый ATR: обновление за O(1) на каждую закрытую свечу.
+    Использует ту же рекуррентность, что и atr(), поэтому после seed() по истории
+    и update() по новым свечам значения совпадают с пакетным расчетом.
+    """
+
+    _STATE_FIELDS = ('value', 'prev_close', 'count')
+
+    def __init__(self, period=14):
+        self.period = period
+        self.value = float('nan')
+        self.prev_close = float('nan')
+        self.count = 0
+
+    def seed(self, high, low, close):
+        """Инициализирует состояние по истории (пакетный расчет). Возвращает массив ATR."""
+        values = atr(_as_float_array(high), _as_float_array(low), _as_float_array(close), self.period)
+        close = _as_float_array(close)
+        self.count = len(values)
+        if self.count:
+            self.value = float(values[-1])
+            self.prev_close = float(close[-1])
+        return values
+
+    def update(self, high, low, close):
+        """Добавляет закрытую свечу и возвращает новое значение ATR."""
+        tr = high - low
+        if self.prev_close == self.prev_close: # не NaN
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+
+        if tr == tr:
+            if self.value == self.value:
+                self.value += (tr - self.value) / self.period
+            else:
+                self.value = tr
+        if close == close:
+            self.prev_close = close
+        self.count += 1
+        return self.value
@@ -1,27 +1,172 @@
 # src/core/liquidity.py
+from bisect import bisect_left, insort
+from collections import deque
+
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.core.bars import column, timestamp_at
+from src.core.state import Checkpointable
+
+
+def _top_positions(values, num_levels, largest):
+    """Позиции num_levels крайних значений; при равенстве раньше идет более ранняя свеча (как nlargest)."""
+    keys = -values if largest else values
+    order = np.argsort(keys, kind='stable')
+    order = order[~np.isnan(values[order])]
+    return order[:num_levels]
+
 
 def identify_significant_liquidity_levels(df_context, lookback_period, num_levels=1):
     """
     Идентифицирует значимые уровни ликвидности (BSL/SSL) на контекстном таймфрейме (например, M15).
     Возвращает словари с BSL (самые высокие High) и SSL (самые низкие Low) за lookback_period.
+    df_context — pd.DataFrame или BarSeries.
     """
     if len(df_context) < lookback_period:
         return {'BSL': [], 'SSL': []}
 
-    relevant_data = df_context.iloc[-lookback_period:]
-    
+    offset = len(df_context) - lookback_period
+    highs = np.asarray(column(df_context, 'High'), dtype=np.float64)[offset:]
+    lows = np.asarray(column(df_context, 'Low'), dtype=np.float64)[offset:]
+
     # Находим N самых высоких максимумов
-    top_bsl = relevant_data.nlargest(num_levels, 'High')
-    bsl_levels = [{'price': row['High'], 'timestamp': idx} for idx, row in top_bsl.iterrows()]
+    bsl_levels = [{'price': float(highs[i]), 'timestamp': timestamp_at(df_context, offset + i)}
+                  for i in _top_positions(highs, num_levels, largest=True)]
 
     # Находим N самых низких минимумов
-    bottom_ssl = relevant_data.nsmallest(num_levels, 'Low')
-    ssl_levels = [{'price': row['Low'], 'timestamp': idx} for idx, row in bottom_ssl.iterrows()]
+    ssl_levels = [{'price': float(lows[i]), 'timestamp': timestamp_at(df_context, offset + i)}
+                  for i in _top_positions(lows, num_levels, largest=False)]
     
     return {'BSL': bsl_levels, 'SSL': ssl_levels}
 
 
+def _swept_by_rank(level_index):
+    """
+    Уровень ранга r снят (swept), если среди уровней с более высоким рангом есть более поздняя свеча:
+    она и есть свеча, прошедшая за уровень. level_index: (..., N) позиции уровней по рангу.
+    """
+    num_levels = level_index.shape[-1]
+    swept = np.zeros(level_index.shape, dtype=bool)
+    for rank in range(1, num_levels):
+        swept[..., rank] = (level_index[..., :rank] > level_index[..., rank:rank + 1]).any(axis=-1)
+    return swept
+
+
+def liquidity_levels_batch(high, low, lookback_period, num_levels=1, chunk_size=65536):
+    """
+    Уровни BSL/SSL для каждой свечи истории (то же, что identify_significant_liquidity_levels
+    на срезе, заканчивающемся этой свечой), векторно по скользящим окнам.
+
+    Args:
+        high, low (array-like): Массивы High и Low.
+        lookback_period (int): Длина окна.
+        num_levels (int): Количество уровней с каждой стороны.
+        chunk_size (int): Сколько окон обрабатывать за раз (ограничивает память).
+
+    Returns:
+        dict: Массивы формы (n, num_levels), уровни упорядочены по рангу:
+              'bsl_price', 'bsl_index', 'bsl_swept', 'ssl_price', 'ssl_index', 'ssl_swept'.
+              Для свечей без полного окна цены NaN, позиции -1.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    n = len(high)
+    num_levels = min(num_levels, lookback_period)
+
+    result = {
+        'bsl_price': np.full((n, num_levels), np.nan),
+        'bsl_index': np.full((n, num_levels), -1, dtype=np.int64),
+        'ssl_price': np.full((n, num_levels), np.nan),
+        'ssl_index': np.full((n, num_levels), -1, dtype=np.int64),
+    }
+    if n >= lookback_period:
+        high_windows = sliding_window_view(high, lookback_period)
+        low_windows = sliding_window_view(low, lookback_period)
+        for start in range(0, len(high_windows), chunk_size):
+            stop = min(start + chunk_size, len(high_windows))
+            rows = np.arange(start, stop)[:, None]
+            for side, windows, keys in (('bsl', high_windows, -high_windows[start:stop]),
+                                        ('ssl', low_windows, low_windows[start:stop])):
+                if num_levels < lookback_period:
+                    candidates = np.argpartition(keys, num_levels - 1, axis=1)[:, :num_levels]
+                else:
+                    candidates = np.broadcast_to(np.arange(lookback_period), keys.shape)
+                candidate_keys = np.take_along_axis(keys, candidates, axis=1)
+                order = np.lexsort((candidates, candidate_keys), axis=1)
+                positions = np.take_along_axis(candidates, order, axis=1)
+
+                out_rows = slice(start + lookback_period - 1, stop + lookback_period - 1)
+                result[side + '_index'][out_rows] = positions + rows
+                result[side + '_price'][out_rows] = windows[start:stop][np.arange(stop - start)[:, None], positions]
+
+    result['bsl_swept'] = _swept_by_rank(result['bsl_index'])
+    result['ssl_swept'] = _swept_by_rank(result['ssl_index'])
+    return result
+
+
+class LiquidityLevelTracker(Checkpointable):
+    """
+    Потоковый трекер BSL/SSL: N самых высоких High и N самых низких Low
+    в скользящем окне lookback_period свечей.
+
+    Значения окна хранятся в отсортированных списках (bisect), вышедшая из окна свеча
+    удаляется бинарным поиском, поэтому обновление — O(log W) сравнений вместо
+    nlargest/nsmallest по срезу на каждой свече. Для каждого уровня отмечается,
+    был ли он уже снят более поздней свечой внутри окна.
+    """
+
+    _STATE_FIELDS = ('count', '_window', '_highs', '_lows', '_timestamps')
+
+    def __init__(self, lookback_period, num_levels=1):
+        self.lookback_period = lookback_period
+        self.num_levels = num_levels
+        self.count = 0
+        self._window = deque() # (index, high, low, timestamp)
+        self._highs = [] # Отсортированные ключи (-high, index)
+        self._lows = [] # Отсортированные ключи (low, index)
+        self._timestamps = {}
+
+    @property
+    def is_ready(self):
+        """Окно заполнено (как len(df_context) >= lookback_period)."""
+        return len(self._window) >= self.lookback_period
+
+    def update(self, high, low, timestamp=None):
+        """Добавляет закрытую свечу и возвращает актуальные уровни (см. levels())."""
+        if len(self._window) >= self.lookback_period:
+            old_index, old_high, old_low, _ = self._window.popleft()
+            del self._highs[bisect_left(self._highs, (-old_high, old_index))]
+            del self._lows[bisect_left(self._lows, (old_low, old_index))]
+            del self._timestamps[old_index]
+
+        index = self.count
+        self._window.append((index, high, low, timestamp))
+        insort(self._highs, (-high, index))
+        insort(self._lows, (low, index))
+        self._timestamps[index] = timestamp
+        self.count += 1
+        return self.levels()
+
+    def levels(self):
+        """
+        Returns:
+            dict: {'BSL': [...], 'SSL': [...]} — уровни по рангу, каждый
+                  {'price', 'timestamp', 'index', 'swept'}. Пусто, пока окно не заполнено.
+        """
+        if not self.is_ready:
+            return {'BSL': [], 'SSL': []}
+        bsl = [{'price': -key, 'index': index, 'timestamp': self._timestamps[index], 'swept': False}
+               for key, index in self._highs[:self.num_levels]]
+        ssl = [{'price': key, 'index': index, 'timestamp': self._timestamps[index], 'swept': False}
+               for key, index in self._lows[:self.num_levels]]
+        for levels in (bsl, ssl):
+            for rank, level in enumerate(levels):
+                level['swept'] = any(higher['index'] > level['index'] for higher in levels[:rank])
+        return {'BSL': bsl, 'SSL': ssl}
+
+
 def check_liquidity_sweep_and_recovery(df_context_candle, target_liquidity_level,
                                        is_sweeping_below_ssl=True,
                                        recovery_bars_config=1,
@@ -68,3 +213,173 @@ def check_liquidity_sweep_and_recovery(df_context_candle, target_liquidity_level
                 recovered = True
     
     return recovered, swept_price
+
+
+def _check_recovery_bars(recovery_bars):
+    # Свеча свипа сама входит в окно возврата, поэтому окно короче одной свечи не имеет смысла
+    if recovery_bars < 1:
+        raise ValueError(f"recovery_bars должен быть >= 1, получено {recovery_bars}")
+
+
+def detect_liquidity_sweeps(high, low, close, levels, is_sweeping_below_ssl=True,
+                            recovery_bars=1, sweep_depth_atr_factor=0.0, atr_values=None,
+                            level_index=None, index=None):
+    """
+    Все свипы ликвидности с возвратом для массива свечей и одного или нескольких уровней
+    (broadcasting уровни x свечи, без цикла Python по свечам).
+
+    Свип начинается на свече i, если цена прошла за уровень (Low < SSL / High > BSL),
+    а предыдущая свеча закрылась по "правильную" сторону уровня (строго выше SSL / ниже BSL),
+    поэтому свипы одного уровня не пересекаются. Возврат — первая свеча
+    в [i, i + recovery_bars - 1], закрывшаяся обратно за уровнем. Экстремум свипа —
+    минимум Low (максимум High) от начала свипа до возврата включительно.
+
+    Args:
+        high, low, close (array-like): Цены.
+        levels (float or array-like): Уровни ликвидности.
+        is_sweeping_below_ssl (bool): True — свип SSL вниз, False — свип BSL вверх.
+        recovery_bars (int): MANIPULATION_RECOVERY_BARS — за сколько свечей цена должна вернуться (>= 1;
+                             1 — возврат на свече свипа).
+        sweep_depth_atr_factor (float): Минимальная глубина свипа в ATR (0 — не проверяется).
+        atr_values (array-like, optional): ATR; берется на свече начала свипа.
+        level_index (array-like, optional): Позиции свечей, сформировавших уровни;
+                                            свипы до и на этих свечах не ищутся.
+        index (pd.Index, optional): Индекс времени для колонки 'timestamp'.
+
+    Returns:
+        dict: Колонки, отсортированные по свече начала свипа: 'level_number' (номер уровня в levels),
+              'level', 'sweep_index', 'recovery_index' (-1, если возврата не было), 'recovered',
+              'swept_price', 'depth', 'depth_atr', 'depth_ok', 'confirmed' (возврат и глубина), 'timestamp'.
+    """
+    _check_recovery_bars(recovery_bars)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    levels = np.atleast_1d(np.asarray(levels, dtype=np.float64))
+    n = len(close)
+
+    # Свип BSL вверх сводится к свипу SSL вниз сменой знака цен
+    sign = 1.0 if is_sweeping_below_ssl else -1.0
+    extreme = low * sign if is_sweeping_below_ssl else high * sign
+    signed_close = close * sign
+    signed_levels = levels * sign
+
+    breach = extreme[None, :] < signed_levels[:, None]
+    prev_on_side = np.ones_like(breach)
+    if n > 1:
+        prev_on_side[:, 1:] = signed_close[None, :-1] > signed_levels[:, None]
+    starts = breach & prev_on_side
+    if level_index is not None:
+        level_index = np.atleast_1d(np.asarray(level_index, dtype=np.int64))
+        starts &= np.arange(n)[None, :] > level_index[:, None]
+
+    level_number, sweep_index = np.nonzero(starts)
+    order = np.argsort(sweep_index, kind='stable')
+    level_number, sweep_index = level_number[order], sweep_index[order]
+    event_levels = signed_levels[level_number]
+
+    # Окна [i, i + recovery_bars - 1]; выход за конец истории дополняется NaN
+    padded_close = np.concatenate([signed_close, np.full(recovery_bars - 1, np.nan)])
+    padded_extreme = np.concatenate([extreme, np.full(recovery_bars - 1, np.nan)])
+    close_windows = sliding_window_view(padded_close, recovery_bars)[sweep_index]
+    extreme_windows = sliding_window_view(padded_extreme, recovery_bars)[sweep_index]
+
+    back_on_side = close_windows > event_levels[:, None]
+    recovered = back_on_side.any(axis=1)
+    first_recovery = np.where(recovered, back_on_side.argmax(axis=1), recovery_bars - 1)
+    in_sweep = np.arange(recovery_bars)[None, :] <= first_recovery[:, None]
+    swept_signed = np.where(in_sweep & ~np.isnan(extreme_windows), extreme_windows, np.inf).min(axis=1)
+
+    depth = event_levels - swept_signed
+    depth_atr = np.full(len(depth), np.nan)
+    depth_ok = np.ones(len(depth), dtype=bool)
+    if atr_values is not None:
+        atr_at_sweep = np.asarray(atr_values, dtype=np.float64)[sweep_index]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            depth_atr = depth / atr_at_sweep
+        if sweep_depth_atr_factor > 0:
+            depth_ok = ~(depth < sweep_depth_atr_factor * atr_at_sweep) # NaN ATR не отсекает свип
+
+    return {
+        'level_number': level_number,
+        'level': levels[level_number],
+        'sweep_index': sweep_index,
+        'recovery_index': np.where(recovered, sweep_index + first_recovery, -1),
+        'recovered': recovered,
+        'swept_price': swept_signed * sign,
+        'depth': depth,
+        'depth_atr': depth_atr,
+        'depth_ok': depth_ok,
+        'confirmed': recovered & depth_ok,
+        'timestamp': np.asarray(index)[sweep_index] if index is not None else None,
+    }
+
+
+class LiquiditySweepDetector(Checkpointable):
+    """
+    Потоковая версия detect_liquidity_sweeps для одного уровня: обновляется на каждой
+    закрытой свече контекстного таймфрейма и поддерживает возврат за несколько свечей
+    (recovery_bars), чего не умеет check_liquidity_sweep_and_recovery.
+    """
+
+    # Детектор создается стратегией под конкретный уровень, поэтому в состоянии и параметры
+    _STATE_FIELDS = ('target_liquidity_level', 'is_sweeping_below_ssl', 'recovery_bars', 'sweep_depth_atr_factor',
+                     '_sign', '_prev_close_on_side', 'sweep_bars', 'swept_extreme', 'atr_at_sweep')
+
+    def __init__(self, target_liquidity_level, is_sweeping_below_ssl=True,
+                 recovery_bars=1, sweep_depth_atr_factor=0.0):
+        _check_recovery_bars(recovery_bars)
+        self.target_liquidity_level = target_liquidity_level
+        self.is_sweeping_below_ssl = is_sweeping_below_ssl
+        self.recovery_bars = recovery_bars
+        self.sweep_depth_atr_factor = sweep_depth_atr_factor
+
+        self._sign = 1.0 if is_sweeping_below_ssl else -1.0
+        self._prev_close_on_side = True
+        self.sweep_bars = 0 # Свечей с начала текущего свипа (0 — свипа нет)
+        self.swept_extreme = None # Экстремум текущего свипа (в знаке self._sign)
+        self.atr_at_sweep = None
+
+    @property
+    def in_sweep(self):
+        return self.sweep_bars > 0
+
+    def update(self, high, low, close, atr_value=None):
+        """
+        Добавляет закрытую свечу.
+
+        Returns:
+            bool: True, если на этой свече подтверждены свип и возврат.
+            float: Цена экстремума текущего свипа (Low для SSL, High для BSL) или None.
+        """
+        sign = self._sign
+        level = self.target_liquidity_level * sign
+        extreme = low * sign if self.is_sweeping_below_ssl else high * sign
+        signed_close = close * sign
+
+        if self.sweep_bars == 0:
+            if extreme < level and self._prev_close_on_side:
+                self.sweep_bars = 1
+                self.swept_extreme = extreme
+                self.atr_at_sweep = atr_value
+        else:
+            self.sweep_bars += 1
+            if extreme < self.swept_extreme:
+                self.swept_extreme = extreme
+        self._prev_close_on_side = signed_close > level
+
+        if self.sweep_bars == 0:
+            return False, None
+
+        swept_price = self.swept_extreme * sign
+        if signed_close > level:
+            depth_ok = True
+            if self.sweep_depth_atr_factor > 0 and self.atr_at_sweep is not None:
+                if (level - self.swept_extreme) < self.sweep_depth_atr_factor * self.atr_at_sweep:
+                    depth_ok = False
+            self.sweep_bars = 0 # Цена вернулась за уровень — свип завершен
+            return depth_ok, swept_price
+
+        if self.sweep_bars >= self.recovery_bars:
+            self.sweep_bars = 0 # Возврата за recovery_bars свечей не было
+        return False, swept_price
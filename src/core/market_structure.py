@@ -1,20 +1,151 @@
 # src/core/market_structure.py (Очень Упрощенно)
+from collections import deque
+
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.core.bars import BarSeries, column
+from src.core.state import Checkpointable
+
+def find_swing_points(high, low, window=5):
+    """
+    Свинг-максимумы и минимумы по массивам: свеча i — свинг-хай, если ее High равен
+    максимуму окна [i - window, i + window] (аналогично для Low и минимума).
+    Скользящие max/min считаются по strided-окнам (sliding_window_view) без Python-цикла.
+
+    Args:
+        high, low (array-like): Массивы High и Low.
+        window (int): Количество свечей слева и справа от свинга.
+
+    Returns:
+        dict: 'high_index', 'high_price', 'low_index', 'low_price' — компактные массивы
+              позиций и цен свинг-точек (только найденные точки, без NaN-заполнения).
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    size = window * 2 + 1
+
+    if len(high) < size:
+        empty_index = np.empty(0, dtype=np.int64)
+        empty_price = np.empty(0, dtype=np.float64)
+        return {'high_index': empty_index, 'high_price': empty_price,
+                'low_index': empty_index.copy(), 'low_price': empty_price.copy()}
+
+    # NaN внутри окна дает NaN в max/min, и сравнение ложно — как rolling() без min_periods
+    window_max = sliding_window_view(high, size).max(axis=1)
+    window_min = sliding_window_view(low, size).min(axis=1)
+    end = len(high) - window
+
+    high_index = np.flatnonzero(high[window:end] == window_max) + window
+    low_index = np.flatnonzero(low[window:end] == window_min) + window
+    return {
+        'high_index': high_index,
+        'high_price': high[high_index],
+        'low_index': low_index,
+        'low_price': low[low_index],
+    }
+
 
 def get_swing_highs_lows(df, window=5):
     """
-    Упрощенное определение свинг-максимумов и минимумов.
-    Нуждается в значительной доработке для точности.
-    Это базовый пример, реальные свинг-точки определяются сложнее.
-    """
-    # df['Swing_High'] = df['High'][(df['High'].shift(1) < df['High']) & (df['High'].shift(-1) < df['High'])]
-    # df['Swing_Low'] = df['Low'][(df['Low'].shift(1) > df['Low']) & (df['Low'].shift(-1) > df['Low'])]
-    
-    # Более простой вариант для примера, который просто находит локальные пики/впадины
-    # Этот метод не идеален и требует доработки
-    df['Swing_High'] = df['High'].rolling(window=window*2+1, center=True).apply(lambda x: x.iloc[window] if x.iloc[window] == x.max() else float('nan'), raw=False)
-    df['Swing_Low'] = df['Low'].rolling(window=window*2+1, center=True).apply(lambda x: x.iloc[window] if x.iloc[window] == x.min() else float('nan'), raw=False)
-    return df
+    Колонки Swing_High / Swing_Low (NaN вне свинг-точек) на основе find_swing_points.
+    Исходный DataFrame не изменяется: возвращается копия с добавленными колонками.
+    BarSeries для этого конвертируется в DataFrame (функция для анализа, не для горячего пути).
+    """
+    if isinstance(df, BarSeries):
+        df = df.to_dataframe()
+    swings = find_swing_points(column(df, 'High'), column(df, 'Low'), window)
+
+    swing_high = np.full(len(df), np.nan)
+    swing_high[swings['high_index']] = swings['high_price']
+    swing_low = np.full(len(df), np.nan)
+    swing_low[swings['low_index']] = swings['low_price']
+    return df.assign(Swing_High=swing_high, Swing_Low=swing_low)
+
+
+class SwingPointTracker(Checkpointable):
+    """
+    Инкрементальное определение свинг-точек: свеча подтверждается как свинг,
+    когда после нее закрылось window свечей. Нужен для CHoCH/BOS на каждой свече M5
+    без пересчета свингов по всей истории.
+    """
+
+    _STATE_FIELDS = ('_highs', '_lows', '_timestamps', 'count', 'last_swing_high', 'last_swing_low',
+                     'swing_highs', 'swing_lows')
+
+    def __init__(self, window=5, history_size=50):
+        self.window = window
+        size = window * 2 + 1
+        self._highs = deque(maxlen=size)
+        self._lows = deque(maxlen=size)
+        self._timestamps = deque(maxlen=size)
+        self.count = 0 # Количество обработанных свечей
+
+        self.last_swing_high = None # {'index': int, 'price': float, 'timestamp': ...}
+        self.last_swing_low = None
+        self.swing_highs = deque(maxlen=history_size) # Последние подтвержденные свинг-хаи
+        self.swing_lows = deque(maxlen=history_size)
+
+    def seed(self, high, low, timestamps=None):
+        """Заполняет историю свингов пакетным расчетом и подготавливает буфер для update()."""
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        swings = find_swing_points(high, low, self.window)
+
+        def _ts(i):
+            return timestamps[i] if timestamps is not None else None
+
+        for i, price in zip(swings['high_index'][-self.swing_highs.maxlen:].tolist(),
+                            swings['high_price'][-self.swing_highs.maxlen:].tolist()):
+            self.swing_highs.append({'index': i, 'price': price, 'timestamp': _ts(i)})
+        for i, price in zip(swings['low_index'][-self.swing_lows.maxlen:].tolist(),
+                            swings['low_price'][-self.swing_lows.maxlen:].tolist()):
+            self.swing_lows.append({'index': i, 'price': price, 'timestamp': _ts(i)})
+        self.last_swing_high = self.swing_highs[-1] if self.swing_highs else None
+        self.last_swing_low = self.swing_lows[-1] if self.swing_lows else None
+
+        # В буфер попадают последние 2*window свечей: они еще не подтверждены
+        tail_start = max(0, len(high) - (self._highs.maxlen - 1))
+        for i in range(tail_start, len(high)):
+            self._highs.append(float(high[i]))
+            self._lows.append(float(low[i]))
+            self._timestamps.append(_ts(i))
+        self.count = len(high)
+
+    def update(self, high, low, timestamp=None):
+        """
+        Добавляет закрытую свечу.
+
+        Returns:
+            tuple: (new_swing_high, new_swing_low) — словари подтвержденных на этой свече
+                   свинг-точек (свеча на window позиций раньше текущей) или None.
+        """
+        self._highs.append(high)
+        self._lows.append(low)
+        self._timestamps.append(timestamp)
+        self.count += 1
+
+        if len(self._highs) < self._highs.maxlen:
+            return None, None
+
+        w = self.window
+        center_index = self.count - 1 - w
+        new_high = new_low = None
+
+        center_high = self._highs[w]
+        if center_high == max(self._highs):
+            new_high = {'index': center_index, 'price': center_high, 'timestamp': self._timestamps[w]}
+            self.swing_highs.append(new_high)
+            self.last_swing_high = new_high
+
+        center_low = self._lows[w]
+        if center_low == min(self._lows):
+            new_low = {'index': center_index, 'price': center_low, 'timestamp': self._timestamps[w]}
+            self.swing_lows.append(new_low)
+            self.last_swing_low = new_low
+
+        return new_high, new_low
 
 def check_bos(current_price, last_significant_high, is_uptrend):
     """
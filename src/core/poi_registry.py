@@ -0,0 +1,365 @@
+# src/core/poi_registry.py
+# Реестр POI (FVG, Order Blocks) с отслеживанием митигации, заполнения и инверсии.
+# Зоны хранятся в отсортированных списках, разбитых по направлению и классу высоты, поэтому
+# запрос "активные зоны, пересекающие цену X" не требует сканирования истории назад.
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+
+import numpy as np
+
+from src.core.pois import detect_order_blocks, scan_fvgs
+from src.core.state import Checkpointable
+
+# Статусы зон
+ZONE_STATUS_ACTIVE = "ACTIVE" # Цена еще не заходила в зону
+ZONE_STATUS_MITIGATED = "MITIGATED" # Цена зашла в зону, но не прошла ее насквозь
+ZONE_STATUS_FILLED = "FILLED" # Зона пройдена насквозь / сломана, больше не отслеживается
+ZONE_STATUS_INVERTED = "INVERTED" # FVG пробит закрытием, на его месте создана инвертированная зона
+ZONE_STATUS_EXPIRED = "EXPIRED" # Зона старше max_age_bars свечей, больше не отслеживается
+
+# Направление зоны: 1 — поддержка (зона для лонга), -1 — сопротивление (для шорта)
+ZONE_DIRECTIONS = {
+    'bullish_fvg': 1,
+    'bullish_ob': 1,
+    'inverted_bullish_fvg': 1,
+    'bearish_fvg': -1,
+    'bearish_ob': -1,
+    'inverted_bearish_fvg': -1,
+}
+
+# Во что превращается FVG при пробое закрытием (см. find_inverted_fvg)
+_INVERSION_TYPES = {
+    'bearish_fvg': 'inverted_bullish_fvg',
+    'bullish_fvg': 'inverted_bearish_fvg',
+}
+
+
+def _height_class(height):
+    """Класс высоты зоны: двоичный порядок высоты (None для нулевой высоты)."""
+    return math.frexp(height)[1] if height > 0 else None
+
+
+def _height_bound(height_class):
+    """Верхняя граница высоты зон класса."""
+    return math.ldexp(1.0, height_class) if height_class is not None else 0.0
+
+
+def zone_schedule(open_, high, low, close, atr_values=None, fvg_min_size_atr_factor=0.0, detect_fvgs=True,
+                  order_block_detector=None, index=None):
+    """
+    Все FVG и OB истории, найденные векторно (scan_fvgs / detect_order_blocks), в порядке
+    регистрации: POIRegistry.update регистрирует FVG на третьей свече, OB — на свече, закрывшей
+    окно подтверждения, FVG раньше OB той же свечи. Параметры те же, что у конструктора
+    POIRegistry; реестр с zone_schedule не ищет зоны на каждой свече, а берет их отсюда.
+
+    Args:
+        open_, high, low, close (array-like): Свечи таймфрейма исполнения.
+        atr_values (array-like, optional): ATR тех же свечей.
+        fvg_min_size_atr_factor (float): Минимальный размер FVG в ATR импульсной свечи.
+        detect_fvgs (bool): Искать FVG.
+        order_block_detector (pois.OrderBlockDetector, optional): Параметры поиска OB (без него OB не ищутся).
+        index (pd.DatetimeIndex, optional): Время свечей для поля 'timestamp' зон.
+
+    Returns:
+        dict: Списки, отсортированные по 'position' (свеча регистрации): 'kind' (0 — FVG, 1 — OB),
+              'direction', 'top', 'bottom', 'source' (импульсная свеча FVG / свеча OB), 'timestamp'
+              (время свечи source или None), 'open', 'close', 'displacement', 'has_fvg', 'has_bos' (для OB).
+              Списки, а не массивы: реестр читает их по одному элементу на каждую зону.
+    """
+    empty = np.empty(0)
+    parts = []
+    if detect_fvgs:
+        fvgs = scan_fvgs(high, low, atr_values, fvg_min_size_atr_factor)
+        n = len(fvgs['top'])
+        parts.append({
+            'position': fvgs['middle_index'] + 1, 'kind': np.zeros(n, dtype=np.int8), 'direction': fvgs['direction'],
+            'top': fvgs['top'], 'bottom': fvgs['bottom'], 'source': fvgs['middle_index'],
+            'open': np.full(n, np.nan), 'close': np.full(n, np.nan), 'displacement': np.full(n, np.nan),
+            'has_fvg': np.zeros(n, dtype=bool), 'has_bos': np.zeros(n, dtype=bool),
+        })
+    if order_block_detector is not None:
+        obs = detect_order_blocks(open_, high, low, close, atr_values, order_block_detector.lookahead,
+                                  order_block_detector.displacement_atr_factor,
+                                  order_block_detector.structure_lookback, order_block_detector.require_confirmation)
+        parts.append({
+            'position': obs['confirmed_index'], 'kind': np.ones(len(obs['top']), dtype=np.int8),
+            'direction': obs['direction'], 'top': obs['top'], 'bottom': obs['bottom'], 'source': obs['index'],
+            'open': obs['open'], 'close': obs['close'], 'displacement': obs['displacement'],
+            'has_fvg': obs['has_fvg'], 'has_bos': obs['has_bos'],
+        })
+
+    columns = ('position', 'kind', 'direction', 'top', 'bottom', 'source', 'open', 'close',
+               'displacement', 'has_fvg', 'has_bos')
+    arrays = {name: (np.concatenate([part[name] for part in parts]) if parts else empty) for name in columns}
+    order = np.lexsort((arrays['kind'], arrays['position']))
+    schedule = {name: values[order].tolist() for name, values in arrays.items()}
+    source = arrays['source'][order].astype(np.int64)
+    schedule['timestamp'] = list(index[source]) if index is not None else [None] * len(source)
+    return schedule
+
+
+class POIRegistry(Checkpointable):
+    """
+    Реестр открытых POI на таймфрейме исполнения.
+
+    Зоны поддержки хранятся в списках, отсортированных по top, зоны сопротивления — по bottom;
+    каждое направление разбито на классы высоты (двоичный порядок top - bottom). Поиск
+    пересечения с [low, high] в классе сдвигает границу не больше чем на удвоенную высоту
+    зон класса, поэтому одна высокая зона не превращает запросы в линейный просмотр.
+
+    На каждую закрытую свечу update():
+    0. При заданном max_age_bars снимает с учета зоны старше max_age_bars свечей (EXPIRED).
+    1. Проверяет только зоны, которые свеча может затронуть (O(log n + k)):
+       поддержку с top >= Low, сопротивление с bottom <= High — в том числе зоны,
+       которые свеча перепрыгнула гэпом. Статус меняется так:
+       - поддержка: Low <= top -> MITIGATED, Low <= bottom -> FILLED,
+         Close < bottom -> INVERTED для FVG (или FILLED для OB и инвертированных FVG);
+       - сопротивление — зеркально.
+    2. Регистрирует новый FVG по последним трем свечам (те же условия, что в find_fvg).
+    3. Если задан order_block_detector, регистрирует OB, подтвержденный на этой свече
+       (смещение/FVG/BOS, см. pois.OrderBlockDetector).
+    С zone_schedule (см. zone_schedule()) шаги 2-3 заменяются зонами, заранее найденными по всей
+    истории: оптимизатор считает их один раз на воркер для всех прогонов с теми же параметрами FVG/OB.
+
+    Зоны — словари в стиле find_fvg/find_order_blocks с дополнительными полями
+    'id', 'direction', 'status', 'created_index', 'mitigated_index', 'closed_index'.
+    """
+
+    _STATE_FIELDS = ('_zones', '_index', '_by_age', '_next_id', '_prev1', '_prev2', 'order_block_detector')
+
+    def __init__(self, fvg_min_size_atr_factor=0.0, detect_fvgs=True, order_block_detector=None, max_age_bars=None,
+                 zone_schedule=None):
+        self.fvg_min_size_atr_factor = fvg_min_size_atr_factor
+        self.detect_fvgs = detect_fvgs
+        self.order_block_detector = order_block_detector # pois.OrderBlockDetector или None
+        self.max_age_bars = max_age_bars # Через сколько свечей после создания зона снимается с учета (None — никогда)
+        self.zone_schedule = zone_schedule # Готовые FVG/OB (zone_schedule()) вместо поиска на каждой свече
+        self._schedule_cursor = 0 # Первая зона расписания, еще не зарегистрированная
+
+        self._zones = {} # id -> зона (только ACTIVE / MITIGATED)
+        # direction -> {класс высоты -> отсортированный список (top, id) для поддержки / (bottom, id) для сопротивления}
+        self._index = {1: {}, -1: {}}
+        self._by_age = deque() # (created_index, id) в порядке создания — для снятия старых зон
+        self._next_id = 0
+
+        # Последние две свечи для поиска FVG: (index, high, low, timestamp)
+        self._prev1 = None
+        self._prev2 = None
+
+    def __len__(self):
+        return len(self._zones)
+
+    def add_zone(self, zone_type, top, bottom, created_index, timestamp=None, **extra):
+        """Регистрирует зону и возвращает ее словарь."""
+        zone = {
+            'id': self._next_id,
+            'type': zone_type,
+            'direction': ZONE_DIRECTIONS[zone_type],
+            'top': top,
+            'bottom': bottom,
+            'size': top - bottom,
+            'status': ZONE_STATUS_ACTIVE,
+            'created_index': created_index,
+            'timestamp': timestamp,
+            'mitigated_index': None,
+            'closed_index': None,
+        }
+        zone.update(extra)
+        self._next_id += 1
+
+        self._zones[zone['id']] = zone
+        insort(self._bucket(zone, create=True), self._key(zone))
+        if self.max_age_bars is not None:
+            self._by_age.append((created_index, zone['id']))
+        return zone
+
+    @staticmethod
+    def _key(zone):
+        return (zone['top'] if zone['direction'] > 0 else zone['bottom'], zone['id'])
+
+    def _bucket(self, zone, create=False):
+        buckets = self._index[zone['direction']]
+        height_class = _height_class(zone['top'] - zone['bottom'])
+        if create:
+            return buckets.setdefault(height_class, [])
+        return buckets[height_class]
+
+    def _remove(self, zone):
+        keys = self._bucket(zone)
+        key = self._key(zone)
+        pos = bisect_left(keys, key)
+        if pos < len(keys) and keys[pos] == key:
+            del keys[pos]
+        if not keys:
+            del self._index[zone['direction']][_height_class(zone['top'] - zone['bottom'])]
+        del self._zones[zone['id']]
+
+    def zones_overlapping(self, low, high, direction=None):
+        """Активные зоны, пересекающие диапазон цен [low, high] (по возрастанию bottom)."""
+        result = []
+        for zone_direction, buckets in self._index.items():
+            if direction is not None and zone_direction != direction:
+                continue
+            for height_class, keys in buckets.items():
+                bound = _height_bound(height_class)
+                if zone_direction > 0: # Ключ — top: top в [low, high + высота]
+                    start = bisect_left(keys, (low, -1))
+                    end = bisect_right(keys, (high + bound, float('inf')))
+                else: # Ключ — bottom: bottom в [low - высота, high]
+                    start = bisect_left(keys, (low - bound, -1))
+                    end = bisect_right(keys, (high, float('inf')))
+                for _, zone_id in keys[start:end]:
+                    zone = self._zones[zone_id]
+                    if zone['top'] >= low and zone['bottom'] <= high:
+                        result.append(zone)
+        result.sort(key=lambda zone: (zone['bottom'], zone['id']))
+        return result
+
+    def _zones_affected_by_bar(self, high, low):
+        """
+        Зоны, статус которых может измениться на свече: поддержка с top >= low (включая зоны
+        целиком выше свечи — их перепрыгнули гэпом вниз), сопротивление с bottom <= high.
+        Оставшиеся в реестре зоны из этих диапазонов содержат текущую цену, поэтому просмотр
+        не растет с историей.
+        """
+        result = []
+        for keys in self._index[1].values():
+            result.extend(self._zones[zone_id] for _, zone_id in keys[bisect_left(keys, (low, -1)):])
+        for keys in self._index[-1].values():
+            result.extend(self._zones[zone_id] for _, zone_id in keys[:bisect_right(keys, (high, float('inf')))])
+        result.sort(key=lambda zone: (zone['bottom'], zone['id']))
+        return result
+
+    def _expire(self, index, events):
+        by_age = self._by_age
+        while by_age and by_age[0][0] < index - self.max_age_bars:
+            _, zone_id = by_age.popleft()
+            zone = self._zones.get(zone_id)
+            if zone is None:
+                continue # Зона уже закрыта ценой
+            zone['status'] = ZONE_STATUS_EXPIRED
+            zone['closed_index'] = index
+            self._remove(zone)
+            events.append(zone)
+
+    def zones_at(self, price, direction=None):
+        """Активные зоны, содержащие цену price."""
+        return self.zones_overlapping(price, price, direction)
+
+    def active_zones(self, direction=None, zone_types=None):
+        """Все отслеживаемые зоны (ACTIVE и MITIGATED), в порядке создания."""
+        return [zone for zone in self._zones.values()
+                if (direction is None or zone['direction'] == direction)
+                and (zone_types is None or zone['type'] in zone_types)]
+
+    def update(self, index, high, low, close, timestamp=None, atr_value=None, open_price=None):
+        """
+        Обрабатывает закрытую свечу.
+
+        Args:
+            index (int): Позиция свечи в истории таймфрейма.
+            high, low, close (float): Цены свечи.
+            timestamp: Время свечи (для новых зон).
+            atr_value (float, optional): ATR на свече (для фильтра минимального размера FVG).
+            open_price (float, optional): Open свечи, нужен для поиска OB.
+
+        Returns:
+            list: Зоны, созданные или сменившие статус на этой свече.
+        """
+        events = []
+        if self.max_age_bars is not None:
+            self._expire(index, events)
+
+        for zone in self._zones_affected_by_bar(high, low):
+            new_status = self._zone_status_after_bar(zone, high, low, close)
+            if new_status == zone['status']:
+                continue
+            zone['status'] = new_status
+            if new_status == ZONE_STATUS_MITIGATED:
+                zone['mitigated_index'] = index
+            else:
+                zone['closed_index'] = index
+                if zone['mitigated_index'] is None:
+                    zone['mitigated_index'] = index
+                self._remove(zone)
+                if new_status == ZONE_STATUS_INVERTED:
+                    events.append(self.add_zone(
+                        _INVERSION_TYPES[zone['type']], zone['top'], zone['bottom'], index, timestamp,
+                        original_fvg_type=zone['type'], inverted_by_candle_index=index))
+            events.append(zone)
+
+        if self.zone_schedule is not None:
+            self._add_scheduled_zones(index, events)
+        elif self.detect_fvgs and self._prev2 is not None:
+            events.extend(self._detect_fvg(index, high, low, timestamp))
+
+        if self.order_block_detector is not None and open_price is not None and self.zone_schedule is None:
+            ob = self.order_block_detector.update(index, open_price, high, low, close, atr_value, timestamp)
+            if ob is not None:
+                zone_type, top, bottom, ob_timestamp = ob.pop('type'), ob.pop('top'), ob.pop('bottom'), ob.pop('timestamp')
+                events.append(self.add_zone(zone_type, top, bottom, index, ob_timestamp, **ob))
+
+        self._prev2 = self._prev1
+        self._prev1 = (index, high, low, timestamp, atr_value)
+        return events
+
+    def _add_scheduled_zones(self, index, events):
+        schedule = self.zone_schedule
+        positions = schedule['position']
+        k = self._schedule_cursor
+        # Свечи идут подряд — курсор уже на месте; после пропуска свечей или set_state ищем заново
+        if (k > 0 and positions[k - 1] >= index) or (k < len(positions) and positions[k] < index):
+            k = bisect_left(positions, index)
+        while k < len(positions) and positions[k] == index:
+            is_bullish = schedule['direction'][k] > 0
+            if schedule['kind'][k] == 0:
+                events.append(self.add_zone('bullish_fvg' if is_bullish else 'bearish_fvg', schedule['top'][k],
+                                            schedule['bottom'][k], index, schedule['timestamp'][k],
+                                            middle_candle_index_in_slice=schedule['source'][k]))
+            else:
+                events.append(self.add_zone(
+                    'bullish_ob' if is_bullish else 'bearish_ob', schedule['top'][k], schedule['bottom'][k], index,
+                    schedule['timestamp'][k], open=schedule['open'][k], close=schedule['close'][k],
+                    index_in_slice=schedule['source'][k], confirmed_index=index,
+                    displacement=schedule['displacement'][k], has_fvg=schedule['has_fvg'][k],
+                    has_bos=schedule['has_bos'][k]))
+            k += 1
+        self._schedule_cursor = k
+
+    def _zone_status_after_bar(self, zone, high, low, close):
+        is_fvg = zone['type'] in _INVERSION_TYPES
+        if zone['direction'] > 0:
+            if close < zone['bottom']:
+                return ZONE_STATUS_INVERTED if is_fvg else ZONE_STATUS_FILLED
+            if low <= zone['bottom']:
+                return ZONE_STATUS_FILLED
+            if low <= zone['top']:
+                return ZONE_STATUS_MITIGATED
+        else:
+            if close > zone['top']:
+                return ZONE_STATUS_INVERTED if is_fvg else ZONE_STATUS_FILLED
+            if high >= zone['top']:
+                return ZONE_STATUS_FILLED
+            if high >= zone['bottom']:
+                return ZONE_STATUS_MITIGATED
+        return zone['status']
+
+    def _detect_fvg(self, index, high, low, timestamp):
+        prev2_index, prev2_high, prev2_low, _, _ = self._prev2
+        middle_index, _, _, middle_timestamp, middle_atr = self._prev1
+
+        if low > prev2_high:
+            zone_type, top, bottom = 'bullish_fvg', low, prev2_high
+        elif high < prev2_low:
+            zone_type, top, bottom = 'bearish_fvg', prev2_low, high
+        else:
+            return []
+
+        # ATR на момент импульсной (средней) свечи, как в find_fvg
+        if (self.fvg_min_size_atr_factor > 0 and middle_atr is not None and middle_atr == middle_atr
+                and (top - bottom) < self.fvg_min_size_atr_factor * middle_atr):
+            return []
+
+        return [self.add_zone(zone_type, top, bottom, index, middle_timestamp,
+                              middle_candle_index_in_slice=middle_index)]
@@ -1,6 +1,12 @@
 # src/core/pois.py (Points of Interest - Order Blocks, FVG - Упрощенно)
+from collections import deque
+
 import pandas as pd
 import numpy as np # Для np.nan
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.core.bars import column, timestamp_at
+from src.core.state import Checkpointable
 
 def find_fvg(df_slice, candle_index, is_bullish_fvg_needed=True, fvg_min_size_atr_factor=0.0, atr_series=None):
     """
@@ -9,11 +15,11 @@ def find_fvg(df_slice, candle_index, is_bullish_fvg_needed=True, fvg_min_size_at
     Bearish FVG: High[candle_index] < Low[candle_index-2] (разрыв, candle_index-1 импульсная вниз)
 
     Args:
-        df_slice (pd.DataFrame): Срез данных.
+        df_slice (pd.DataFrame or BarSeries): Срез данных.
         candle_index (int): Индекс ПОСЛЕДНЕЙ из трех свечей, формирующих FVG, в df_slice.
         is_bullish_fvg_needed (bool): True для бычьего FVG, False для медвежьего.
         fvg_min_size_atr_factor (float): Минимальный размер FVG как множитель ATR. Если 0, не проверяется.
-        atr_series (pd.Series, optional): Серия значений ATR для проверки минимального размера FVG.
+        atr_series (pd.Series or np.ndarray, optional): Значения ATR для проверки минимального размера FVG.
 
     Returns:
         dict or None: Информация о FVG или None.
@@ -21,29 +27,30 @@ def find_fvg(df_slice, candle_index, is_bullish_fvg_needed=True, fvg_min_size_at
     if candle_index < 2 or candle_index >= len(df_slice):
         return None
 
-    candle_curr = df_slice.iloc[candle_index]
-    candle_prev1 = df_slice.iloc[candle_index - 1] # Потенциально импульсная свеча
-    candle_prev2 = df_slice.iloc[candle_index - 2]
+    # Позиционный доступ к массивам колонок вместо построения строк через iloc
+    high = column(df_slice, 'High')
+    low = column(df_slice, 'Low')
+    # candle_index - 1 — потенциально импульсная свеча
 
     fvg_info = None
     fvg_top, fvg_bottom = np.nan, np.nan
 
     if is_bullish_fvg_needed:
-        if candle_curr['Low'] > candle_prev2['High']: # Условие дисбаланса
-            fvg_top = candle_curr['Low']
-            fvg_bottom = candle_prev2['High']
+        if low[candle_index] > high[candle_index - 2]: # Условие дисбаланса
+            fvg_top = float(low[candle_index])
+            fvg_bottom = float(high[candle_index - 2])
             fvg_type = 'bullish_fvg'
     else: # Ищем медвежий FVG
-        if candle_curr['High'] < candle_prev2['Low']: # Условие дисбаланса
-            fvg_top = candle_prev2['Low']
-            fvg_bottom = candle_curr['High']
+        if high[candle_index] < low[candle_index - 2]: # Условие дисбаланса
+            fvg_top = float(low[candle_index - 2])
+            fvg_bottom = float(high[candle_index])
             fvg_type = 'bearish_fvg'
 
     if pd.notna(fvg_top) and pd.notna(fvg_bottom) and fvg_top > fvg_bottom:
         fvg_size = fvg_top - fvg_bottom
         min_size_check_passed = True
-        if fvg_min_size_atr_factor > 0 and atr_series is not None and not atr_series.empty:
-            atr_val = atr_series.iloc[candle_index -1] # ATR на момент импульсной свечи
+        if fvg_min_size_atr_factor > 0 and atr_series is not None and len(atr_series) > 0:
+            atr_val = np.asarray(atr_series)[candle_index - 1] # ATR на момент импульсной свечи
             if pd.notna(atr_val) and fvg_size < (fvg_min_size_atr_factor * atr_val):
                 min_size_check_passed = False
         
@@ -54,17 +61,86 @@ def find_fvg(df_slice, candle_index, is_bullish_fvg_needed=True, fvg_min_size_at
                 'bottom': fvg_bottom,
                 'size': fvg_size,
                 'middle_candle_index_in_slice': candle_index - 1,
-                'timestamp': df_slice.index[candle_index - 1]
+                'timestamp': timestamp_at(df_slice, candle_index - 1)
             }
     return None
 
+def scan_fvgs(high, low, atr_values=None, fvg_min_size_atr_factor=0.0, index=None):
+    """
+    Находит все FVG в истории за один векторный проход (сдвинутые сравнения массивов).
+    Условия те же, что в find_fvg: для последней свечи c из трех
+    Bullish FVG: Low[c] > High[c-2], Bearish FVG: High[c] < Low[c-2].
+
+    Args:
+        high, low (array-like): Массивы High и Low.
+        atr_values (array-like, optional): ATR той же длины для фильтра минимального размера.
+        fvg_min_size_atr_factor (float): Минимальный размер FVG как множитель ATR. Если 0, не проверяется.
+                                         ATR берется на импульсной (средней) свече, NaN фильтр не отсекает.
+        index (pd.Index, optional): Индекс времени для колонки 'timestamp'.
+
+    Returns:
+        dict: Колонки одинаковой длины, отсортированные по средней свече:
+              'direction' (int8: 1 бычий, -1 медвежий), 'top', 'bottom', 'size',
+              'middle_index' (позиция импульсной свечи), 'timestamp' (или None без index).
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+
+    # Свеча c сравнивается со свечой c-2; все массивы ниже выровнены по c = 2..n-1
+    curr_high, curr_low = high[2:], low[2:]
+    prev2_high, prev2_low = high[:-2], low[:-2]
+
+    bullish = curr_low > prev2_high
+    bearish = curr_high < prev2_low
+
+    bullish_pos = np.flatnonzero(bullish)
+    bearish_pos = np.flatnonzero(bearish)
+
+    top = np.concatenate([curr_low[bullish_pos], prev2_low[bearish_pos]])
+    bottom = np.concatenate([prev2_high[bullish_pos], curr_high[bearish_pos]])
+    middle_index = np.concatenate([bullish_pos, bearish_pos]) + 1
+    direction = np.concatenate([np.ones(len(bullish_pos), dtype=np.int8),
+                                -np.ones(len(bearish_pos), dtype=np.int8)])
+
+    order = np.argsort(middle_index, kind='stable')
+    top, bottom, middle_index, direction = top[order], bottom[order], middle_index[order], direction[order]
+    size = top - bottom
+
+    if fvg_min_size_atr_factor > 0 and atr_values is not None:
+        atr_at_middle = np.asarray(atr_values, dtype=np.float64)[middle_index]
+        keep = ~(size < fvg_min_size_atr_factor * atr_at_middle) # NaN ATR не отсекает FVG
+        top, bottom, size, middle_index, direction = (
+            top[keep], bottom[keep], size[keep], middle_index[keep], direction[keep])
+
+    return {
+        'direction': direction,
+        'top': top,
+        'bottom': bottom,
+        'size': size,
+        'middle_index': middle_index,
+        'timestamp': np.asarray(index)[middle_index] if index is not None else None,
+    }
+
+
+def fvg_from_scan(fvgs, k):
+    """Строка k результата scan_fvgs в формате словаря find_fvg."""
+    middle = int(fvgs['middle_index'][k])
+    return {
+        'type': 'bullish_fvg' if fvgs['direction'][k] > 0 else 'bearish_fvg',
+        'top': float(fvgs['top'][k]),
+        'bottom': float(fvgs['bottom'][k]),
+        'size': float(fvgs['size'][k]),
+        'middle_candle_index_in_slice': middle,
+        'timestamp': fvgs['timestamp'][k] if fvgs['timestamp'] is not None else None,
+    }
+
 def find_inverted_fvg(df_slice, fvg_to_invert, bos_choch_candle_index):
     """
     Проверяет, был ли данный FVG "инвертирован" (пробит) импульсным движением BOS/CHoCH.
     Инвертированный FVG становится зоной поддержки/сопротивления.
 
     Args:
-        df_slice (pd.DataFrame): Срез данных.
+        df_slice (pd.DataFrame or BarSeries): Срез данных.
         fvg_to_invert (dict): Словарь с информацией о FVG, полученный от find_fvg.
         bos_choch_candle_index (int): Индекс свечи в df_slice, которая совершила BOS/CHoCH, пробив FVG.
 
@@ -74,12 +150,12 @@ def find_inverted_fvg(df_slice, fvg_to_invert, bos_choch_candle_index):
     if not fvg_to_invert or bos_choch_candle_index >= len(df_slice):
         return None
 
-    candle_bos_choch = df_slice.iloc[bos_choch_candle_index]
+    close_bos_choch = column(df_slice, 'Close')[bos_choch_candle_index]
     inverted_fvg_info = None
 
     if fvg_to_invert['type'] == 'bearish_fvg': # Изначально был медвежий FVG, ищем бычий разворот
         # Цена должна была закрыться ВЫШЕ верхней границы медвежьего FVG
-        if candle_bos_choch['Close'] > fvg_to_invert['top']:
+        if close_bos_choch > fvg_to_invert['top']:
             inverted_fvg_info = {
                 'type': 'inverted_bullish_fvg', # Бывшая зона сопротивления стала поддержкой
                 'original_fvg_type': fvg_to_invert['type'],
@@ -87,11 +163,11 @@ def find_inverted_fvg(df_slice, fvg_to_invert, bos_choch_candle_index):
                 'bottom': fvg_to_invert['bottom'],
                 'size': fvg_to_invert['size'],
                 'inverted_by_candle_index': bos_choch_candle_index,
-                'timestamp': df_slice.index[bos_choch_candle_index]
+                'timestamp': timestamp_at(df_slice, bos_choch_candle_index)
             }
     elif fvg_to_invert['type'] == 'bullish_fvg': # Изначально был бычий FVG, ищем медвежий разворот
         # Цена должна была закрыться НИЖЕ нижней границы бычьего FVG
-        if candle_bos_choch['Close'] < fvg_to_invert['bottom']:
+        if close_bos_choch < fvg_to_invert['bottom']:
             inverted_fvg_info = {
                 'type': 'inverted_bearish_fvg', # Бывшая зона поддержки стала сопротивлением
                 'original_fvg_type': fvg_to_invert['type'],
@@ -99,7 +175,7 @@ def find_inverted_fvg(df_slice, fvg_to_invert, bos_choch_candle_index):
                 'bottom': fvg_to_invert['bottom'],
                 'size': fvg_to_invert['size'],
                 'inverted_by_candle_index': bos_choch_candle_index,
-                'timestamp': df_slice.index[bos_choch_candle_index]
+                'timestamp': timestamp_at(df_slice, bos_choch_candle_index)
             }
     
     return inverted_fvg_info
@@ -121,37 +197,274 @@ def find_order_blocks(df_slice, candle_index, is_bullish_ob_needed=True, lookbac
     search_start_index = candle_index - 1
     if search_start_index < 0: return None
 
+    open_ = column(df_slice, 'Open')
+    high = column(df_slice, 'High')
+    low = column(df_slice, 'Low')
+    close = column(df_slice, 'Close')
+
     for i in range(search_start_index, max(-1, search_start_index - lookback -1), -1):
         if i < 0 or i+1 >= len(df_slice): continue # Выход за пределы
 
-        candle_ob_candidate = df_slice.iloc[i]
         # Свеча, следующая за кандидатом в ОБ, должна быть импульсной
         # Для простоты, здесь не проверяем импульс детально, а лишь направление
-        # candle_after_ob = df_slice.iloc[i+1]
+        # close[i+1], open_[i+1] — свеча после кандидата
 
         if is_bullish_ob_needed: # Ищем бычий ОБ (медвежья свеча)
-            if candle_ob_candidate['Close'] < candle_ob_candidate['Open']: # Медвежья свеча
+            if close[i] < open_[i]: # Медвежья свеча
                 # Условие: следующая свеча должна поглотить эту или быть сильной бычьей
-                # if candle_after_ob['Close'] > candle_ob_candidate['Open']: # Пример простого поглощения
+                # if close[i+1] > open_[i]: # Пример простого поглощения
                 return {
                     'type': 'bullish_ob', 
-                    'top': candle_ob_candidate['High'], 
-                    'bottom': candle_ob_candidate['Low'],
-                    'open': candle_ob_candidate['Open'],
-                    'close': candle_ob_candidate['Close'],
+                    'top': float(high[i]), 
+                    'bottom': float(low[i]),
+                    'open': float(open_[i]),
+                    'close': float(close[i]),
                     'index_in_slice': i,
-                    'timestamp': df_slice.index[i]
+                    'timestamp': timestamp_at(df_slice, i)
                 }
         else: # Ищем медвежий ОБ (бычья свеча)
-            if candle_ob_candidate['Close'] > candle_ob_candidate['Open']: # Бычья свеча
-                # if candle_after_ob['Close'] < candle_ob_candidate['Open']:
+            if close[i] > open_[i]: # Бычья свеча
+                # if close[i+1] < open_[i]:
                 return {
                     'type': 'bearish_ob', 
-                    'top': candle_ob_candidate['High'], 
-                    'bottom': candle_ob_candidate['Low'],
-                    'open': candle_ob_candidate['Open'],
-                    'close': candle_ob_candidate['Close'],
+                    'top': float(high[i]), 
+                    'bottom': float(low[i]),
+                    'open': float(open_[i]),
+                    'close': float(close[i]),
                     'index_in_slice': i,
-                    'timestamp': df_slice.index[i]
+                    'timestamp': timestamp_at(df_slice, i)
                 }
     return None
+
+
+def _forward_window(values, lookahead, reducer, fill):
+    """reducer по окну values[i+1 .. i+lookahead]; для окон, выходящих за конец, — fill."""
+    out = np.full(len(values), fill, dtype=np.float64)
+    if len(values) > lookahead:
+        out[:len(values) - lookahead] = reducer(sliding_window_view(values[1:], lookahead), axis=1)
+    return out
+
+
+def _count_in_forward_window(flags, start_offset, end_offset):
+    """Количество True во flags[i+start_offset .. i+end_offset] для каждого i (через кумулятивную сумму)."""
+    n = len(flags)
+    csum = np.concatenate([[0], np.cumsum(flags, dtype=np.int64)])
+    idx = np.arange(n)
+    lo = np.clip(idx + start_offset, 0, n)
+    hi = np.clip(idx + end_offset + 1, 0, n)
+    return csum[hi] - csum[lo]
+
+
+def order_block_flags(open_, high, low, close, atr_values=None, lookahead=3, structure_lookback=10):
+    """
+    Посвечные признаки ордер-блоков для всей истории (векторно).
+
+    Для свечи i (кандидат в OB) на окне следующих lookahead свечей считается:
+    - displacement: смещение цены от OB в единицах ATR свечи i
+      (вверх: max(High[i+1..i+k]) - High[i]; вниз: Low[i] - min(Low[i+1..i+k]));
+    - has_fvg: FVG в направлении смещения со средней свечой в [i+1, i+k-1]
+      (третья свеча FVG закрывается не позже i+k);
+    - has_bos: закрытие в окне за пределами экстремума предыдущих structure_lookback свечей.
+
+    Returns:
+        dict: Массивы длины n: 'bullish_candidate', 'bearish_candidate', 'displacement_up',
+              'displacement_down', 'fvg_up', 'fvg_down', 'bos_up', 'bos_down', 'complete'
+              (окно lookahead полностью закрыто).
+    """
+    open_ = np.asarray(open_, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(high)
+
+    forward_high = _forward_window(high, lookahead, np.max, np.nan)
+    forward_low = _forward_window(low, lookahead, np.min, np.nan)
+    forward_close_max = _forward_window(close, lookahead, np.max, np.nan)
+    forward_close_min = _forward_window(close, lookahead, np.min, np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        displacement_up = forward_high - high
+        displacement_down = low - forward_low
+        if atr_values is not None:
+            atr_values = np.asarray(atr_values, dtype=np.float64)
+            displacement_up = displacement_up / atr_values
+            displacement_down = displacement_down / atr_values
+
+    # FVG со средней свечой j: Low[j+1] > High[j-1] (бычий), High[j+1] < Low[j-1] (медвежий)
+    fvg_mid_up = np.zeros(n, dtype=bool)
+    fvg_mid_down = np.zeros(n, dtype=bool)
+    if n >= 3:
+        fvg_mid_up[1:-1] = low[2:] > high[:-2]
+        fvg_mid_down[1:-1] = high[2:] < low[:-2]
+    fvg_up = _count_in_forward_window(fvg_mid_up, 1, lookahead - 1) > 0
+    fvg_down = _count_in_forward_window(fvg_mid_down, 1, lookahead - 1) > 0
+
+    # Экстремумы предыдущих structure_lookback свечей (для ранних свечей — по доступной истории)
+    padded_high = np.concatenate([np.full(structure_lookback, -np.inf), high])
+    padded_low = np.concatenate([np.full(structure_lookback, np.inf), low])
+    prior_high = sliding_window_view(padded_high[:-1], structure_lookback).max(axis=1) if n else np.empty(0)
+    prior_low = sliding_window_view(padded_low[:-1], structure_lookback).min(axis=1) if n else np.empty(0)
+    if n:
+        prior_high[0] = np.nan
+        prior_low[0] = np.nan
+
+    with np.errstate(invalid='ignore'):
+        bos_up = forward_close_max > prior_high
+        bos_down = forward_close_min < prior_low
+
+    return {
+        'bullish_candidate': close < open_, # Бычий OB — последняя медвежья свеча перед ростом
+        'bearish_candidate': close > open_, # Медвежий OB — последняя бычья свеча перед падением
+        'displacement_up': displacement_up,
+        'displacement_down': displacement_down,
+        'fvg_up': fvg_up,
+        'fvg_down': fvg_down,
+        'bos_up': bos_up,
+        'bos_down': bos_down,
+        'complete': np.arange(n) + lookahead < n,
+    }
+
+
+def _confirmed_order_blocks(flags, displacement_atr_factor, require_confirmation):
+    with np.errstate(invalid='ignore'):
+        bullish = flags['bullish_candidate'] & flags['complete'] & (flags['displacement_up'] >= displacement_atr_factor)
+        bearish = flags['bearish_candidate'] & flags['complete'] & (flags['displacement_down'] >= displacement_atr_factor)
+    if require_confirmation:
+        bullish &= flags['fvg_up'] | flags['bos_up']
+        bearish &= flags['fvg_down'] | flags['bos_down']
+    return bullish, bearish
+
+
+def detect_order_blocks(open_, high, low, close, atr_values=None, lookahead=3,
+                        displacement_atr_factor=1.0, structure_lookback=10,
+                        require_confirmation=True, index=None):
+    """
+    Ордер-блоки по всей истории за один векторный проход.
+    В отличие от find_order_blocks, OB подтверждается смещением цены (displacement)
+    не меньше displacement_atr_factor ATR за lookahead свечей и (если require_confirmation)
+    последующим FVG или BOS в ту же сторону.
+
+    Args:
+        open_, high, low, close (array-like): Цены.
+        atr_values (array-like, optional): ATR. Без него смещение измеряется в единицах цены.
+        lookahead (int): Окно свечей после OB для проверки смещения/FVG/BOS.
+        displacement_atr_factor (float): Минимальное смещение в ATR.
+        structure_lookback (int): Сколько свечей до OB учитывать для BOS.
+        require_confirmation (bool): Требовать FVG или BOS после OB.
+        index (pd.Index, optional): Индекс времени для колонки 'timestamp'.
+
+    Returns:
+        dict: Колонки, отсортированные по позиции OB: 'direction' (int8), 'top', 'bottom',
+              'open', 'close', 'index' (позиция свечи OB), 'confirmed_index' (свеча, на которой
+              окно подтверждения закрылось), 'displacement', 'has_fvg', 'has_bos', 'timestamp'.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    open_ = np.asarray(open_, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+
+    flags = order_block_flags(open_, high, low, close, atr_values, lookahead, structure_lookback)
+    bullish, bearish = _confirmed_order_blocks(flags, displacement_atr_factor, require_confirmation)
+
+    ob_index = np.flatnonzero(bullish | bearish)
+    is_bullish = bullish[ob_index]
+    return {
+        'direction': np.where(is_bullish, 1, -1).astype(np.int8),
+        'top': high[ob_index],
+        'bottom': low[ob_index],
+        'open': open_[ob_index],
+        'close': close[ob_index],
+        'index': ob_index,
+        'confirmed_index': ob_index + lookahead,
+        'displacement': np.where(is_bullish, flags['displacement_up'][ob_index], flags['displacement_down'][ob_index]),
+        'has_fvg': np.where(is_bullish, flags['fvg_up'][ob_index], flags['fvg_down'][ob_index]),
+        'has_bos': np.where(is_bullish, flags['bos_up'][ob_index], flags['bos_down'][ob_index]),
+        'timestamp': np.asarray(index)[ob_index] if index is not None else None,
+    }
+
+
+class OrderBlockDetector(Checkpointable):
+    """
+    Инкрементальная версия detect_order_blocks: на каждую новую свечу проверяет кандидата,
+    у которого только что закрылось окно подтверждения (lookahead свечей назад).
+    Хранит только последние structure_lookback + lookahead + 1 свечей.
+    """
+
+    _STATE_FIELDS = ('_buffer',)
+
+    def __init__(self, lookahead=3, displacement_atr_factor=1.0, structure_lookback=10, require_confirmation=True):
+        self.lookahead = lookahead
+        self.displacement_atr_factor = displacement_atr_factor
+        self.structure_lookback = structure_lookback
+        self.require_confirmation = require_confirmation
+        self._buffer = deque(maxlen=structure_lookback + lookahead + 1) # (index, o, h, l, c, atr, timestamp)
+
+    def update(self, index, open_, high, low, close, atr_value=None, timestamp=None):
+        """
+        Добавляет закрытую свечу.
+
+        Returns:
+            dict or None: OB в формате find_order_blocks (+ 'displacement', 'has_fvg', 'has_bos',
+                          'confirmed_index'), подтвержденный на этой свече, иначе None.
+        """
+        self._buffer.append((index, open_, high, low, close, atr_value, timestamp))
+        if len(self._buffer) <= self.lookahead:
+            return None
+
+        # Скалярная проверка одного кандидата по тем же правилам, что order_block_flags:
+        # вызов векторной версии на каждую свечу стоил бы больше, чем сама проверка
+        buffer = self._buffer
+        k = len(buffer) - 1 - self.lookahead # Кандидат, чье окно закрылось этой свечой
+        ob_index, ob_open, ob_high, ob_low, ob_close, ob_atr, ob_timestamp = buffer[k]
+
+        if ob_close < ob_open:
+            is_bullish = True
+        elif ob_close > ob_open:
+            is_bullish = False
+        else:
+            return None
+
+        window = [buffer[j] for j in range(k + 1, len(buffer))]
+        if is_bullish:
+            displacement = max(bar[2] for bar in window) - ob_high
+        else:
+            displacement = ob_low - min(bar[3] for bar in window)
+        if ob_atr is not None:
+            displacement /= ob_atr
+        if not displacement >= self.displacement_atr_factor: # NaN тоже не проходит
+            return None
+
+        # FVG со средней свечой j в [k+1, k+lookahead-1]
+        has_fvg = False
+        for j in range(k + 1, k + self.lookahead):
+            if is_bullish and buffer[j + 1][3] > buffer[j - 1][2]:
+                has_fvg = True
+                break
+            if not is_bullish and buffer[j + 1][2] < buffer[j - 1][3]:
+                has_fvg = True
+                break
+
+        # BOS относительно экстремума предыдущих свечей в буфере (их не больше structure_lookback)
+        has_bos = False
+        if k > 0:
+            if is_bullish:
+                has_bos = max(bar[4] for bar in window) > max(buffer[j][2] for j in range(k))
+            else:
+                has_bos = min(bar[4] for bar in window) < min(buffer[j][3] for j in range(k))
+
+        if self.require_confirmation and not (has_fvg or has_bos):
+            return None
+
+        return {
+            'type': 'bullish_ob' if is_bullish else 'bearish_ob',
+            'top': ob_high,
+            'bottom': ob_low,
+            'open': ob_open,
+            'close': ob_close,
+            'index_in_slice': ob_index,
+            'timestamp': ob_timestamp,
+            'confirmed_index': index,
+            'displacement': displacement,
+            'has_fvg': has_fvg,
+            'has_bos': has_bos,
+        }
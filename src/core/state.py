@@ -0,0 +1,42 @@
+# src/core/state.py
+# Снимок состояния потоковых компонентов (трекеры, детекторы, реестр POI) для checkpoint:
+# компонент перечисляет изменяемые поля в _STATE_FIELDS, get_state() отдает их глубокую копию.
+import copy
+
+
+class Checkpointable:
+    """
+    Примесь get_state()/set_state() для потоковых компонентов.
+
+    В _STATE_FIELDS перечисляются поля, которые меняются при update(); параметры, заданные
+    конструктором, сохраняются только если компонент создается стратегией по ходу прогона
+    (тогда он восстанавливается через from_state()). Вложенный Checkpointable сохраняется
+    своим get_state().
+    """
+
+    _STATE_FIELDS = ()
+
+    def get_state(self):
+        """Словарь с копией состояния (не разделяет изменяемые объекты с компонентом)."""
+        state = {}
+        for name in self._STATE_FIELDS:
+            value = getattr(self, name)
+            state[name] = value.get_state() if isinstance(value, Checkpointable) else copy.deepcopy(value)
+        return state
+
+    def set_state(self, state):
+        """Восстанавливает состояние, сохраненное get_state()."""
+        for name in self._STATE_FIELDS:
+            value = state[name]
+            current = getattr(self, name, None)
+            if isinstance(current, Checkpointable) and value is not None:
+                current.set_state(value)
+            else:
+                setattr(self, name, copy.deepcopy(value))
+
+    @classmethod
+    def from_state(cls, state):
+        """Компонент из состояния, в котором сохранены и параметры конструктора."""
+        component = cls.__new__(cls)
+        component.set_state(state)
+        return component
@@ -0,0 +1,269 @@
+# src/live/runner.py
+# Live-режим: стратегия получает закрытые свечи из асинхронного потока (websocket, опрос API
+# или проигрывание истории). Свечи M5 и M15 собираются потоково (BarAggregator), ATR считается
+# StreamingATR, история стратегии дописывается через BarSeries.append — на закрытие свечи
+# приходится O(1) работы без пересчета индикаторов и пересборки срезов истории.
+import asyncio
+import inspect
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+import numpy as np
+
+from src.backtest.engine import ListSignalSink
+from src.backtest.optimizer import min_context_bars_for
+from src.core.bars import Bar, BarSeries, _timestamp_to_ns, as_bar_series
+from src.core.indicators import StreamingATR
+from src.strategies.amd_smc_strategy import AmdSMCStrategy
+from src.utils.resampling import BarAggregator, resample_ohlcv
+from src.utils.time_utils import interval_to_timedelta
+
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class FeedBar(NamedTuple):
+    """
+    Закрытая свеча из потока данных.
+    received_ns — time.perf_counter_ns() в момент получения свечи процессом: от него
+    считается задержка до публикации решения стратегии.
+    """
+    timestamp: object # Время открытия свечи: int64 нс UTC, datetime или pd.Timestamp
+    Open: float
+    High: float
+    Low: float
+    Close: float
+    Volume: float
+    received_ns: int
+
+
+def _ns_to_utc_datetime(ts_ns):
+    """int64 нс UTC -> timezone-aware datetime (как times_utc в BacktestEngine)."""
+    return _EPOCH_UTC + timedelta(microseconds=ts_ns // 1000)
+
+
+class ReplayFeed:
+    """
+    Проигрывание истории как live-потока (для проверки live-режима без сети).
+
+    Args:
+        data (pd.DataFrame or BarSeries): Закрытые свечи в порядке времени.
+        delay (float): Пауза между свечами, секунд (0 — максимально быстро, но с отдачей
+            управления циклу событий на каждой свече).
+    """
+
+    def __init__(self, data, delay=0.0):
+        self.bars = as_bar_series(data)
+        self.delay = delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        bars = self.bars
+        volumes = bars['Volume'].tolist()
+        rows = zip(bars.timestamps.tolist(), bars['Open'].tolist(), bars['High'].tolist(),
+                   bars['Low'].tolist(), bars['Close'].tolist(), volumes)
+        for ts, o, h, l, c, v in rows:
+            await asyncio.sleep(self.delay)
+            yield FeedBar(ts, o, h, l, c, v, time.perf_counter_ns())
+
+
+class QueueFeed:
+    """
+    Поток свечей поверх asyncio.Queue: замена websocket-клиента. Источник (обработчик
+    сообщений websocket, тестовый продюсер) вызывает put() на закрытии свечи, close() — в конце.
+    Задержка считается от put(), поэтому включает ожидание в очереди.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, maxsize=0):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put_nowait(self, timestamp, open_, high, low, close, volume=float('nan')):
+        self.queue.put_nowait(FeedBar(timestamp, open_, high, low, close, volume, time.perf_counter_ns()))
+
+    async def put(self, timestamp, open_, high, low, close, volume=float('nan')):
+        await self.queue.put(FeedBar(timestamp, open_, high, low, close, volume, time.perf_counter_ns()))
+
+    def close(self):
+        self.queue.put_nowait(self._CLOSED)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if item is self._CLOSED:
+            raise StopAsyncIteration
+        return item
+
+
+class LiveRunner:
+    """
+    Подает стратегии свечи из асинхронного потока.
+
+    Поток отдает закрытые свечи базового интервала (M1 или сразу M5). Из них потоково
+    собираются свечи исполнения (M5) и контекста (M15). На каждой закрытой M5:
+    ATR обновляется StreamingATR, свеча дописывается в историю стратегии, срез контекста
+    пересоздается только при закрытии новой M15 (view без копирования), дальше —
+    process_new_candle и публикация сигнала в sink.
+
+    История до запуска (warm-up) обрабатывается пакетно: M15 строится resample_ohlcv,
+    ATR — одним векторным проходом, реестр POI прогоняется по всей истории.
+    """
+
+    def __init__(self, config, history, execution_interval="5min", context_interval="15min",
+                 base_interval=None, signal_sink=None, latency_window=10000, atr_period=14, checkpoint=None):
+        """
+        Args:
+            config (dict): Параметры стратегии (get_strategy_config_params()).
+            history (pd.DataFrame or BarSeries): Закрытые свечи исполнения до запуска потока.
+            execution_interval, context_interval (str): Интервалы исполнения и контекста.
+            base_interval (str, optional): Интервал свечей потока (None — равен execution_interval).
+            signal_sink (callable, optional): Приемник сигналов, может быть корутиной
+                (по умолчанию ListSignalSink).
+            latency_window (int): Сколько последних замеров задержки хранить для статистики.
+            atr_period (int): Период ATR (как в стратегии).
+            checkpoint (dict, optional): Состояние из get_state() прошлого процесса. История должна
+                содержать свечу checkpoint'а; реестр POI догоняется только по свечам после нее.
+        """
+        self.config = config
+        self.execution_interval = execution_interval
+        self.context_interval = context_interval
+        self.base_interval = base_interval or execution_interval
+        self.signal_sink = signal_sink if signal_sink is not None else ListSignalSink()
+        self.min_context_bars = min_context_bars_for(config)
+
+        history = as_bar_series(history)
+        execution_bars = BarSeries(capacity=max(1024, 2 * len(history)), tz=history.tz)
+        execution_bars.extend(history)
+        context_df = resample_ohlcv(execution_bars.to_dataframe(), context_interval, execution_interval)
+        context_bars = BarSeries(capacity=max(1024, 2 * len(context_df)), tz=history.tz)
+        context_bars.extend(context_df)
+
+        self.atr_execution = StreamingATR(atr_period)
+        self.atr_context = StreamingATR(atr_period)
+        atr_execution = self.atr_execution.seed(execution_bars['High'], execution_bars['Low'], execution_bars['Close'])
+        atr_context = self.atr_context.seed(context_bars['High'], context_bars['Low'], context_bars['Close'])
+        self.strategy = AmdSMCStrategy(context_bars, execution_bars, config,
+                                       atr_context=atr_context, atr_execution=atr_execution)
+        if self.strategy.profiler is not None:
+            # Потоковый ATR считается вне стратегии, замеряем его здесь
+            self.strategy.profiler.instrument(self.atr_execution, 'update', 'atr_update_execution')
+            self.strategy.profiler.instrument(self.atr_context, 'update', 'atr_update_context')
+        if checkpoint is not None:
+            self.strategy.set_state(checkpoint['strategy'])
+        self.strategy.warm_up_m5_poi_registry()
+
+        # Агрегатор M15 продолжает незакрытую корзину: в него идут свечи после последней закрытой M15
+        self.context_aggregator = BarAggregator(context_interval, execution_interval)
+        context_end_ns = (int(context_bars.timestamps[-1]) + interval_to_timedelta(context_interval).value
+                          if len(context_bars) else None)
+        tail_start = 0 if context_end_ns is None else int(np.searchsorted(execution_bars.timestamps, context_end_ns))
+        tail = execution_bars[tail_start:]
+        for ts, o, h, l, c, v in zip(tail.timestamps.tolist(), tail['Open'].tolist(), tail['High'].tolist(),
+                                     tail['Low'].tolist(), tail['Close'].tolist(), tail['Volume'].tolist()):
+            self.context_aggregator.update(ts, o, h, l, c, v)
+
+        self.execution_aggregator = None
+        if self.base_interval != execution_interval:
+            self.execution_aggregator = BarAggregator(execution_interval, self.base_interval)
+
+        self.context_slice = None
+        self.context_count = -1
+        self.latencies_ns = deque(maxlen=latency_window)
+        self.bars_received = 0
+        self.bars_processed = 0
+        self.signals_count = 0
+
+    def get_state(self):
+        """
+        Checkpoint live-процесса (для save_checkpoint). Агрегаторы и ATR в него не входят:
+        при перезапуске они заново строятся по истории из кэша одним векторным проходом.
+        """
+        strategy = self.strategy
+        position = len(strategy.execution_bars) - 1
+        return {
+            'position': position,
+            'timestamp': strategy.execution_bars.timestamp(position) if position >= 0 else None,
+            'strategy': strategy.get_state(),
+        }
+
+    def on_bar(self, feed_bar):
+        """
+        Обрабатывает одну закрытую свечу базового интервала.
+
+        Returns:
+            list: Сигналы, сгенерированные на этой свече (обычно пустой список).
+        """
+        self.bars_received += 1
+        ts_ns = _timestamp_to_ns(feed_bar.timestamp)
+        if self.execution_aggregator is None:
+            closed = ((ts_ns, feed_bar.Open, feed_bar.High, feed_bar.Low, feed_bar.Close, feed_bar.Volume),)
+        else:
+            closed = self.execution_aggregator.update(ts_ns, feed_bar.Open, feed_bar.High, feed_bar.Low,
+                                                      feed_bar.Close, feed_bar.Volume)
+        signals = []
+        for bar in closed:
+            signal = self._on_execution_bar(*bar)
+            if signal:
+                signals.append(signal)
+        return signals
+
+    def _on_execution_bar(self, timestamp, o, h, l, c, v):
+        strategy = self.strategy
+        ts_ns = _timestamp_to_ns(timestamp)
+        position = strategy.append_execution_bar(ts_ns, o, h, l, c, v, self.atr_execution.update(h, l, c))
+        for cts, co, ch, cl, cc, cv in self.context_aggregator.update(ts_ns, o, h, l, c, v):
+            strategy.append_context_bar(cts, co, ch, cl, cc, cv, self.atr_context.update(ch, cl, cc))
+        self.bars_processed += 1
+
+        context_count = len(strategy.context_bars)
+        if context_count < self.min_context_bars:
+            return None # Прогрев: контекста M15 еще мало, реестр POI догонит историю при первом вызове
+        if context_count != self.context_count:
+            self.context_count = context_count
+            self.context_slice = strategy.context_bars[:context_count]
+        if strategy.m5_last_position < position - 1:
+            strategy.warm_up_m5_poi_registry(position)
+
+        bar_time = _ns_to_utc_datetime(ts_ns)
+        return strategy.process_new_candle(bar_time, Bar(bar_time, o, h, l, c, v, position), self.context_slice)
+
+    async def run(self, feed, max_bars=None):
+        """
+        Читает поток до конца (или max_bars свечей) и публикует сигналы в signal_sink.
+
+        Returns:
+            dict: Сводка: свечи потока и исполнения, сигналы, время, статистика задержки.
+        """
+        started = time.perf_counter()
+        async for feed_bar in feed:
+            for signal in self.on_bar(feed_bar):
+                self.signals_count += 1
+                result = self.signal_sink(signal)
+                if inspect.isawaitable(result):
+                    await result
+            # Задержка: от получения свечи до публикации решения (с сигналом или без)
+            self.latencies_ns.append(time.perf_counter_ns() - feed_bar.received_ns)
+            if max_bars is not None and self.bars_received >= max_bars:
+                break
+        return {
+            'bars_received': self.bars_received,
+            'bars_processed': self.bars_processed,
+            'signals': self.signals_count,
+            'elapsed_sec': time.perf_counter() - started,
+            'latency': self.latency_stats(),
+        }
+
+    def latency_stats(self):
+        """Задержка решения по последним latency_window свечам, микросекунды."""
+        if not self.latencies_ns:
+            return {'count': 0, 'mean_us': np.nan, 'p50_us': np.nan, 'p99_us': np.nan, 'max_us': np.nan}
+        values = np.fromiter(self.latencies_ns, dtype=np.int64, count=len(self.latencies_ns)) / 1000.0
+        p50, p99 = np.percentile(values, [50, 99])
+        return {'count': len(values), 'mean_us': float(values.mean()), 'p50_us': float(p50),
+                'p99_us': float(p99), 'max_us': float(values.max())}
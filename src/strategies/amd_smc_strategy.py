@@ -1,12 +1,18 @@
 # src/strategies/amd_smc_strategy.py
+import copy
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
 from src.core.market_structure import get_swing_highs_lows, check_bos, check_choch # Функции нужно будет доработать
-from src.core.pois import find_order_blocks, find_fvg, find_inverted_fvg
-from src.core.liquidity import identify_significant_liquidity_levels, check_liquidity_sweep_and_recovery
-from src.utils.time_utils import is_within_trading_session
+from src.core.pois import find_order_blocks, find_fvg, find_inverted_fvg, OrderBlockDetector
+from src.core.liquidity import identify_significant_liquidity_levels, check_liquidity_sweep_and_recovery, LiquiditySweepDetector
+from src.core.indicators import atr
+from src.core.bars import GrowableArray, as_bar_series, column
+from src.core.poi_registry import POIRegistry, zone_schedule
+from src.core.amd_cycle import find_accumulation_ranges, latest_accumulation_range
+from src.utils.profiling import Profiler
+from src.utils.time_utils import get_session_calendar
 from src.config import (
     TRADING_SESSIONS_UTC, FILTER_BY_TRADING_SESSIONS,
     ACC_DIST_BARS_MIN, ACC_DIST_BARS_MAX, ACC_DIST_VOLATILITY_THRESHOLD, ACC_DIST_PRIOR_TREND_LOOKBACK,
@@ -16,276 +22,558 @@ from src.config import (
     SL_ATR_MULTIPLIER_EXECUTION, SL_OFFSET_POINTS, TAKE_PROFIT_RR_RATIO
 )
 
-# Состояния стратегии
-STATE_IDLE = "IDLE"
-STATE_AWAITING_TRADING_SESSION = "AWAITING_TRADING_SESSION"
-STATE_IDENTIFYING_M15_CONTEXT = "IDENTIFYING_M15_CONTEXT" # Поиск аккумуляции и ликвидности на M15
-STATE_M15_ACCUMULATION_DEFINED = "M15_ACCUMULATION_DEFINED" # Аккумуляция найдена, ждем манипуляцию SSL
-STATE_M15_DISTRIBUTION_DEFINED = "M15_DISTRIBUTION_DEFINED" # Распределение найдено, ждем манипуляцию BSL
-STATE_M15_MANIPULATION_SSL_SWEEP_DETECTED = "M15_MANIPULATION_SSL_SWEEP_DETECTED" # Свип SSL, ждем M5 CHoCH вверх
-STATE_M15_MANIPULATION_BSL_SWEEP_DETECTED = "M15_MANIPULATION_BSL_SWEEP_DETECTED" # Свип BSL, ждем M5 CHoCH вниз
-STATE_M5_CHOCH_BOS_UP_CONFIRMED = "M5_CHOCH_BOS_UP_CONFIRMED" # CHoCH/BOS вверх на M5, ищем POI для лонга
-STATE_M5_CHOCH_BOS_DOWN_CONFIRMED = "M5_CHOCH_BOS_DOWN_CONFIRMED" # CHoCH/BOS вниз на M5, ищем POI для шорта
-STATE_AWAITING_M5_POI_RETEST_LONG = "AWAITING_M5_POI_RETEST_LONG"
-STATE_AWAITING_M5_POI_RETEST_SHORT = "AWAITING_M5_POI_RETEST_SHORT"
+# Состояния стратегии: целочисленные коды (индекс в таблице обработчиков _STATE_HANDLERS).
+# Коды идут в порядке развития сетапа: за один вызов process_new_candle обработчики
+# выполняются, пока состояние переходит на больший код (IDLE -> поиск контекста -> диапазон ...).
+STATE_IDLE = 0
+STATE_AWAITING_TRADING_SESSION = 1
+STATE_IDENTIFYING_M15_CONTEXT = 2 # Поиск аккумуляции/распределения и ликвидности на M15
+STATE_M15_ACCUMULATION_DEFINED = 3 # Аккумуляция найдена, ждем манипуляцию SSL
+STATE_M15_DISTRIBUTION_DEFINED = 4 # Распределение найдено, ждем манипуляцию BSL
+STATE_M15_MANIPULATION_SSL_SWEEP_DETECTED = 5 # Свип SSL, ждем M5 CHoCH вверх
+STATE_M15_MANIPULATION_BSL_SWEEP_DETECTED = 6 # Свип BSL, ждем M5 CHoCH вниз
+STATE_M5_CHOCH_BOS_UP_CONFIRMED = 7 # CHoCH/BOS вверх на M5, ищем POI для лонга
+STATE_M5_CHOCH_BOS_DOWN_CONFIRMED = 8 # CHoCH/BOS вниз на M5, ищем POI для шорта
+STATE_AWAITING_M5_POI_RETEST_LONG = 9
+STATE_AWAITING_M5_POI_RETEST_SHORT = 10
+
+STATE_NAMES = (
+    "IDLE", "AWAITING_TRADING_SESSION", "IDENTIFYING_M15_CONTEXT",
+    "M15_ACCUMULATION_DEFINED", "M15_DISTRIBUTION_DEFINED",
+    "M15_MANIPULATION_SSL_SWEEP_DETECTED", "M15_MANIPULATION_BSL_SWEEP_DETECTED",
+    "M5_CHOCH_BOS_UP_CONFIRMED", "M5_CHOCH_BOS_DOWN_CONFIRMED",
+    "AWAITING_M5_POI_RETEST_LONG", "AWAITING_M5_POI_RETEST_SHORT",
+)
+
+# Направление сетапа: лонг после свипа SSL под накоплением, шорт после свипа BSL над распределением
+DIRECTION_LONG = 1
+DIRECTION_SHORT = -1
+
+# Состояния сетапа по направлению: обработчики параметризованы направлением и берут
+# следующее состояние отсюда, поэтому лонг и шорт используют один код
+_DIRECTION_STATES = {
+    DIRECTION_LONG: {
+        'range': STATE_M15_ACCUMULATION_DEFINED,
+        'sweep': STATE_M15_MANIPULATION_SSL_SWEEP_DETECTED,
+        'structure': STATE_M5_CHOCH_BOS_UP_CONFIRMED,
+        'retest': STATE_AWAITING_M5_POI_RETEST_LONG,
+    },
+    DIRECTION_SHORT: {
+        'range': STATE_M15_DISTRIBUTION_DEFINED,
+        'sweep': STATE_M15_MANIPULATION_BSL_SWEEP_DETECTED,
+        'structure': STATE_M5_CHOCH_BOS_DOWN_CONFIRMED,
+        'retest': STATE_AWAITING_M5_POI_RETEST_SHORT,
+    },
+}
+
+# Таблица переходов: код состояния -> (имя метода-обработчика, направление).
+# Обработчик вызывается как handler(direction, current_time_utc, m5_candle, m15_slice) и
+# возвращает сигнал или None; переход выполняется через _transition().
+_STATE_HANDLERS = (
+    ('_on_idle', 0), # STATE_IDLE
+    ('_on_noop', 0), # STATE_AWAITING_TRADING_SESSION (выход обрабатывает фильтр сессий)
+    ('_on_identifying_m15_context', 0),
+    ('_on_m15_range_defined', DIRECTION_LONG),
+    ('_on_m15_range_defined', DIRECTION_SHORT),
+    ('_on_m15_manipulation', DIRECTION_LONG),
+    ('_on_m15_manipulation', DIRECTION_SHORT),
+    ('_on_noop', DIRECTION_LONG), # STATE_M5_CHOCH_BOS_UP_CONFIRMED: POI ищется в момент CHoCH/BOS
+    ('_on_noop', DIRECTION_SHORT),
+    ('_on_m5_poi_retest', DIRECTION_LONG),
+    ('_on_m5_poi_retest', DIRECTION_SHORT),
+)
+
+# Запись трассы переходов автомата: свеча M5 и коды состояний (12 байт на переход)
+TRANSITION_TRACE_DTYPE = np.dtype([('position', np.int64), ('from_state', np.int16), ('to_state', np.int16)])
+
+# Приоритет типов POI для входа в лонг (меньше — лучше)
+_LONG_POI_PRIORITY = {'inverted_bullish_fvg': 0, 'bullish_fvg': 1, 'bullish_ob': 2}
+_SHORT_POI_PRIORITY = {'inverted_bearish_fvg': 0, 'bearish_fvg': 1, 'bearish_ob': 2}
+
+# Простые поля состояния, которые сохраняются в checkpoint (см. get_state)
+_STATE_FIELDS = (
+    'current_state', 'setup_direction', 'active_trading_session',
+    'm15_accumulation_low', 'm15_accumulation_high', 'm15_target_ssl', 'm15_target_bsl',
+    'm15_manipulation_extremum', 'm15_last_processed_count',
+    'm5_last_swing_high_before_manip_low', 'm5_last_swing_low_before_manip_high', 'm5_poi_for_entry',
+    'm5_last_position',
+)
+
+# Параметры конфигурации, от которых зависят диапазоны M15 и зоны FVG/OB на M5: оптимизатор
+# считает их по всей истории один раз на каждое сочетание этих параметров (ключ кэша воркера)
+ACC_DIST_PARAM_NAMES = ('ACC_DIST_BARS_MIN', 'ACC_DIST_BARS_MAX', 'ACC_DIST_VOLATILITY_THRESHOLD',
+                        'ACC_DIST_PRIOR_TREND_LOOKBACK', 'ACC_DIST_PRIOR_TREND_MIN_ATR')
+M5_ZONE_PARAM_NAMES = ('FVG_MIN_SIZE_ATR_FACTOR', 'OB_DISPLACEMENT_BARS', 'OB_DISPLACEMENT_ATR_FACTOR')
+
+
+def acc_dist_params(config):
+    """Аргументы find_accumulation_ranges / latest_accumulation_range из параметров стратегии."""
+    return {
+        'min_bars': config.get('ACC_DIST_BARS_MIN', 10),
+        'max_bars': config.get('ACC_DIST_BARS_MAX', 50),
+        'volatility_threshold': config.get('ACC_DIST_VOLATILITY_THRESHOLD', 3.0),
+        'prior_trend_lookback': config.get('ACC_DIST_PRIOR_TREND_LOOKBACK', 100),
+        'prior_trend_min_atr': config.get('ACC_DIST_PRIOR_TREND_MIN_ATR', 5.0),
+    }
+
+
+def m5_order_block_detector(config):
+    return OrderBlockDetector(
+        lookahead=config.get('OB_DISPLACEMENT_BARS', 3),
+        displacement_atr_factor=config.get('OB_DISPLACEMENT_ATR_FACTOR', 1.0)
+    )
+
+
+def build_m15_accumulation_ranges(context_bars, atr_context, config):
+    """Диапазоны накопления/распределения по всей истории M15 (find_accumulation_ranges)."""
+    atr_values = atr_context if atr_context is not None else np.full(len(context_bars), np.nan)
+    return find_accumulation_ranges(context_bars['High'], context_bars['Low'], context_bars['Close'],
+                                    atr_values[:len(context_bars)], **acc_dist_params(config))
+
+
+def build_m5_zone_schedule(execution_bars, atr_execution, config):
+    """FVG и OB по всей истории M5 для реестра POI (см. poi_registry.zone_schedule)."""
+    return zone_schedule(execution_bars['Open'], execution_bars['High'], execution_bars['Low'],
+                         execution_bars['Close'], atr_execution,
+                         fvg_min_size_atr_factor=config.get('FVG_MIN_SIZE_ATR_FACTOR', 0.0),
+                         order_block_detector=m5_order_block_detector(config), index=execution_bars.index)
+
 
 class AmdSMCStrategy:
-    def __init__(self, df_context, df_execution, config_params):
-        self.df_context = df_context # DataFrame M15
-        self.df_execution = df_execution # DataFrame M5
+    def __init__(self, df_context, df_execution, config_params, atr_context=None, atr_execution=None,
+                 m15_ranges=None, m5_zone_schedule=None):
+        """
+        Args:
+            df_context, df_execution (BarSeries or pd.DataFrame): История M15 и M5.
+            config_params (dict): Параметры стратегии (см. get_strategy_config_params в src/config.py).
+            atr_context, atr_execution (np.ndarray, optional): Заранее посчитанный ATR(14) для M15/M5.
+                ATR не зависит от параметров стратегии, поэтому оптимизатор считает его один раз
+                и передает во все прогоны.
+            m15_ranges (dict, optional): build_m15_accumulation_ranges() по этой истории M15.
+            m5_zone_schedule (dict, optional): build_m5_zone_schedule() по этой истории M5 — реестр POI
+                берет зоны из него, а не ищет на каждой свече. Только для бэктеста: свечи,
+                дописанные позже (live-режим), в расписании отсутствуют.
+        """
+        # История хранится как BarSeries (массивы колонок), DataFrame конвертируется один раз
+        self.context_bars = as_bar_series(df_context) # M15
+        self.execution_bars = as_bar_series(df_execution) # M5
         self.config = config_params # Словарь с параметрами из src/config.py
 
         self.current_state = STATE_IDLE
+        self.setup_direction = 0 # DIRECTION_LONG / DIRECTION_SHORT после нахождения диапазона, 0 — нет сетапа
         self.active_trading_session = None # Название текущей активной сессии
+        # Таблица обработчиков состояний: список (bound-метод, направление), индекс — код состояния
+        self._handlers = [(getattr(self, name), direction) for name, direction in _STATE_HANDLERS]
+        # Трасса переходов (позиция M5, из, в) в предвыделенном массиве; STATE_TRACE_CAPACITY = 0 — выключена
+        trace_capacity = self.config.get('STATE_TRACE_CAPACITY', 0)
+        self._trace = np.empty(trace_capacity, dtype=TRANSITION_TRACE_DTYPE) if trace_capacity else None
+        self._trace_length = 0
+        # Календарь сессий компилируется один раз, дальше проверка свечи — O(1)
+        self.session_calendar = get_session_calendar(self.config.get('TRADING_SESSIONS_UTC', {}))
+        self._session_lookup = self.session_calendar.lookup
 
         # Данные для M15 контекста
-        self.m15_accumulation_low = None
+        self.m15_accumulation_low = None # Границы диапазона накопления (лонг) или распределения (шорт)
         self.m15_accumulation_high = None
         self.m15_target_ssl = None # {'price': float, 'timestamp': datetime}
         self.m15_target_bsl = None # {'price': float, 'timestamp': datetime}
         self.m15_manipulation_extremum = None # Цена Low/High свипа на M15
+        self.m15_sweep_detector = None # LiquiditySweepDetector для цели SSL/BSL текущего сетапа
+        self.m15_last_processed_count = 0 # Сколько свечей M15 было в срезе при последней проверке свипа
 
         # Данные для M5 исполнения
         self.m5_last_swing_high_before_manip_low = None # Для CHoCH вверх
         self.m5_last_swing_low_before_manip_high = None # Для CHoCH вниз
         self.m5_poi_for_entry = None # Словарь с POI {'type', 'top', 'bottom', ...}
-        
+
+        # Профилирование (PROFILING_ENABLED): методы горячего пути этого экземпляра подменяются
+        # обертками с замером времени, без профилирования код выполняется как есть
+        self.profiler = None
+        if self.config.get('PROFILING_ENABLED', False):
+            self.profiler = Profiler(alloc_sample_start=self.config.get('PROFILING_ALLOC_SAMPLE_START', 1000),
+                                     alloc_sample_calls=self.config.get('PROFILING_ALLOC_SAMPLE_BARS', 0))
+            self._instrument(self.profiler)
+
         # ATR для расчетов (должны обновляться)
-        self.atr_context = None # Серия ATR для M15
-        self.atr_execution = None # Серия ATR для M5
-        self._calculate_atr_series()
+        self.atr_context = atr_context # Массив ATR для M15
+        self.atr_execution = atr_execution # Массив ATR для M5
+        if atr_context is None or atr_execution is None:
+            self._calculate_atr_series()
+
+        # Реестр POI на M5: FVG и OB регистрируются и митигируются на каждой закрытой свече M5.
+        # Не сбрасывается в reset_strategy_state — зоны существуют независимо от сетапа.
+        self.m5_poi_registry = POIRegistry(
+            fvg_min_size_atr_factor=self.config.get('FVG_MIN_SIZE_ATR_FACTOR', 0.0),
+            order_block_detector=m5_order_block_detector(self.config) if m5_zone_schedule is None else None,
+            max_age_bars=self.config.get('POI_MAX_AGE_BARS'),
+            zone_schedule=m5_zone_schedule
+        )
+        self.m5_last_position = -1 # Позиция последней свечи M5, переданной в реестр POI
+        self._m15_ranges = m15_ranges # Диапазоны накопления по истории M15 (find_accumulation_ranges), считаются один раз
 
         print("AmdSMCStrategy инициализирована.")
         self.reset_strategy_state() # Установка начального состояния
 
+    def _instrument(self, profiler):
+        """
+        Замеры по функциям горячего пути и по обработчикам состояний автомата
+        ('state:<имя состояния>'). Время функции включает вложенные вызовы.
+        """
+        profiler.instrument(self, 'process_new_candle', tick=True)
+        for name, attribute in (('session_lookup', '_session_lookup'), ('atr', '_calculate_atr_series'),
+                                ('poi_registry_update', '_update_m5_poi_registry'),
+                                ('poi_registry_catch_up', '_catch_up_m5_poi_registry'),
+                                ('m15_range_search', '_find_m15_range_and_liquidity'),
+                                ('poi_search', '_find_m5_entry_poi')):
+            profiler.instrument(self, attribute, name)
+        self._handlers = [(profiler.wrap('state:' + STATE_NAMES[state], handler), direction)
+                          for state, (handler, direction) in enumerate(self._handlers)]
+
     def _calculate_atr_series(self, period=14):
-        # Расчет ATR для обоих таймфреймов, если данные есть
-        if not self.df_context.empty:
-            from src.core.indicators import atr # Предполагаем, что есть такой модуль
-            self.atr_context = atr(self.df_context['High'], self.df_context['Low'], self.df_context['Close'], period)
-        if not self.df_execution.empty:
-            from src.core.indicators import atr
-            self.atr_execution = atr(self.df_execution['High'], self.df_execution['Low'], self.df_execution['Close'], period)
+        # Расчет ATR для обоих таймфреймов, если данные есть (один векторный проход по всей истории)
+        if not self.context_bars.empty:
+            self.atr_context = atr(self.context_bars['High'], self.context_bars['Low'], self.context_bars['Close'], period)
+        if not self.execution_bars.empty:
+            self.atr_execution = atr(self.execution_bars['High'], self.execution_bars['Low'], self.execution_bars['Close'], period)
+
+    def append_execution_bar(self, timestamp, open_, high, low, close, volume=float('nan'), atr_value=float('nan')):
+        """
+        Live-режим: дописывает закрытую свечу M5 в историю и значение ATR (посчитанное
+        потоково, например StreamingATR). Возвращает позицию свечи для Bar.position.
+        """
+        self.execution_bars.append(timestamp, open_, high, low, close, volume)
+        self.atr_execution = self._append_atr('_atr_execution_buffer', self.atr_execution, atr_value)
+        return len(self.execution_bars) - 1
+
+    def append_context_bar(self, timestamp, open_, high, low, close, volume=float('nan'), atr_value=float('nan')):
+        """Live-режим: дописывает закрытую свечу M15 и ее ATR."""
+        self.context_bars.append(timestamp, open_, high, low, close, volume)
+        self.atr_context = self._append_atr('_atr_context_buffer', self.atr_context, atr_value)
+        return len(self.context_bars) - 1
+
+    def _append_atr(self, buffer_name, values, atr_value):
+        # Буфер создается при первой дозаписи из уже посчитанного массива ATR
+        buffer = getattr(self, buffer_name, None)
+        if buffer is None:
+            buffer = GrowableArray(values)
+            setattr(self, buffer_name, buffer)
+        buffer.append(atr_value)
+        return buffer.values
+
+    def warm_up_m5_poi_registry(self, stop=None, start=None):
+        """
+        Прогоняет реестр POI по уже известной истории M5 [start, stop) — перед запуском
+        live-режима или отрезка walk-forward. По умолчанию от последней учтенной свечи до конца.
+        """
+        stop = len(self.execution_bars) if stop is None else stop
+        start = self.m5_last_position + 1 if start is None else max(start, self.m5_last_position + 1)
+        if stop > start:
+            self._catch_up_m5_poi_registry(start, stop)
+            self.m5_last_position = stop - 1
+
+    def get_state(self):
+        """
+        Снимок состояния стратегии для checkpoint (src/utils/checkpoint.py): автомат состояний,
+        контекст M15, параметры сетапа M5 и реестр POI. История свечей и ATR не сохраняются —
+        при восстановлении они берутся из тех же данных; по позиции и времени последней
+        свечи M5 set_state() проверяет, что история та же.
+        """
+        state = {name: copy.deepcopy(getattr(self, name)) for name in _STATE_FIELDS}
+        state['m15_sweep_detector'] = (self.m15_sweep_detector.get_state()
+                                       if self.m15_sweep_detector is not None else None)
+        state['m5_poi_registry'] = self.m5_poi_registry.get_state()
+        position = self.m5_last_position
+        state['m5_last_timestamp'] = (int(self.execution_bars.timestamps[position])
+                                      if 0 <= position < len(self.execution_bars) else None)
+        return state
 
+    def set_state(self, state):
+        """Восстанавливает состояние из get_state(). ValueError, если история M5 не совпадает."""
+        position = state['m5_last_position']
+        if position >= len(self.execution_bars):
+            raise ValueError(f"Checkpoint на свече M5 #{position}, а в истории {len(self.execution_bars)} свечей")
+        if position >= 0 and state['m5_last_timestamp'] != int(self.execution_bars.timestamps[position]):
+            raise ValueError(f"Время свечи M5 #{position} в checkpoint не совпадает с историей")
+
+        for name in _STATE_FIELDS:
+            setattr(self, name, copy.deepcopy(state[name]))
+        detector_state = state['m15_sweep_detector']
+        self.m15_sweep_detector = (LiquiditySweepDetector.from_state(detector_state)
+                                       if detector_state is not None else None)
+        self.m5_poi_registry.set_state(state['m5_poi_registry'])
+
+    def _update_m5_poi_registry(self, m5_candle):
+        # Bar из движка бэктеста знает свою позицию в execution_bars; для pd.Series считаем свечи сами
+        position = getattr(m5_candle, 'position', None)
+        if position is None:
+            position = self.m5_last_position + 1
+        elif 0 <= self.m5_last_position < position - 1:
+            # Движок не вызывает стратегию на свечах вне сессии — догружаем их в реестр из execution_bars
+            self._catch_up_m5_poi_registry(self.m5_last_position + 1, position)
+
+        atr_value = None
+        if self.atr_execution is not None and position < len(self.atr_execution):
+            atr_value = float(self.atr_execution[position])
+        self.m5_poi_registry.update(position, m5_candle['High'], m5_candle['Low'], m5_candle['Close'],
+                                    timestamp=m5_candle.name, atr_value=atr_value, open_price=m5_candle['Open'])
+        self.m5_last_position = position
+
+    def _catch_up_m5_poi_registry(self, start, stop):
+        window = self.execution_bars[start:stop]
+        atr_values = self.atr_execution[start:stop].tolist() if self.atr_execution is not None else [None] * len(window)
+        rows = zip(range(start, stop), window['Open'].tolist(), window['High'].tolist(),
+                   window['Low'].tolist(), window['Close'].tolist(), atr_values)
+        for position, open_price, high, low, close, atr_value in rows:
+            timestamp = self.execution_bars.timestamp(position)
+            self.m5_poi_registry.update(position, high, low, close, timestamp=timestamp,
+                                        atr_value=atr_value, open_price=open_price)
 
     def reset_strategy_state(self):
         print(f"[{datetime.now()}] Сброс состояния стратегии к IDLE.")
-        self.current_state = STATE_IDLE
+        self._transition(STATE_IDLE)
+        self.setup_direction = 0
         self.active_trading_session = None
         self.m15_accumulation_low = None
         self.m15_accumulation_high = None
         self.m15_target_ssl = None
         self.m15_target_bsl = None
         self.m15_manipulation_extremum = None
+        self.m15_sweep_detector = None
+        self.m15_last_processed_count = 0
         self.m5_last_swing_high_before_manip_low = None
         self.m5_last_swing_low_before_manip_high = None
         self.m5_poi_for_entry = None
-        # Не сбрасываем self.df_context, self.df_execution, self.config, self.atr_...
+        # Не сбрасываем self.context_bars, self.execution_bars, self.config, self.atr_...
 
     def process_new_candle(self, current_time_utc, m5_candle, m15_candle_data_slice):
         """
         Обрабатывает новую свечу M5 и соответствующий срез данных M15.
         Args:
             current_time_utc (datetime): Текущее время UTC (время закрытия m5_candle).
-            m5_candle (pd.Series): Текущая свеча M5.
-            m15_candle_data_slice (pd.DataFrame): Срез данных M15 до текущего момента.
+            m5_candle (Bar or pd.Series): Текущая свеча M5.
+            m15_candle_data_slice (BarSeries or pd.DataFrame): Срез данных M15 до текущего момента.
                                                  Последняя свеча M15 в этом срезе может быть еще не закрытой,
                                                  или закрытой синхронно с M5.
         Returns:
             dict or None: Торговый сигнал или None.
         """
+        # Реестр POI обновляется на каждой свече, в том числе вне торговой сессии
+        self._update_m5_poi_registry(m5_candle)
+
         # 0. Проверка торговой сессии
         if self.config.get('FILTER_BY_TRADING_SESSIONS', True):
-            is_active, session_name = is_within_trading_session(current_time_utc, self.config.get('TRADING_SESSIONS_UTC', {}))
+            is_active, session_name = self._session_lookup(current_time_utc)
             if not is_active:
                 if self.current_state != STATE_AWAITING_TRADING_SESSION:
                     # print(f"[{current_time_utc}] Вне торговой сессии. Переход в ожидание.")
                     self.reset_strategy_state() # Сбрасываем, если вышли из сессии
-                    self.current_state = STATE_AWAITING_TRADING_SESSION
+                    self._transition(STATE_AWAITING_TRADING_SESSION)
                 return None
             self.active_trading_session = session_name
             if self.current_state == STATE_AWAITING_TRADING_SESSION: # Если только что вошли в сессию
-                 self.current_state = STATE_IDLE # Начинаем поиск сначала
+                self._transition(STATE_IDLE) # Начинаем поиск сначала
         else:
             self.active_trading_session = "ANY" # Торговля разрешена всегда
 
-        # Обновляем ATR, если нужно (например, на каждой новой M15 свече)
-        # self._calculate_atr_series() # Вызывать аккуратно, чтобы не пересчитывать на каждой M5 свече
-
-        # --- Основная логика состояний (упрощенный пример для Лонга) ---
-        
-        # 1. IDLE: Начало, ожидание условий или переход к идентификации контекста M15
-        if self.current_state == STATE_IDLE:
-            self.current_state = STATE_IDENTIFYING_M15_CONTEXT
-
-        # 2. IDENTIFYING_M15_CONTEXT: Ищем аккумуляцию и ликвидность на M15
-        if self.current_state == STATE_IDENTIFYING_M15_CONTEXT:
-            # Нужен доступ к последней закрытой M15 свече и истории M15
-            # Это место для вызова функции, анализирующей m15_candle_data_slice
-            # для определения аккумуляции и SSL для лонга / BSL для шорта
-            
-            # --- Логика для Лонга ---
-            # а) Ищем предыдущий значимый SSL на M15
-            # б) Ищем формирование диапазона (аккумуляции) выше этого SSL
-            #    Используем ACC_DIST_BARS_MIN/MAX, ACC_DIST_VOLATILITY_THRESHOLD
-            #    Функция должна вернуть high, low диапазона и идентифицированный SSL
-            
-            # Placeholder:
-            # found_accumulation, details = self._find_m15_accumulation_and_ssl(m15_candle_data_slice)
-            # if found_accumulation:
-            #     self.m15_accumulation_low = details['acc_low']
-            #     self.m15_accumulation_high = details['acc_high']
-            #     self.m15_target_ssl = details['target_ssl'] # {'price': ..., 'timestamp': ...}
-            #     print(f"[{current_time_utc}] M15: Найдена аккумуляция [{self.m15_accumulation_low}-{self.m15_accumulation_high}], цель SSL: {self.m15_target_ssl['price']}")
-            #     self.current_state = STATE_M15_ACCUMULATION_DEFINED
-            # else:
-            #     # Если не нашли, остаемся в этом состоянии или сбрасываемся в IDLE через N попыток
-            #     pass
-            pass # ЗАГЛУШКА
-
-        # 3. M15_ACCUMULATION_DEFINED: Аккумуляция найдена, ждем свип SSL на M15
-        if self.current_state == STATE_M15_ACCUMULATION_DEFINED:
-            if self.m15_target_ssl:
-                # Анализируем последнюю закрытую M15 свечу из m15_candle_data_slice
-                # last_m15_closed_candle = m15_candle_data_slice.iloc[-1] # Пример
-                # atr_m15_now = self.atr_context.iloc[-1] if self.atr_context is not None and not self.atr_context.empty else None
-                
-                # swept, sweep_price = check_liquidity_sweep_and_recovery(
-                #     last_m15_closed_candle,
-                #     self.m15_target_ssl['price'],
-                #     is_sweeping_below_ssl=True,
-                #     recovery_bars_config=self.config.get('MANIPULATION_RECOVERY_BARS'),
-                #     sweep_depth_atr_factor=self.config.get('MANIPULATION_SWEEP_DEPTH_ATR_FACTOR'),
-                #     atr_value_at_sweep=atr_m15_now
-                # )
-                # if swept:
-                #     self.m15_manipulation_extremum = sweep_price
-                #     print(f"[{current_time_utc}] M15: Обнаружен свип SSL на {self.m15_manipulation_extremum}. Переход к M5 CHoCH.")
-                #     self.current_state = STATE_M15_MANIPULATION_SSL_SWEEP_DETECTED
-                #     # Здесь нужно определить m5_last_swing_high_before_manip_low на M5 данных
-                #     # Это максимум на M5, который был перед финальным движением M15 на свип
-                # else:
-                #     # Если цена ушла слишком далеко от аккумуляции без свипа, сброс
-                #     # if m5_candle['Close'] > self.m15_accumulation_high + (atr_m15_now * 2): # Пример
-                #     #     self.reset_strategy_state()
-                #     pass
-                pass # ЗАГЛУШКА
-
-
-        # 4. M15_MANIPULATION_SSL_SWEEP_DETECTED: Свип SSL на M15 произошел, ждем CHoCH/BOS вверх на M5
-        if self.current_state == STATE_M15_MANIPULATION_SSL_SWEEP_DETECTED:
-            # Здесь работаем с m5_candle и историей M5 (self.df_execution)
-            # Нужно найти self.m5_last_swing_high_before_manip_low (если еще не найден)
-            # И затем отслеживать его пробой вверх (CHoCH/BOS)
-            
-            # Placeholder:
-            # if self.m5_last_swing_high_before_manip_low:
-            #     is_choch_bos_up = check_bos(m5_candle['Close'], self.m5_last_swing_high_before_manip_low, is_uptrend=True) # Упрощенно
-            #     if is_choch_bos_up:
-            #         # Проверка импульсивности пробоя (например, по ATR M5)
-            #         # atr_m5_now = self.atr_execution.iloc[-1] if self.atr_execution is not None and not self.atr_execution.empty else 0
-            #         # impulse_threshold = atr_m5_now * self.config.get('CHOSHBOS_IMPULSE_ATR_FACTOR', 1.5)
-            #         # if (m5_candle['High'] - self.m5_last_swing_high_before_manip_low) > impulse_threshold: # Пример проверки импульса
-            #         print(f"[{current_time_utc}] M5: CHoCH/BOS вверх подтвержден. Ищем POI.")
-            #         self.current_state = STATE_M5_CHOCH_BOS_UP_CONFIRMED
-            #         # На этом этапе нужно найти POI (инвертированный FVG или новый FVG/OB)
-            #         # созданный этим импульсным движением BOS/CHoCH
-            #         # self.m5_poi_for_entry = self._find_m5_entry_poi_long(self.df_execution до m5_candle, m5_candle_index)
-            #         # if self.m5_poi_for_entry:
-            #         #    self.current_state = STATE_AWAITING_M5_POI_RETEST_LONG
-            #         # else: self.reset_strategy_state() # Если POI не найден
-            # else: # Если CHoCH/BOS не произошел, а цена пошла ниже минимума манипуляции
-                # if m5_candle['Low'] < self.m15_manipulation_extremum:
-                #    self.reset_strategy_state() # Сетап недействителен
-            pass # ЗАГЛУШКА
-
-        # 5. STATE_AWAITING_M5_POI_RETEST_LONG: Ожидаем тест POI на M5 для входа в лонг
-        if self.current_state == STATE_AWAITING_M5_POI_RETEST_LONG:
-            # if self.m5_poi_for_entry:
-            #     poi_top = self.m5_poi_for_entry['top']
-            #     poi_bottom = self.m5_poi_for_entry['bottom']
-            #     # Цена должна войти в зону POI
-            #     if m5_candle['Low'] <= poi_top and m5_candle['High'] >= poi_bottom:
-            #         # Условие входа: касание POI или закрытие внутри
-            #         # Можно добавить подтверждение на M5 (например, микро-паттерн)
-            #         entry_price = min(m5_candle['Open'], poi_top) # Пример входа на касании верхней границы POI
-            #         if m5_candle['Low'] <= entry_price: # Убедимся, что цена достигла уровня входа
-            #             # Расчет SL и TP
-            #             sl_price = self.m15_manipulation_extremum - (self.atr_execution.iloc[-1] * self.config.get('SL_OFFSET_POINTS', 0.1) if self.atr_execution is not None else self.config.get('SL_OFFSET_POINTS_ABS', 0.0005)) # Пример SL
-            #             # Или SL_OFFSET_POINTS от POI bottom
-            #             # sl_price = poi_bottom - self.config.get('SL_OFFSET_POINTS_ABS', 0.0005)
-
-            #             risk = entry_price - sl_price
-            #             if risk <= 0: # Невалидный риск
-            #                 self.reset_strategy_state()
-            #                 return None
-            #             tp_price = entry_price + (risk * self.config.get('TAKE_PROFIT_RR_RATIO', 2.0))
-                        
-            #             signal_time = m5_candle.name # Индекс свечи (Timestamp)
-            #             print(f"СИГНАЛ LONG: {signal_time} | Вход: {entry_price:.5f} | SL: {sl_price:.5f} | TP: {tp_price:.5f} | POI: {self.m5_poi_for_entry['type']}")
-            #             self.reset_strategy_state() # Сброс для поиска нового сетапа
-            #             return {
-            #                 'signal': 'BUY', 'timestamp': signal_time, 
-            #                 'price': entry_price, 'sl': sl_price, 'tp': tp_price,
-            #                 'poi_type': self.m5_poi_for_entry['type'], 
-            #                 'session': self.active_trading_session
-            #             }
-            #     # Если цена ушла слишком далеко от POI без теста, сброс
-            #     # if m5_candle['Close'] > poi_top + (self.atr_execution.iloc[-1] * 3): # Пример
-            #     #     self.reset_strategy_state()
-            pass # ЗАГЛУШКА
-
-        # --- Логика для Шорт-сценария (аналогично, но зеркально) ---
-        # STATE_M15_DISTRIBUTION_DEFINED -> STATE_M15_MANIPULATION_BSL_SWEEP_DETECTED ->
-        # STATE_M5_CHOCH_BOS_DOWN_CONFIRMED -> STATE_AWAITING_M5_POI_RETEST_SHORT
-
-        return None # Нет сигнала на этой свече
+        # ATR посчитан для всей истории в _calculate_atr_series, на каждой свече не пересчитывается.
+        # Для live-режима есть src.core.indicators.StreamingATR с обновлением за O(1).
+
+        # Автомат состояний: обработчик текущего состояния из таблицы; если он перевел сетап
+        # дальше (на больший код), на этой же свече выполняется обработчик нового состояния
+        handlers = self._handlers
+        while True:
+            state = self.current_state
+            handler, direction = handlers[state]
+            signal = handler(direction, current_time_utc, m5_candle, m15_candle_data_slice)
+            if signal is not None:
+                return signal
+            if self.current_state <= state:
+                return None
+
+    def _transition(self, new_state):
+        """Переход автомата; при включенной трассе записывает (позиция M5, из, в)."""
+        old_state = self.current_state
+        self.current_state = new_state
+        trace = getattr(self, '_trace', None)
+        if trace is None or old_state == new_state:
+            return
+        n = self._trace_length
+        if n == len(trace):
+            grown = np.empty(2 * len(trace), dtype=TRANSITION_TRACE_DTYPE)
+            grown[:n] = trace
+            self._trace = trace = grown
+        trace[n] = (self.m5_last_position, old_state, new_state)
+        self._trace_length = n + 1
+
+    def transition_trace(self):
+        """
+        Трасса переходов автомата (при STATE_TRACE_CAPACITY > 0): колонки 'position' (свеча M5),
+        'from_state', 'to_state' (коды STATE_*, имена — STATE_NAMES[code]).
+        """
+        trace = self._trace[:self._trace_length] if self._trace is not None else np.empty(0, TRANSITION_TRACE_DTYPE)
+        return {name: trace[name] for name in TRANSITION_TRACE_DTYPE.names}
+
+    # --- Обработчики состояний (см. _STATE_HANDLERS) ---
+
+    def _on_noop(self, direction, current_time_utc, m5_candle, m15_slice):
+        return None
+
+    def _on_idle(self, direction, current_time_utc, m5_candle, m15_slice):
+        # Начало: переход к идентификации контекста M15
+        self._transition(STATE_IDENTIFYING_M15_CONTEXT)
+        return None
+
+    def _on_identifying_m15_context(self, direction, current_time_utc, m5_candle, m15_slice):
+        # Ищем на M15 диапазон накопления (под ним SSL — цель свипа для лонга)
+        # или распределения (над ним BSL — цель для шорта).
+        # Диапазон проверяется один раз на каждую новую закрытую M15 свечу
+        m15_count = len(m15_slice)
+        if m15_count == 0 or m15_count == self.m15_last_processed_count:
+            return None
+        self.m15_last_processed_count = m15_count
+        direction, details = self._find_m15_range_and_liquidity(m15_slice)
+        if not direction:
+            return None # Остаемся в этом состоянии до следующей свечи M15
+        self.setup_direction = direction
+        self.m15_accumulation_low = details['range_low']
+        self.m15_accumulation_high = details['range_high']
+        if direction == DIRECTION_LONG:
+            self.m15_target_ssl = details['target'] # {'price': ..., 'timestamp': ...}
+            print(f"[{current_time_utc}] M15: Найдена аккумуляция [{self.m15_accumulation_low}-{self.m15_accumulation_high}], цель SSL: {self.m15_target_ssl['price']}")
+        else:
+            self.m15_target_bsl = details['target']
+            print(f"[{current_time_utc}] M15: Найдено распределение [{self.m15_accumulation_low}-{self.m15_accumulation_high}], цель BSL: {self.m15_target_bsl['price']}")
+        self._transition(_DIRECTION_STATES[direction]['range'])
+        return None
+
+    def _on_m15_range_defined(self, direction, current_time_utc, m5_candle, m15_slice):
+        # Диапазон найден, ждем свип SSL (лонг) / BSL (шорт) на M15.
+        # Свип проверяется один раз на каждую новую закрытую M15 свечу.
+        # LiquiditySweepDetector хранит состояние между свечами, поэтому возврат
+        # может занять до MANIPULATION_RECOVERY_BARS свечей M15.
+        target = self.m15_target_ssl if direction == DIRECTION_LONG else self.m15_target_bsl
+        m15_count = len(m15_slice)
+        if not target or m15_count == 0 or m15_count == self.m15_last_processed_count:
+            return None
+        self.m15_last_processed_count = m15_count
+        if self.m15_sweep_detector is None:
+            self.m15_sweep_detector = LiquiditySweepDetector(
+                target['price'],
+                is_sweeping_below_ssl=direction == DIRECTION_LONG,
+                recovery_bars=self.config.get('MANIPULATION_RECOVERY_BARS', 1),
+                sweep_depth_atr_factor=self.config.get('MANIPULATION_SWEEP_DEPTH_ATR_FACTOR', 0.0)
+            )
+        atr_m15_now = None
+        if self.atr_context is not None and m15_count <= len(self.atr_context):
+            atr_m15_now = float(self.atr_context[m15_count - 1])
+
+        swept, sweep_price = self.m15_sweep_detector.update(
+            float(column(m15_slice, 'High')[-1]),
+            float(column(m15_slice, 'Low')[-1]),
+            float(column(m15_slice, 'Close')[-1]),
+            atr_m15_now
+        )
+        if swept:
+            self.m15_manipulation_extremum = sweep_price
+            side = 'SSL' if direction == DIRECTION_LONG else 'BSL'
+            print(f"[{current_time_utc}] M15: Обнаружен свип {side} на {self.m15_manipulation_extremum}. Переход к M5 CHoCH.")
+            self._transition(_DIRECTION_STATES[direction]['sweep'])
+            # Здесь нужно определить последний свинг M5 перед свипом (m5_last_swing_high_before_manip_low
+            # для лонга, m5_last_swing_low_before_manip_high для шорта) — уровень CHoCH
+        return None
+
+    def _on_m15_manipulation(self, direction, current_time_utc, m5_candle, m15_slice):
+        # Свип на M15 произошел, ждем CHoCH/BOS на M5 в сторону сетапа.
+        # Placeholder: пробой свинга M5 перед свипом (check_bos) с импульсом не меньше
+        # CHOSHBOS_IMPULSE_ATR_FACTOR * ATR M5 переводит в _DIRECTION_STATES[direction]['structure'],
+        # затем POI ищется _find_m5_entry_poi(direction, ...) и сетап ждет ретест ('retest').
+        # Обновление экстремума манипуляции против сетапа делает сетап недействительным.
+        return None # ЗАГЛУШКА
+
+    def _on_m5_poi_retest(self, direction, current_time_utc, m5_candle, m15_slice):
+        # Ожидаем тест POI на M5 для входа. Placeholder: касание зоны m5_poi_for_entry,
+        # вход на ее ближней границе, SL за экстремумом манипуляции с отступом SL_OFFSET_POINTS * ATR M5,
+        # TP по TAKE_PROFIT_RR_RATIO; сигнал {'signal': 'BUY'/'SELL', 'timestamp', 'price', 'sl', 'tp',
+        # 'poi_type', 'session'}, затем reset_strategy_state().
+        return None # ЗАГЛУШКА
 
     # --- Вспомогательные методы для поиска контекста и POI (должны быть реализованы) ---
 
-    def _find_m15_accumulation_and_ssl(self, m15_df_slice):
+    def _find_m15_range_and_liquidity(self, m15_df_slice):
         """
-        Ищет на M15:
-        1. Значимый SSL ниже текущей цены.
-        2. Формирование диапазона аккумуляции выше этого SSL.
-        Возвращает (bool, details_dict)
+        Ищет на M15 диапазон, заканчивающийся на последней закрытой свече:
+        ширина не больше ACC_DIST_VOLATILITY_THRESHOLD ATR, длина ACC_DIST_BARS_MIN..MAX,
+        перед диапазоном — тренд за ACC_DIST_PRIOR_TREND_LOOKBACK свечей. Нисходящий тренд
+        оставляет ликвидность под диапазоном (накопление, цель SSL — минимум диапазона),
+        восходящий — над ним (распределение, цель BSL — максимум).
+
+        Диапазоны для всей известной истории M15 считаются один раз (find_accumulation_ranges),
+        на свече без диапазона проверка — O(1). Для свечей, дописанных позже (live-режим),
+        считается только хвост последних ACC_DIST_BARS_MAX + ACC_DIST_PRIOR_TREND_LOOKBACK свечей.
+
+        Returns:
+            int: DIRECTION_LONG (накопление), DIRECTION_SHORT (распределение) или 0.
+            dict: 'range_low', 'range_high', 'target' ({'price', 'timestamp'}), 'range' (детали) или None.
         """
-        # TODO: Реализовать логику
-        # 1. Использовать identify_significant_liquidity_levels для SSL
-        # 2. Проверить N свечей после SSL на формирование диапазона (High/Low, волатильность)
-        #    в соответствии с ACC_DIST_... параметрами.
-        # 3. Убедиться, что "цена должна оставить ликвидность хотя бы с одной стороны" -
-        #    т.е. перед аккумуляцией был тренд, оставивший этот SSL.
-        return False, None
-
-    def _find_m5_entry_poi_long(self, m5_df_slice_up_to_bos, bos_candle_index_in_slice):
+        position = len(m15_df_slice) - 1
+        if position < 0:
+            return 0, None
+        ranges = self._m15_accumulation_ranges()
+        if position < len(ranges['end']) and not ranges['qualified'][position]:
+            return 0, None
+
+        details = latest_accumulation_range(m15_df_slice, atr_values=self.atr_context, **acc_dist_params(self.config))
+        if details is None:
+            return 0, None
+        if details['phase'] == 'accumulation':
+            direction, target = DIRECTION_LONG, {'price': details['low'], 'timestamp': details['low_time']}
+        else:
+            direction, target = DIRECTION_SHORT, {'price': details['high'], 'timestamp': details['high_time']}
+        return direction, {
+            'range_low': details['low'],
+            'range_high': details['high'],
+            'target': target,
+            'range': details,
+        }
+
+    def _m15_accumulation_ranges(self):
+        # Считается при первом обращении по истории M15, известной на этот момент
+        if self._m15_ranges is None:
+            self._m15_ranges = build_m15_accumulation_ranges(self.context_bars, self.atr_context, self.config)
+        return self._m15_ranges
+
+    def _find_m5_entry_poi(self, direction, bos_extreme, bos_index):
         """
-        Ищет POI для лонга на M5 после BOS вверх.
-        Приоритет инвертированному FVG, затем обычным FVG/OB.
-        Проверяет Premium/Discount.
+        Ищет POI для входа на M5 после BOS среди активных зон реестра POI.
+        Приоритет инвертированному FVG, затем обычным FVG/OB; при равном приоритете — самая свежая зона.
+        Для лонга зона должна быть в дискаунте (ниже уровня POI_DISCOUNT_THRESHOLD диапазона
+        от минимума манипуляции до максимума BOS), для шорта — в премиуме (выше уровня
+        POI_PREMIUM_THRESHOLD диапазона от максимума манипуляции до минимума BOS).
+
+        Args:
+            direction (int): DIRECTION_LONG или DIRECTION_SHORT.
+            bos_extreme (float): Максимум (лонг) / минимум (шорт) свечи BOS/CHoCH.
+            bos_index (int): Позиция свечи BOS/CHoCH на M5 (зоны, созданные позже, не рассматриваются).
+
+        Returns:
+            dict or None: Копия словаря зоны или None.
         """
-        # TODO: Реализовать логику
-        # 1. Попытаться найти FVG, который был частью движения *перед* BOS (если манипуляция была импульсной)
-        #    и который был пробит этим BOS (это будет инвертированный FVG).
-        #    Для этого нужно проанализировать свечи до BOS.
-        # 2. Если инвертированный FVG не найден, ищем "свежий" FVG или OB,
-        #    созданный самим BOS-импульсом.
-        # 3. Проверить, находится ли POI в зоне дискаунта (ниже 0.5 Фибо от манипуляционного Low до BOS High).
-        #    Используем POI_DISCOUNT_THRESHOLD.
-        # 4. Проверить минимальный размер FVG (FVG_MIN_SIZE_ATR_FACTOR).
-        return None
+        extremum = self.m15_manipulation_extremum
+        if extremum is None or (bos_extreme - extremum) * direction <= 0:
+            return None
+
+        if direction == DIRECTION_LONG:
+            threshold, priority = self.config.get('POI_DISCOUNT_THRESHOLD', 0.5), _LONG_POI_PRIORITY
+        else:
+            threshold, priority = self.config.get('POI_PREMIUM_THRESHOLD', 0.5), _SHORT_POI_PRIORITY
+        level = extremum + (bos_extreme - extremum) * threshold
+
+        # Минимальный размер FVG (FVG_MIN_SIZE_ATR_FACTOR) уже проверен при регистрации зоны в реестре
+        candidates = [zone for zone in self.m5_poi_registry.zones_overlapping(min(extremum, level), max(extremum, level),
+                                                                              direction=direction)
+                      if zone['created_index'] <= bos_index]
+        if not candidates:
+            return None
 
-    # Аналогичные методы для шорт-сценария:
-    # _find_m15_distribution_and_bsl
-    # _find_m5_entry_poi_short
-
-# TODO: Добавить в `src.core.indicators` функцию `atr`
-# Пример ATR (можно вынести в отдельный файл indicators.py):
-# def atr(high_series, low_series, close_series, period=14):
-#     if len(high_series) < period: return pd.Series(dtype=float) # Недостаточно данных
-#     tr1 = pd.DataFrame(high_series - low_series)
-#     tr2 = pd.DataFrame(abs(high_series - close_series.shift(1)))
-#     tr3 = pd.DataFrame(abs(low_series - close_series.shift(1)))
-#     tr = pd.concat([tr1, tr2, tr3], axis=1, join='inner').max(axis=1)
-#     atr_series = tr.ewm(alpha=1/period, adjust=False).mean()
-#     return atr_series
+        best = min(candidates, key=lambda zone: (priority.get(zone['type'], len(priority)), -zone['created_index']))
+        return dict(best)
@@ -0,0 +1,96 @@
+# src/utils/checkpoint.py
+# Бинарные checkpoint'ы состояния стратегии: словарь состояния -> pickle -> zlib,
+# с заголовком (магическая строка + версия формата). Позволяют перезапустить live-процесс
+# без повторного прогона истории и продолжить бэктест с сохраненной свечи.
+import os
+import pickle
+import re
+import struct
+import zlib
+
+CHECKPOINT_MAGIC = b'AMDCKPT'
+CHECKPOINT_FORMAT_VERSION = 3 # 2: целочисленные коды состояний стратегии, 3: индекс зон POIRegistry по классам высоты
+_HEADER = struct.Struct('<7sB') # магия + версия формата
+
+
+def dumps_checkpoint(state, compression_level=6):
+    """Состояние (словарь из get_state()) -> компактные байты."""
+    payload = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), compression_level)
+    return _HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_FORMAT_VERSION) + payload
+
+
+def loads_checkpoint(data):
+    """Байты checkpoint'а -> состояние. ValueError, если это не checkpoint или версия формата другая."""
+    if len(data) < _HEADER.size:
+        raise ValueError("Слишком короткие данные для checkpoint")
+    magic, version = _HEADER.unpack_from(data)
+    if magic != CHECKPOINT_MAGIC:
+        raise ValueError("Данные не являются checkpoint стратегии")
+    if version != CHECKPOINT_FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия формата checkpoint: {version}")
+    return pickle.loads(zlib.decompress(data[_HEADER.size:]))
+
+
+def save_checkpoint(path, state):
+    """Атомарная запись checkpoint'а: во временный файл, затем os.replace. Возвращает размер в байтах."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = dumps_checkpoint(state)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load_checkpoint(path):
+    with open(path, 'rb') as f:
+        return loads_checkpoint(f.read())
+
+
+class CheckpointStore:
+    """
+    Приемник checkpoint'ов движка (BacktestEngine.run(checkpoint_sink=...)).
+
+    Checkpoint — словарь с ключом 'position' (последняя обработанная свеча исполнения).
+    С directory каждый checkpoint пишется в отдельный файл, без него — хранится
+    в памяти уже сжатым, поэтому последующие изменения состояния стратегии его не затрагивают.
+    """
+
+    def __init__(self, directory=None, prefix='checkpoint'):
+        self.directory = directory
+        self.prefix = prefix
+        self._blobs = {} # position -> bytes (режим без directory)
+        self._positions = []
+        if directory is not None and os.path.isdir(directory):
+            pattern = re.compile(rf'^{re.escape(prefix)}_(\d+)\.ckpt$')
+            found = (pattern.match(name) for name in os.listdir(directory))
+            self._positions = sorted(int(match.group(1)) for match in found if match)
+
+    def path(self, position):
+        return os.path.join(self.directory, f"{self.prefix}_{position:010d}.ckpt")
+
+    def __call__(self, checkpoint):
+        position = checkpoint['position']
+        if self.directory is not None:
+            save_checkpoint(self.path(position), checkpoint)
+        else:
+            self._blobs[position] = dumps_checkpoint(checkpoint)
+        if position not in self._positions:
+            self._positions.append(position)
+            self._positions.sort()
+
+    @property
+    def positions(self):
+        return list(self._positions)
+
+    def load(self, position):
+        if self.directory is not None:
+            return load_checkpoint(self.path(position))
+        return loads_checkpoint(self._blobs[position])
+
+    def latest(self, at_or_before=None):
+        """Последний checkpoint (не позже свечи at_or_before) или None."""
+        positions = [p for p in self._positions if at_or_before is None or p <= at_or_before]
+        return self.load(positions[-1]) if positions else None
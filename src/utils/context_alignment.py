@@ -0,0 +1,75 @@
+# src/utils/context_alignment.py
+import numpy as np
+import pandas as pd
+
+
+def _index_to_utc_ns(index):
+    """
+    Переводит DatetimeIndex в массив int64 (наносекунды UTC).
+    Наивный индекс считается заданным в UTC (как в data_loader, timezone="Etc/UTC").
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.as_unit('ns').asi8
+
+
+class ContextCursor:
+    """
+    Выравнивание контекстного таймфрейма (M15) относительно таймфрейма исполнения (M5).
+
+    Один раз (через searchsorted по двум отсортированным индексам) вычисляет для каждой
+    свечи исполнения количество контекстных свечей, доступных на этот момент.
+    Дальше доступ к контексту на i-й свече M5 — это O(1) чтение позиции и срез
+    через iloc без построения булевой маски по всему M15.
+
+    По умолчанию доступными считаются контекстные свечи с временем <= времени свечи
+    исполнения (как в исходном цикле main.py). Если переданы длительности свечей,
+    сравниваются времена закрытия: контекстная свеча доступна, только если она
+    закрылась не позже закрытия текущей свечи исполнения.
+    """
+
+    def __init__(self, context_index, execution_index,
+                 context_bar_duration=None, execution_bar_duration=None):
+        """
+        Args:
+            context_index (pd.DatetimeIndex): Индекс контекстного таймфрейма (M15), отсортирован.
+            execution_index (pd.DatetimeIndex): Индекс таймфрейма исполнения (M5), отсортирован.
+            context_bar_duration (pd.Timedelta, optional): Длительность контекстной свечи.
+            execution_bar_duration (pd.Timedelta, optional): Длительность свечи исполнения.
+        """
+        context_ns = _index_to_utc_ns(context_index)
+        execution_ns = _index_to_utc_ns(execution_index)
+
+        shift_ns = 0
+        if context_bar_duration is not None and execution_bar_duration is not None:
+            shift_ns = pd.Timedelta(execution_bar_duration).value - pd.Timedelta(context_bar_duration).value
+
+        # positions[i] = число контекстных свечей, доступных на i-й свече исполнения.
+        # Последняя доступная контекстная свеча имеет позицию positions[i] - 1.
+        self.positions = np.searchsorted(context_ns, execution_ns + shift_ns, side='right').astype(np.int64)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def count_at(self, execution_position):
+        """Количество доступных контекстных свечей на свече исполнения с данной позицией."""
+        return int(self.positions[execution_position])
+
+    def last_closed_position(self, execution_position):
+        """Позиция последней доступной контекстной свечи или -1, если таких еще нет."""
+        return int(self.positions[execution_position]) - 1
+
+    def slice_at(self, df_context, execution_position):
+        """
+        Срез контекста до текущего момента. iloc по диапазону строк не строит маску
+        и для однотипных колонок возвращает view без копирования данных.
+        """
+        return df_context.iloc[:self.positions[execution_position]]
+
+    def first_position_with_history(self, min_context_bars):
+        """
+        Первая позиция свечи исполнения, на которой доступно не менее min_context_bars
+        контекстных свечей (positions неубывающий, поэтому хватает одного searchsorted).
+        """
+        return int(np.searchsorted(self.positions, min_context_bars, side='left'))
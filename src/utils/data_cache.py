@@ -0,0 +1,256 @@
+# src/utils/data_cache.py
+# Локальный кэш OHLCV на диске: один memory-mapped .npy файл (структурированный массив)
+# на пару символ/интервал. Запрошенный диапазон отдается с диска, из сети догружается
+# только недостающая часть (через подключаемый fetcher). Рядом с .npy лежит .meta.json:
+# какие участки уже запрашивались и оказались пустыми, чтобы не запрашивать их на каждом запуске.
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from src.utils.history_downloader import find_gaps
+from src.utils.time_utils import interval_to_timedelta
+
+OHLCV_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+# Время хранится как int64 (наносекунды UTC), цены — float64
+CACHE_DTYPE = np.dtype([('timestamp', '<i8')] + [(col, '<f8') for col in OHLCV_COLUMNS])
+
+
+def _to_utc_naive(value):
+    """Timestamp/DatetimeIndex в наивное UTC-время (наивные значения считаются UTC)."""
+    if value is None:
+        return None
+    if isinstance(value, pd.DatetimeIndex):
+        return value.tz_convert('UTC').tz_localize(None) if value.tz is not None else value
+    value = pd.Timestamp(value)
+    return value.tz_convert('UTC').tz_localize(None) if value.tzinfo is not None else value
+
+
+def frame_to_records(df):
+    """DataFrame OHLCV -> структурированный массив CACHE_DTYPE (отсутствующие колонки — NaN)."""
+    records = np.empty(len(df), dtype=CACHE_DTYPE)
+    records['timestamp'] = _to_utc_naive(pd.DatetimeIndex(df.index)).as_unit('ns').asi8
+    for col in OHLCV_COLUMNS:
+        records[col] = df[col].to_numpy(dtype=np.float64) if col in df.columns else np.nan
+    return records
+
+
+def records_to_frame(records):
+    """Структурированный массив CACHE_DTYPE -> DataFrame в формате data_loader (индекс 'Timestamp')."""
+    index = pd.DatetimeIndex(records['timestamp'].astype('datetime64[ns]'), name='Timestamp')
+    return pd.DataFrame({col: np.asarray(records[col]) for col in OHLCV_COLUMNS}, index=index)
+
+
+def merge_records(existing, fetched):
+    """
+    Объединяет два набора свечей: сортировка по времени, дубликаты по времени удаляются,
+    при пересечении побеждают свежезагруженные данные (последняя свеча могла быть незакрытой).
+    """
+    if existing is None or len(existing) == 0:
+        combined = fetched
+    elif fetched is None or len(fetched) == 0:
+        return existing
+    else:
+        combined = np.concatenate([np.asarray(existing), fetched])
+    # Стабильная сортировка сохраняет порядок дубликатов (fetched идет позже), оставляем последнее вхождение
+    order = np.argsort(combined['timestamp'], kind='stable')
+    combined = combined[order]
+    keep = np.ones(len(combined), dtype=bool)
+    keep[:-1] = combined['timestamp'][1:] != combined['timestamp'][:-1]
+    return combined[keep]
+
+
+def _add_interval(intervals, lo, hi):
+    """Добавляет [lo, hi] в отсортированный список непересекающихся интервалов (с объединением)."""
+    merged = []
+    for a, b in sorted(list(intervals) + [[lo, hi]]):
+        if merged and a <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+    return merged
+
+
+def _covered(intervals, lo, hi):
+    return any(a <= lo and hi <= b for a, b in intervals)
+
+
+class OHLCVCache:
+    """
+    Персистентный кэш свечей.
+
+    fetcher — любой callable fetcher(symbol, interval, start_date, end_date) -> DataFrame или None
+    (например, data_loader.TwelveDataFetcher или фейковый загрузчик в тестах без сети).
+    Без fetcher кэш работает только на чтение.
+
+    Args:
+        gap_tolerance (pd.Timedelta, optional): Допуск find_gaps для поиска дыр внутри кэша.
+        max_gap_request_bars (int): Соседние дыры объединяются в один запрос, пока он
+            не длиннее стольких свечей.
+    """
+
+    def __init__(self, cache_dir, fetcher=None, gap_tolerance=None, max_gap_request_bars=5000):
+        self.cache_dir = cache_dir
+        self.fetcher = fetcher
+        self.gap_tolerance = gap_tolerance
+        self.max_gap_request_bars = max_gap_request_bars
+
+    def path(self, symbol, interval):
+        safe_symbol = re.sub(r'[^A-Za-z0-9]+', '_', symbol)
+        return os.path.join(self.cache_dir, f"{safe_symbol}_{interval}.npy")
+
+    def meta_path(self, symbol, interval):
+        return self.path(symbol, interval)[:-len('.npy')] + '.meta.json'
+
+    def load_meta(self, symbol, interval):
+        """
+        Что уже запрашивалось у источника (время — int64 наносекунд UTC):
+        'checked_from' — начало самого раннего запроса головы (раньше первой свечи кэша
+        данных нет вплоть до этого момента), 'checked_gaps' — интервалы [lo, hi] дыр внутри
+        кэша, которые уже запрашивались (источник их не заполнил: праздники, пропуски котировок).
+        """
+        path = self.meta_path(symbol, interval)
+        if not os.path.exists(path):
+            return {'checked_from': None, 'checked_gaps': []}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_meta(self, symbol, interval, meta):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.meta_path(symbol, interval)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def load_records(self, symbol, interval):
+        """Структурированный массив из кэша (memory-mapped, без чтения в память) или None."""
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode='r')
+
+    def save_records(self, symbol, interval, records):
+        """Атомарная запись: во временный файл, затем os.replace."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(symbol, interval)
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, np.ascontiguousarray(records))
+        os.replace(tmp_path, path)
+
+    def store(self, symbol, interval, df):
+        """Добавляет свечи в кэш (с объединением и удалением дубликатов). Возвращает итоговый массив."""
+        existing = self.load_records(symbol, interval)
+        merged = merge_records(None if existing is None else np.array(existing), frame_to_records(df))
+        self.save_records(symbol, interval, merged)
+        return merged
+
+    def _fetch(self, symbol, interval, start, end):
+        df = self.fetcher(symbol, interval, start, end)
+        if df is None or df.empty:
+            return None
+        return frame_to_records(df)
+
+    def _gap_requests(self, records, interval, start, end, checked_gaps):
+        """
+        Дыры внутри кэша в пределах [start, end] (find_gaps, без выходных), еще не запрошенные,
+        сгруппированные в запросы: список (request_start, request_end, [(lo, hi) дыр]).
+        """
+        timestamps = records['timestamp']
+        lo = 0 if start is None else max(0, int(np.searchsorted(timestamps, start.value, side='left')) - 1)
+        hi = len(records) if end is None else int(np.searchsorted(timestamps, end.value, side='right')) + 1
+        index = pd.DatetimeIndex(np.asarray(timestamps[lo:hi]).astype('datetime64[ns]'))
+        gaps = find_gaps(index, interval, self.gap_tolerance)
+
+        step = interval_to_timedelta(interval)
+        max_span = step * self.max_gap_request_bars
+        requests = []
+        for gap_start, gap_end in zip(gaps['gap_start'], gaps['gap_end']):
+            bounds = (gap_start.value, gap_end.value)
+            if _covered(checked_gaps, *bounds):
+                continue
+            if requests and gap_end - step - requests[-1][0] <= max_span:
+                requests[-1][1] = gap_end - step
+                requests[-1][2].append(bounds)
+            else:
+                requests.append([gap_start + step, gap_end - step, [bounds]])
+        return requests
+
+    def _refresh(self, symbol, interval, records, start, end):
+        """Догружает недостающие участки [start, end] и возвращает обновленный массив кэша."""
+        step = interval_to_timedelta(interval)
+        meta = self.load_meta(symbol, interval)
+        meta_before = json.dumps(meta)
+        fetched_parts = []
+
+        def fetch(part_start, part_end):
+            part = self._fetch(symbol, interval, part_start, part_end)
+            if part is not None:
+                fetched_parts.append(part)
+
+        if records is None or len(records) == 0:
+            fetch(start, end)
+            if start is not None:
+                meta['checked_from'] = start.value
+        else:
+            first = pd.Timestamp(int(records['timestamp'][0]))
+            last = pd.Timestamp(int(records['timestamp'][-1]))
+            # Голова: только то, что раньше уже проверенного начала истории
+            head_end = first if meta['checked_from'] is None else min(first, pd.Timestamp(meta['checked_from']))
+            if start is not None and start < head_end:
+                fetch(start, head_end - step)
+                meta['checked_from'] = start.value
+
+            # Дыры внутри кэша: каждая запрашивается один раз, незаполненные запоминаются
+            for request_start, request_end, bounds in self._gap_requests(records, interval, start, end,
+                                                                         meta['checked_gaps']):
+                fetch(request_start, request_end)
+                for lo, hi in bounds:
+                    meta['checked_gaps'] = _add_interval(meta['checked_gaps'], lo, hi)
+
+            # Хвост: последняя свеча кэша перезапрашивается, так как могла быть еще не закрыта
+            now = _to_utc_naive(pd.Timestamp.now(tz='UTC'))
+            tail_end = end if end is not None else now
+            if tail_end > last and now >= last + step:
+                fetch(last, end)
+
+        if fetched_parts:
+            merged = None if records is None else np.array(records)
+            for part in fetched_parts:
+                merged = merge_records(merged, part)
+            self.save_records(symbol, interval, merged)
+            records = self.load_records(symbol, interval)
+        if json.dumps(meta) != meta_before:
+            self.save_meta(symbol, interval, meta)
+        return records
+
+    def get(self, symbol, interval, start=None, end=None, refresh=True):
+        """
+        Свечи за [start, end] (границы включительно, None — без ограничения).
+
+        Если задан fetcher и refresh=True, догружаются только недостающие участки:
+        голова (start раньше первой свечи кэша и раньше уже проверенного начала истории),
+        дыры внутри кэша (find_gaps; каждая запрашивается один раз) и хвост (от последней
+        свечи кэша до end или до текущего момента). Последняя свеча кэша перезапрашивается,
+        так как на момент сохранения она могла быть еще не закрыта.
+
+        Returns:
+            pd.DataFrame: Свечи OHLCV (может быть пустым).
+        """
+        start = _to_utc_naive(start)
+        end = _to_utc_naive(end)
+        records = self.load_records(symbol, interval)
+
+        if self.fetcher is not None and refresh:
+            records = self._refresh(symbol, interval, records, start, end)
+
+        if records is None or len(records) == 0:
+            return records_to_frame(np.empty(0, dtype=CACHE_DTYPE))
+
+        timestamps = records['timestamp']
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start.value, side='left'))
+        hi = len(records) if end is None else int(np.searchsorted(timestamps, end.value, side='right'))
+        return records_to_frame(records[lo:hi])
@@ -4,6 +4,67 @@ from twelvedata import TDClient
 # Импортируем ключ напрямую из config, так как config.py должен быть доступен через src.config
 # from src.config import TWELVE_DATA_API_KEY # Ключ будет передан как аргумент функции
 
+def normalize_twelvedata_frame(df):
+    """
+    Приводит ответ Twelve Data (as_pandas) к формату проекта:
+    хронологический порядок, колонки Open/High/Low/Close/Volume (float), индекс 'Timestamp'.
+    """
+    # Twelve Data возвращает данные в обратном хронологическом порядке (новые вверху)
+    # Пересортируем, чтобы старые были вверху (индекс от меньшего к большему)
+    df = df.iloc[::-1]
+
+    # Приведем названия колонок к нашему стандарту (Open, High, Low, Close, Volume)
+    # Twelve Data обычно использует 'open', 'high', 'low', 'close', 'volume'
+    df = df.rename(columns={
+        'open': 'Open',
+        'high': 'High',
+        'low': 'Low',
+        'close': 'Close',
+        'volume': 'Volume'
+    })
+    
+    # Убедимся, что индекс это DateTimeIndex (as_pandas обычно это делает)
+    df.index.name = 'Timestamp'
+    # Конвертируем числовые колонки в float, если они еще не такие
+    cols_to_numeric = ['Open', 'High', 'Low', 'Close', 'Volume']
+    for col in cols_to_numeric:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+class TwelveDataFetcher:
+    """
+    Загрузчик диапазона свечей из Twelve Data в формате, который ожидают OHLCVCache
+    и пакетный загрузчик: fetcher(symbol, interval, start_date, end_date) -> DataFrame или None.
+    Без start_date возвращаются последние outputsize свечей.
+    """
+
+    def __init__(self, api_key, outputsize=5000, timezone="Etc/UTC"):
+        self.api_key = api_key
+        self.outputsize = outputsize
+        self.timezone = timezone
+        self._client = None
+
+    def __call__(self, symbol, interval, start_date=None, end_date=None):
+        if self._client is None:
+            self._client = TDClient(apikey=self.api_key)
+
+        params = {'symbol': symbol, 'interval': interval, 'outputsize': self.outputsize, 'timezone': self.timezone}
+        if start_date is not None:
+            params['start_date'] = pd.Timestamp(start_date).strftime('%Y-%m-%d %H:%M:%S')
+        if end_date is not None:
+            params['end_date'] = pd.Timestamp(end_date).strftime('%Y-%m-%d %H:%M:%S')
+
+        ts = self._client.time_series(**params)
+        if ts is None:
+            return None
+        df = ts.as_pandas()
+        if df is None or df.empty:
+            return None
+        return normalize_twelvedata_frame(df)
+
+
 def load_historical_data_twelvedata(api_key, symbol, interval, outputsize=500, timezone="Etc/UTC"):
     """
     Загружает исторические данные с помощью Twelve Data API.
@@ -42,28 +103,7 @@ def load_historical_data_twelvedata(api_key, symbol, interval, outputsize=500, t
             print(f"Данные для {symbol} {interval} от Twelve Data пусты.")
             return None
 
-        # Twelve Data возвращает данные в обратном хронологическом порядке (новые вверху)
-        # Пересортируем, чтобы старые были вверху (индекс от меньшего к большему)
-        df = df.iloc[::-1]
-
-        # Приведем названия колонок к нашему стандарту (Open, High, Low, Close, Volume)
-        # Twelve Data обычно использует 'open', 'high', 'low', 'close', 'volume'
-        df.rename(columns={
-            'open': 'Open',
-            'high': 'High',
-            'low': 'Low',
-            'close': 'Close',
-            'volume': 'Volume'
-        }, inplace=True)
-        
-        # Убедимся, что индекс это DateTimeIndex (as_pandas обычно это делает)
-        df.index.name = 'Timestamp'
-        # Конвертируем числовые колонки в float, если они еще не такие
-        cols_to_numeric = ['Open', 'High', 'Low', 'Close', 'Volume']
-        for col in cols_to_numeric:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
+        df = normalize_twelvedata_frame(df)
 
         print(f"Данные для {symbol} {interval} успешно загружены из Twelve Data. Всего записей: {len(df)}")
         return df
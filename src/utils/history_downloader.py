@@ -0,0 +1,187 @@
+# src/utils/history_downloader.py
+# Постраничная загрузка длинной истории: один запрос Twelve Data ограничен outputsize
+# (около 5000 свечей), поэтому диапазон режется на окна по датам, окна качаются
+# параллельно в пределах лимита запросов, а результат склеивается в один отсортированный DataFrame.
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.utils.time_utils import interval_to_timedelta
+
+
+def plan_date_windows(start, end, interval, bars_per_request):
+    """
+    Делит [start, end] на окна не длиннее bars_per_request свечей, идя назад от end
+    (сначала самые свежие данные). Границы окон включительны и не пересекаются.
+
+    Returns:
+        list: Список (window_start, window_end) в порядке от новых к старым.
+    """
+    step = interval_to_timedelta(interval)
+    span = step * (bars_per_request - 1)
+    start = pd.Timestamp(start)
+    window_end = pd.Timestamp(end)
+    windows = []
+    while window_end >= start:
+        window_start = max(start, window_end - span)
+        windows.append((window_start, window_end))
+        window_end = window_start - step
+    return windows
+
+
+# Самое длинное закрытие рынка на выходных (с праздником в пятницу или понедельник)
+MAX_WEEKEND_CLOSURE = pd.Timedelta(days=4)
+
+
+def find_gaps(index, interval, tolerance=None, skip_weekends=True, max_weekend=MAX_WEEKEND_CLOSURE):
+    """
+    Ищет разрывы в ряду свечей длиннее шага интервала плюс tolerance.
+
+    Args:
+        index (pd.DatetimeIndex): Отсортированный индекс свечей.
+        interval (str): Интервал Twelve Data ("5min", "1h", ...).
+        tolerance (pd.Timedelta, optional): Допустимая добавка к шагу (по умолчанию 0).
+        skip_weekends (bool): Не считать разрывом закрытие рынка на выходных
+            (разрыв, внутри которого есть суббота, не длиннее max_weekend).
+        max_weekend (pd.Timedelta): Более длинный разрыв через выходные — это пропуск данных.
+
+    Returns:
+        pd.DataFrame: Колонки gap_start (последняя свеча перед разрывом), gap_end
+                      (первая свеча после) и missing_bars.
+    """
+    step = interval_to_timedelta(interval)
+    limit = step + (pd.Timedelta(tolerance) if tolerance is not None else pd.Timedelta(0))
+    index = pd.DatetimeIndex(index)
+    if len(index) < 2:
+        return pd.DataFrame(columns=['gap_start', 'gap_end', 'missing_bars'])
+
+    deltas = index[1:] - index[:-1]
+    is_gap = np.asarray(deltas > limit)
+    if skip_weekends:
+        # Ближайшая суббота 00:00 начиная с дня начала разрыва (пн=0, сб=5)
+        starts = index[:-1]
+        days_to_saturday = (5 - starts.dayofweek.to_numpy()) % 7
+        next_saturday = starts.normalize() + pd.to_timedelta(days_to_saturday, unit='D')
+        spans_saturday = np.asarray(next_saturday < index[1:])
+        is_gap &= ~(spans_saturday & np.asarray(deltas <= pd.Timedelta(max_weekend)))
+
+    positions = np.flatnonzero(is_gap)
+    return pd.DataFrame({
+        'gap_start': index[positions],
+        'gap_end': index[positions + 1],
+        'missing_bars': np.asarray(deltas[positions] // step) - 1,
+    })
+
+
+def stitch_frames(frames):
+    """Склеивает окна в один DataFrame: сортировка по времени, дубликаты на стыках удаляются."""
+    df = pd.concat(frames)
+    df = df[~df.index.duplicated(keep='last')]
+    return df.sort_index(kind='stable')
+
+
+class RateLimiter:
+    """Скользящее окно: не более max_calls вызовов acquire() за period секунд (потокобезопасно)."""
+
+    def __init__(self, max_calls, period=60.0):
+        self.max_calls = max_calls
+        self.period = period
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                wait = self.period - (now - self._calls[0])
+            time.sleep(wait)
+
+
+class ChunkedFetcher:
+    """
+    Обертка над fetcher(symbol, interval, start_date, end_date) -> DataFrame или None
+    (например, data_loader.TwelveDataFetcher или фейковый клиент), которая загружает
+    диапазон любой длины окнами по bars_per_request свечей.
+
+    Окна качаются в пуле потоков (max_workers), каждый запрос проходит через RateLimiter,
+    ошибки повторяются до max_retries раз с экспоненциальной задержкой. Если окно так и не
+    загрузилось, бросается RuntimeError: частичная история не должна попасть в кэш молча.
+    Имеет ту же сигнатуру, что и fetcher, поэтому подставляется в OHLCVCache.
+    """
+
+    def __init__(self, fetcher, bars_per_request=5000, max_workers=4, max_calls_per_minute=8,
+                 max_retries=3, retry_delay=2.0, gap_tolerance=None, verbose=True):
+        self.fetcher = fetcher
+        self.bars_per_request = bars_per_request
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(max_calls_per_minute, 60.0) if max_calls_per_minute else None
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.gap_tolerance = gap_tolerance
+        self.verbose = verbose
+
+    def _fetch_window(self, symbol, interval, window_start, window_end):
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                return self.fetcher(symbol, interval, window_start, window_end)
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise RuntimeError(
+                        f"Не удалось загрузить {symbol} {interval} за {window_start} - {window_end} "
+                        f"после {self.max_retries} повторов: {e}") from e
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                if self.verbose:
+                    print(f"Ошибка загрузки {symbol} {interval} ({window_start} - {window_end}): {e}. "
+                          f"Повтор {attempt}/{self.max_retries} через {delay:.1f} с")
+                time.sleep(delay)
+
+    def __call__(self, symbol, interval, start_date=None, end_date=None):
+        # Без начальной даты диапазон не определен — это обычный запрос последних свечей
+        if start_date is None:
+            return self._fetch_window(symbol, interval, None, end_date)
+
+        if end_date is None:
+            end_date = pd.Timestamp.now(tz='UTC')
+        start_date = pd.Timestamp(start_date)
+        end_date = pd.Timestamp(end_date)
+        # Окна считаются в наивном UTC, как хранится индекс свечей
+        if start_date.tzinfo is not None:
+            start_date = start_date.tz_convert('UTC').tz_localize(None)
+        if end_date.tzinfo is not None:
+            end_date = end_date.tz_convert('UTC').tz_localize(None)
+
+        windows = plan_date_windows(start_date, end_date, interval, self.bars_per_request)
+        if not windows:
+            return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(windows)))) as pool:
+            futures = [pool.submit(self._fetch_window, symbol, interval, ws, we) for ws, we in windows]
+            frames = [future.result() for future in futures]
+
+        frames = [df for df in frames if df is not None and not df.empty]
+        if not frames:
+            return None
+        df = stitch_frames(frames)
+
+        if self.verbose:
+            gaps = find_gaps(df.index, interval, self.gap_tolerance)
+            print(f"Загружено {len(df)} свечей {symbol} {interval} ({len(windows)} окон), "
+                  f"разрывов вне выходных: {len(gaps)}")
+            if len(gaps):
+                largest = gaps.sort_values('missing_bars', ascending=False).iloc[0]
+                print(f"Крупнейший разрыв: {largest['gap_start']} - {largest['gap_end']} "
+                      f"({largest['missing_bars']} свечей)")
+        return df
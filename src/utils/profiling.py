@@ -0,0 +1,211 @@
+# src/utils/profiling.py
+# Инструментирование горячего пути бэктеста: счетчики вызовов и суммарное время (нс)
+# по функциям и состояниям автомата стратегии, скорость в свечах/с и аллокации памяти
+# на выборочном окне свечей. Профилировщик подменяет методы конкретного объекта
+# обертками с замером времени, поэтому без него (PROFILING_ENABLED = False)
+# код стратегии выполняется без каких-либо проверок и накладных расходов.
+# Пока идет выборка аллокаций (tracemalloc замедляет каждую аллокацию в разы),
+# счетчики времени стоят на паузе: в таблицу попадают только свечи вне окна.
+import functools
+import json
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+class Profiler:
+    """
+    Сборщик замеров: имя -> [вызовов, суммарное время нс]. Вызовы внутри окна выборки
+    аллокаций не учитываются ни в счетчиках, ни в знаменателе доли времени (share).
+
+    Args:
+        alloc_sample_start (int): С какого вызова функции-«такта» (обычно process_new_candle)
+            начинать выборку аллокаций.
+        alloc_sample_calls (int): Длина окна выборки в тактах (0 — аллокации не считаются).
+        alloc_top (int): Сколько мест в коде с наибольшим объемом аллокаций сохранять.
+    """
+
+    def __init__(self, alloc_sample_start=1000, alloc_sample_calls=0, alloc_top=10):
+        self.timings = {}
+        self.alloc_sample_start = alloc_sample_start
+        self.alloc_sample_calls = alloc_sample_calls
+        self.alloc_top = alloc_top
+        self.allocations = None # Итог выборки аллокаций (см. _stop_allocation_sample)
+        self.throughput = None # Сводка движка: свечи, время, свечей/с
+        self._ticks = 0
+        self._tracing = False
+        self._started_tracemalloc = False
+        self._window_started = None
+
+    def _counter(self, name):
+        counter = self.timings.get(name)
+        if counter is None:
+            counter = self.timings[name] = [0, 0]
+        return counter
+
+    def record(self, name, elapsed_ns, calls=1):
+        """Добавляет замер, сделанный вне обертки (например, внешний цикл)."""
+        counter = self._counter(name)
+        counter[0] += calls
+        counter[1] += elapsed_ns
+
+    def wrap(self, name, func, tick=False):
+        """
+        Обертка func с подсчетом вызовов и времени под именем name.
+        tick=True — вызовы функции считаются тактами окна выборки аллокаций.
+        """
+        counter = self._counter(name)
+        perf_counter_ns = time.perf_counter_ns
+
+        if tick and self.alloc_sample_calls > 0:
+            @functools.wraps(func)
+            def timed(*args, **kwargs):
+                self._tick()
+                if self._tracing:
+                    return func(*args, **kwargs)
+                started = perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    counter[0] += 1
+                    counter[1] += perf_counter_ns() - started
+            return timed
+
+        if self.alloc_sample_calls > 0:
+            # Окно выборки аллокаций открывается и закрывается между тактами, поэтому
+            # достаточно проверить флаг до вызова
+            @functools.wraps(func)
+            def timed(*args, **kwargs):
+                if self._tracing:
+                    return func(*args, **kwargs)
+                started = perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    counter[0] += 1
+                    counter[1] += perf_counter_ns() - started
+            return timed
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                counter[0] += 1
+                counter[1] += perf_counter_ns() - started
+        return timed
+
+    def instrument(self, obj, attribute, name=None, tick=False):
+        """Подменяет метод obj.attribute (на уровне экземпляра) оберткой с замером."""
+        setattr(obj, attribute, self.wrap(name or attribute, getattr(obj, attribute), tick=tick))
+
+    def _tick(self):
+        self._ticks += 1
+        if self._ticks == self.alloc_sample_start:
+            self._start_allocation_sample()
+        elif self._tracing and self._ticks == self.alloc_sample_start + self.alloc_sample_calls:
+            self._stop_allocation_sample()
+
+    def _start_allocation_sample(self):
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.take_snapshot()
+        self._tracing = True
+        self._window_started = time.perf_counter()
+
+    def _stop_allocation_sample(self):
+        window_sec = time.perf_counter() - self._window_started
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        self._tracing = False
+        # Разница снимков: блоки, выделенные в окне и еще живые (кэши, рост буферов, утечки)
+        diff = [stat for stat in snapshot.compare_to(self._baseline, 'lineno') if stat.count_diff > 0]
+        diff.sort(key=lambda stat: stat.size_diff, reverse=True)
+        self._baseline = None
+        self.allocations = {
+            'window_start': self.alloc_sample_start,
+            'window_calls': self.alloc_sample_calls,
+            'window_sec': window_sec, # Время окна (со снимками tracemalloc), в счетчики не входит
+            'blocks_retained': sum(stat.count_diff for stat in diff),
+            'bytes_retained': sum(max(0, stat.size_diff) for stat in diff),
+            'peak_bytes': peak,
+            'top': [{'where': str(stat.traceback[0]), 'blocks': stat.count_diff, 'bytes': stat.size_diff}
+                    for stat in diff[:self.alloc_top]],
+        }
+
+    def finish(self, run_summary=None):
+        """
+        Завершает сбор: закрывает незавершенное окно аллокаций и запоминает сводку движка
+        (BacktestEngine.run) для расчета доли времени и скорости. Сводка движка включает
+        окно аллокаций, поэтому время вне окна сохраняется отдельно ('timed_sec').
+        """
+        if self._tracing:
+            self.alloc_sample_calls = self._ticks - self.alloc_sample_start + 1
+            self._stop_allocation_sample()
+        if run_summary is not None:
+            self.throughput = {key: run_summary[key] for key in
+                               ('bars_processed', 'bars_called', 'elapsed_sec', 'bars_per_sec') if key in run_summary}
+            if 'elapsed_sec' in self.throughput:
+                window_sec = self.allocations['window_sec'] if self.allocations else 0.0
+                self.throughput['timed_sec'] = max(0.0, self.throughput['elapsed_sec'] - window_sec)
+
+    def summary(self):
+        """
+        Таблица замеров, по убыванию суммарного времени.
+
+        Returns:
+            pd.DataFrame: 'name', 'calls', 'total_ms', 'mean_us', 'share' (доля от времени прогона
+                          без окна аллокаций, если известна сводка движка).
+        """
+        throughput = self.throughput or {}
+        total_sec = throughput.get('timed_sec', throughput.get('elapsed_sec'))
+        rows = []
+        for name, (calls, total_ns) in self.timings.items():
+            if not calls:
+                continue
+            rows.append({
+                'name': name,
+                'calls': calls,
+                'total_ms': total_ns / 1e6,
+                'mean_us': total_ns / calls / 1e3,
+                'share': total_ns / 1e9 / total_sec if total_sec else float('nan'),
+            })
+        columns = ['name', 'calls', 'total_ms', 'mean_us', 'share']
+        return pd.DataFrame(rows, columns=columns).sort_values('total_ms', ascending=False, ignore_index=True)
+
+    def to_dict(self):
+        return {
+            'throughput': self.throughput,
+            'timings': self.summary().to_dict(orient='records'),
+            'allocations': self.allocations,
+        }
+
+    def save_json(self, path, **metadata):
+        """Пишет to_dict() (и доп. поля metadata) в JSON-файл."""
+        data = dict(metadata, **self.to_dict())
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+
+    def print_summary(self):
+        """Печатает таблицу замеров, скорость и итог выборки аллокаций."""
+        print("\nПрофилирование:")
+        if self.throughput:
+            print(f"Свечей: {self.throughput.get('bars_processed')} за {self.throughput.get('elapsed_sec', 0):.2f} с "
+                  f"({self.throughput.get('bars_per_sec', float('nan')):.0f} свечей/с)")
+        table = self.summary()
+        if not table.empty:
+            print(table.to_string(index=False, formatters={
+                'total_ms': '{:.1f}'.format, 'mean_us': '{:.2f}'.format, 'share': '{:.1%}'.format}))
+        if self.allocations:
+            a = self.allocations
+            print(f"Аллокации за {a['window_calls']} свечей (с #{a['window_start']}): "
+                  f"удержано {a['blocks_retained']} блоков / {a['bytes_retained'] / 1024:.1f} КБ, "
+                  f"пик {a['peak_bytes'] / 1024:.1f} КБ; окно {a['window_sec']:.2f} с не входит в замеры времени")
+            for site in a['top'][:5]:
+                print(f"  {site['where']}: {site['blocks']} блоков, {site['bytes'] / 1024:.1f} КБ")
@@ -0,0 +1,166 @@
+# src/utils/resampling.py
+# Построение старших таймфреймов (M15, H1, H4, D1) из базового ряда (M1/M5):
+# свертка OHLCV по корзинам времени через ufunc.reduceat без groupby/resample,
+# и потоковый агрегатор для дозаписи новых базовых свечей.
+import numpy as np
+import pandas as pd
+
+from src.core.state import Checkpointable
+from src.utils.context_alignment import _index_to_utc_ns
+from src.utils.time_utils import interval_to_timedelta
+
+OHLCV_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+# Начало отсчета корзин относительно 1970-01-01 (четверг): недели Twelve Data начинаются с понедельника
+_BUCKET_ORIGINS = {
+    '1week': pd.Timedelta(days=4).value,
+}
+
+
+def bucket_ids(timestamps_ns, interval):
+    """Номер корзины старшего таймфрейма для каждого времени (int64, наносекунды UTC)."""
+    period = interval_to_timedelta(interval).value
+    origin = _BUCKET_ORIGINS.get(interval, 0)
+    return (np.asarray(timestamps_ns, dtype=np.int64) - origin) // period
+
+
+def bucket_start_ns(bucket_id, interval):
+    """Время открытия корзины (наносекунды UTC) — метка свечи старшего таймфрейма."""
+    return bucket_id * interval_to_timedelta(interval).value + _BUCKET_ORIGINS.get(interval, 0)
+
+
+def resample_ohlcv(df, interval, base_interval, closed_only=True, complete_head=True):
+    """
+    Сворачивает базовые свечи в свечи таймфрейма interval.
+
+    Метка свечи — время открытия корзины (как у Twelve Data). Корзины без базовых свечей
+    (выходные, пропуски) не создаются.
+
+    Args:
+        df (pd.DataFrame): Базовые свечи OHLCV, индекс отсортирован.
+        interval (str): Целевой интервал ("15min", "1h", "4h", "1day", ...).
+        base_interval (str): Интервал базовых свечей ("1min", "5min", ...).
+        closed_only (bool): Отбросить последнюю корзину, если она еще не закрыта
+            (последняя базовая свеча закрывается раньше конца корзины).
+        complete_head (bool): Отбросить первую корзину, если ряд начинается с ее середины.
+
+    Returns:
+        pd.DataFrame: Свечи старшего таймфрейма с теми же колонками и индексом 'Timestamp'
+                      (tz как у исходного индекса).
+    """
+    columns = [col for col in OHLCV_COLUMNS if col in df.columns]
+    if df.empty:
+        return df.iloc[:0][columns]
+
+    timestamps = _index_to_utc_ns(df.index)
+    base_ns = interval_to_timedelta(base_interval).value
+    period = interval_to_timedelta(interval).value
+    buckets = bucket_ids(timestamps, interval)
+
+    # Начала корзин: первая базовая свеча и все места, где номер корзины меняется
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(buckets)) - 1
+    first = 0
+    last = len(starts)
+    if complete_head and timestamps[0] != bucket_start_ns(buckets[0], interval):
+        first = 1
+    if closed_only and timestamps[-1] + base_ns < bucket_start_ns(buckets[-1], interval) + period:
+        last -= 1
+
+    data = {}
+    for col in columns:
+        values = df[col].to_numpy(dtype=np.float64)
+        if col == 'Open':
+            reduced = values[starts]
+        elif col == 'High':
+            reduced = np.maximum.reduceat(values, starts)
+        elif col == 'Low':
+            reduced = np.minimum.reduceat(values, starts)
+        elif col == 'Close':
+            reduced = values[ends]
+        else:
+            reduced = np.add.reduceat(values, starts)
+        data[col] = reduced[first:last]
+
+    starts = starts[first:last]
+    index = pd.DatetimeIndex(bucket_start_ns(buckets[starts], interval).astype('datetime64[ns]'), name='Timestamp')
+    if df.index.tz is not None:
+        index = index.tz_localize('UTC').tz_convert(df.index.tz)
+    return pd.DataFrame(data, index=index)
+
+
+class BarAggregator(Checkpointable):
+    """
+    Потоковая свертка базовых свечей в свечи старшего таймфрейма.
+
+    update() принимает закрытую базовую свечу и возвращает список свечей старшего
+    таймфрейма, закрывшихся на ней (обычно пустой или из одного элемента). Свеча
+    закрывается, как только базовая свеча дотягивается до конца корзины, либо когда
+    приходит свеча из следующей корзины (пропуски в данных). Результат совпадает
+    с resample_ohlcv(..., closed_only=True, complete_head=False).
+    """
+
+    _STATE_FIELDS = ('tz', '_bucket', '_bar')
+
+    def __init__(self, interval, base_interval):
+        self.interval = interval
+        self.base_interval = base_interval
+        self.period = interval_to_timedelta(interval).value
+        self.base_ns = interval_to_timedelta(base_interval).value
+        self.tz = None
+        self._bucket = None # Номер текущей корзины
+        self._bar = None # [open, high, low, close, volume] текущей корзины
+
+    @property
+    def pending(self):
+        """Незакрытая свеча текущей корзины (timestamp, open, high, low, close, volume) или None."""
+        if self._bar is None:
+            return None
+        return (self._timestamp(self._bucket), *self._bar)
+
+    def _timestamp(self, bucket):
+        ts = pd.Timestamp(int(bucket_start_ns(bucket, self.interval)))
+        return ts.tz_localize('UTC').tz_convert(self.tz) if self.tz is not None else ts
+
+    def update(self, timestamp, open_, high, low, close, volume=float('nan')):
+        ts = pd.Timestamp(timestamp)
+        if ts.tzinfo is not None:
+            self.tz = ts.tzinfo
+            ts_ns = ts.tz_convert('UTC').tz_localize(None).value
+        else:
+            ts_ns = ts.value
+        bucket = int(bucket_ids(ts_ns, self.interval))
+
+        closed = []
+        if self._bar is not None and bucket != self._bucket:
+            closed.append(self.pending)
+            self._bar = None
+
+        if self._bar is None:
+            self._bucket = bucket
+            self._bar = [open_, high, low, close, volume]
+        else:
+            bar = self._bar
+            if high > bar[1]:
+                bar[1] = high
+            if low < bar[2]:
+                bar[2] = low
+            bar[3] = close
+            bar[4] = bar[4] + volume
+
+        if ts_ns + self.base_ns >= bucket_start_ns(bucket, self.interval) + self.period:
+            closed.append(self.pending)
+            self._bar = None
+        return closed
+
+    def update_many(self, df):
+        """Прогоняет DataFrame базовых свечей, возвращает DataFrame закрывшихся свечей."""
+        rows = []
+        volumes = df['Volume'].tolist() if 'Volume' in df.columns else [float('nan')] * len(df)
+        for ts, o, h, l, c, v in zip(df.index, df['Open'].tolist(), df['High'].tolist(),
+                                     df['Low'].tolist(), df['Close'].tolist(), volumes):
+            rows.extend(self.update(ts, o, h, l, c, v))
+        result = pd.DataFrame(rows, columns=('Timestamp',) + OHLCV_COLUMNS).set_index('Timestamp')
+        if 'Volume' not in df.columns:
+            result = result.drop(columns='Volume')
+        return result
@@ -1,7 +1,128 @@
 # src/utils/time_utils.py
 from datetime import datetime, time
+import numpy as np
+import pandas as pd
 import pytz # pip install pytz
 
+MINUTES_PER_DAY = 24 * 60
+_NS_PER_MINUTE = 60 * 10**9
+
+# Интервалы Twelve Data с фиксированной длительностью (1month не поддерживается — длина месяца переменная)
+_INTERVAL_DURATIONS = {
+    '1min': pd.Timedelta(minutes=1),
+    '5min': pd.Timedelta(minutes=5),
+    '15min': pd.Timedelta(minutes=15),
+    '30min': pd.Timedelta(minutes=30),
+    '45min': pd.Timedelta(minutes=45),
+    '1h': pd.Timedelta(hours=1),
+    '2h': pd.Timedelta(hours=2),
+    '4h': pd.Timedelta(hours=4),
+    '1day': pd.Timedelta(days=1),
+    '1week': pd.Timedelta(weeks=1),
+}
+
+
+def interval_to_timedelta(interval):
+    """Длительность свечи для интервала в формате Twelve Data ("5min", "1h", "1day", ...)."""
+    try:
+        return _INTERVAL_DURATIONS[interval]
+    except KeyError:
+        raise ValueError(f"Неподдерживаемый интервал: {interval}")
+
+
+class SessionCalendar:
+    """
+    Скомпилированный календарь торговых сессий.
+
+    TRADING_SESSIONS_UTC разбирается один раз в таблицы на 1440 минут суток
+    (id сессии или -1), с учетом сессий, пересекающих полночь. После этого проверка
+    одного момента времени — O(1) индексация, а для целого DatetimeIndex id сессий
+    считаются одной векторной операцией. Граница end включается с точностью до микросекунды,
+    как в is_within_trading_session: при end='16:00' время 16:00:00 — внутри сессии,
+    16:00:03 — уже вне. Поэтому таблиц две: minute_table для начала минуты (секунды и
+    микросекунды равны 0) и inner_minute_table для остальных моментов минуты (без минуты end).
+    Если сессии пересекаются, выигрывает первая по порядку в конфигурации.
+    """
+
+    def __init__(self, sessions_config):
+        self.session_names = [] # id сессии -> название
+        self.minute_table = np.full(MINUTES_PER_DAY, -1, dtype=np.int8)
+        self.inner_minute_table = np.full(MINUTES_PER_DAY, -1, dtype=np.int8)
+
+        minutes = np.arange(MINUTES_PER_DAY)
+        for session_name, times in sessions_config.items():
+            try:
+                start_time = datetime.strptime(times['start'], '%H:%M').time()
+                end_time = datetime.strptime(times['end'], '%H:%M').time()
+            except ValueError:
+                print(f"Ошибка: Неверный формат времени для сессии '{session_name}' в конфигурации.")
+                continue
+
+            start = start_time.hour * 60 + start_time.minute
+            end = end_time.hour * 60 + end_time.minute
+            if start <= end:
+                in_session = (minutes >= start) & (minutes <= end)
+                inner_in_session = (minutes >= start) & (minutes < end)
+            else:
+                # Сессия пересекает полночь (например, с 22:00 до 05:00)
+                in_session = (minutes >= start) | (minutes <= end)
+                inner_in_session = (minutes >= start) | (minutes < end)
+
+            session_id = len(self.session_names)
+            self.session_names.append(session_name)
+            self.minute_table[in_session & (self.minute_table < 0)] = session_id
+            self.inner_minute_table[inner_in_session & (self.inner_minute_table < 0)] = session_id
+
+    def lookup(self, current_dt_utc):
+        """
+        O(1) проверка одного момента времени (для live-режима и стратегии).
+
+        Returns:
+            bool: True, если время попадает в одну из сессий.
+            str: Название сессии или None.
+        """
+        if current_dt_utc.tzinfo is not None:
+            current_dt_utc = current_dt_utc.astimezone(pytz.utc)
+        table = self.inner_minute_table if current_dt_utc.second or current_dt_utc.microsecond else self.minute_table
+        session_id = table[current_dt_utc.hour * 60 + current_dt_utc.minute]
+        if session_id < 0:
+            return False, None
+        return True, self.session_names[session_id]
+
+    def session_ids(self, index):
+        """
+        Id сессии для каждого элемента DatetimeIndex (-1 — вне сессий), одной векторной операцией.
+        Наивный индекс считается заданным в UTC.
+        """
+        index = pd.DatetimeIndex(index)
+        if index.tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        ns = index.as_unit('ns').asi8
+        minute_of_day = (ns // _NS_PER_MINUTE) % MINUTES_PER_DAY
+        # Наносекунды отбрасываются, как в datetime (точность lookup — микросекунда)
+        at_minute_start = (ns % _NS_PER_MINUTE) // 1000 == 0
+        if at_minute_start.all():
+            return self.minute_table[minute_of_day] # Свечи: время всегда на начале минуты
+        return np.where(at_minute_start, self.minute_table[minute_of_day], self.inner_minute_table[minute_of_day])
+
+    def in_session_mask(self, index):
+        """Булева маска "внутри одной из сессий" для DatetimeIndex."""
+        return self.session_ids(index) >= 0
+
+
+_calendar_cache = {}
+
+
+def get_session_calendar(sessions_config):
+    """Календарь для конфигурации сессий; компилируется один раз на каждую конфигурацию."""
+    key = tuple((name, times.get('start'), times.get('end')) for name, times in sessions_config.items())
+    calendar = _calendar_cache.get(key)
+    if calendar is None:
+        calendar = SessionCalendar(sessions_config)
+        _calendar_cache[key] = calendar
+    return calendar
+
+
 def is_within_trading_session(current_dt_utc, sessions_config):
     """
     Проверяет, находится ли текущее время UTC в одной из заданных торговых сессий.
@@ -17,28 +138,9 @@ def is_within_trading_session(current_dt_utc, sessions_config):
     if not current_dt_utc.tzinfo:
         # print("Предупреждение: current_dt_utc не имеет информации о часовом поясе. Предполагается UTC.")
         current_dt_utc = pytz.utc.localize(current_dt_utc)
-    else:
-        current_dt_utc = current_dt_utc.astimezone(pytz.utc)
-
-    current_time_utc = current_dt_utc.time()
 
-    for session_name, times in sessions_config.items():
-        try:
-            start_time = datetime.strptime(times['start'], '%H:%M').time()
-            end_time = datetime.strptime(times['end'], '%H:%M').time()
-
-            if start_time <= end_time:
-                # Сессия не пересекает полночь
-                if start_time <= current_time_utc <= end_time:
-                    return True, session_name
-            else:
-                # Сессия пересекает полночь (например, с 22:00 до 05:00)
-                if current_time_utc >= start_time or current_time_utc <= end_time:
-                    return True, session_name
-        except ValueError:
-            print(f"Ошибка: Неверный формат времени для сессии '{session_name}' в конфигурации.")
-            continue
-    return False, None
+    # Время сессий разбирается один раз (SessionCalendar), а не на каждой свече
+    return get_session_calendar(sessions_config).lookup(current_dt_utc)
 
 if __name__ == '__main__':
     # Пример использования
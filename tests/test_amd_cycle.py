@@ -0,0 +1,46 @@
+# tests/test_amd_cycle.py
+import numpy as np
+import pytest
+
+from src.core.amd_cycle import find_accumulation_ranges
+from src.core.indicators import atr
+
+
+def _random_walk(n_bars, seed):
+    rng = np.random.default_rng(seed)
+    scale = np.repeat(rng.uniform(0.3, 1.5, n_bars // 50 + 1), 50)[:n_bars] # Чередование боковиков и трендов
+    close = 1.1 + np.cumsum(rng.normal(0.0, 2e-4, n_bars) * scale)
+    open_ = np.concatenate(([1.1], close[:-1]))
+    wick = np.abs(rng.normal(0.0, 1e-4, (2, n_bars)))
+    return np.maximum(open_, close) + wick[0], np.minimum(open_, close) - wick[1], close
+
+
+def _brute_force(high, low, close, atr_values, end, min_bars, max_bars, threshold, lookback, min_atr):
+    """Перебор всех длин: самая длинная узкая с трендом перед ней, иначе самая длинная узкая."""
+    def trend(length):
+        start = end - length + 1
+        if start - lookback < 0:
+            return 0
+        move = (close[start - 1] - close[start - lookback]) / atr_values[end]
+        return int(np.sign(move)) if abs(move) >= min_atr else 0
+
+    narrow = [length for length in range(min_bars, min(max_bars, end + 1) + 1)
+              if high[end - length + 1:end + 1].max() - low[end - length + 1:end + 1].min() <= threshold * atr_values[end]]
+    for length in reversed(narrow):
+        if trend(length):
+            return length, trend(length)
+    return (narrow[-1], 0) if narrow else (0, 0)
+
+
+@pytest.mark.parametrize('params', [(10, 50, 3.0, 100, 5.0), (5, 40, 6.0, 30, 2.0), (1, 7, 8.0, 3, 0.5)])
+def test_find_accumulation_ranges_matches_brute_force(params):
+    high, low, close = _random_walk(2000, seed=7)
+    atr_values = atr(high, low, close)
+    result = find_accumulation_ranges(high, low, close, atr_values, *params)
+
+    for end in range(len(close)):
+        length, trend = _brute_force(high, low, close, atr_values, end, *params)
+        assert (result['length'][end], result['prior_trend'][end]) == (length, trend), end
+        if length:
+            assert result['range_high'][end] == high[end - length + 1:end + 1].max()
+            assert result['range_low'][end] == low[end - length + 1:end + 1].min()
@@ -0,0 +1,23 @@
+# tests/test_bars.py
+import numpy as np
+import pytest
+
+from src.core.bars import BarSeries
+
+
+def _bars(n=10):
+    timestamps = np.arange(n, dtype=np.int64) * 300_000_000_000
+    prices = np.linspace(1.0, 2.0, n)
+    return BarSeries.from_arrays(timestamps, prices, prices + 0.1, prices - 0.1, prices)
+
+
+def test_columns_and_slices_are_read_only():
+    bars = _bars()
+    window = bars[2:5]
+    for values in (bars['Close'], bars.timestamps, window['High'], window.timestamps):
+        with pytest.raises(ValueError):
+            values[0] = 0
+
+    bars.append(10 * 300_000_000_000, 3.0, 3.1, 2.9, 3.0)
+    assert bars['Close'][-1] == 3.0
+    assert len(window) == 3
@@ -0,0 +1,113 @@
+# tests/test_data_cache.py
+# Загрузка истории и кэш свечей без сети: источник — фейковый fetcher поверх DataFrame.
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.data_cache import OHLCVCache
+from src.utils.history_downloader import ChunkedFetcher, find_gaps, plan_date_windows
+
+
+def _history(start='2024-01-01', end='2024-03-01', freq='5min'):
+    index = pd.date_range(start, end, freq=freq, name='Timestamp')
+    index = index[index.dayofweek < 5]
+    close = np.arange(len(index), dtype=np.float64)
+    return pd.DataFrame({'Open': close, 'High': close + 0.5, 'Low': close - 0.5, 'Close': close,
+                         'Volume': 1.0}, index=index)
+
+
+class FakeFetcher:
+    """fetcher(symbol, interval, start, end) по готовому DataFrame; запоминает запросы."""
+
+    def __init__(self, data, max_bars=None, failures=0):
+        self.data = data
+        self.max_bars = max_bars
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, symbol, interval, start_date=None, end_date=None):
+        self.calls.append((start_date, end_date))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("timeout")
+        data = self.data
+        if start_date is not None:
+            data = data[data.index >= start_date]
+        if end_date is not None:
+            data = data[data.index <= end_date]
+        if self.max_bars is not None:
+            data = data.iloc[-self.max_bars:]
+        return data.copy()
+
+
+def _chunked(fetcher, **kwargs):
+    kwargs.setdefault('bars_per_request', 1000)
+    return ChunkedFetcher(fetcher, max_calls_per_minute=None, retry_delay=0.0, verbose=False, **kwargs)
+
+
+def test_plan_date_windows_cover_range_without_overlap():
+    windows = plan_date_windows('2024-01-01', '2024-01-10', '5min', 1000)
+    ordered = sorted(windows)
+    assert ordered[0][0] == pd.Timestamp('2024-01-01') and ordered[-1][1] == pd.Timestamp('2024-01-10')
+    for (_, end), (start, _) in zip(ordered, ordered[1:]):
+        assert start == end + pd.Timedelta('5min')
+
+
+def test_chunked_fetcher_stitches_windows_beyond_outputsize():
+    history = _history()
+    fetcher = FakeFetcher(history, max_bars=1000)
+
+    df = _chunked(fetcher)('EUR/USD', '5min', '2024-01-01', '2024-02-01')
+
+    expected = history[history.index <= '2024-02-01']
+    assert len(fetcher.calls) > 1
+    assert df.index.equals(expected.index)
+
+
+def test_chunked_fetcher_retries_then_raises():
+    history = _history()
+    assert len(_chunked(FakeFetcher(history, failures=2), max_retries=2)('EUR/USD', '5min', '2024-01-01',
+                                                                         '2024-01-02'))
+    with pytest.raises(RuntimeError):
+        _chunked(FakeFetcher(history, failures=3), max_retries=2)('EUR/USD', '5min', '2024-01-01', '2024-01-02')
+
+
+def test_find_gaps_skips_weekends_but_not_long_holes():
+    history = _history()
+    assert find_gaps(history.index, '5min').empty
+
+    holed = history[(history.index < '2024-01-19 12:00') | (history.index >= '2024-01-24')]
+    gaps = find_gaps(holed.index, '5min')
+    assert list(gaps['gap_start']) == [pd.Timestamp('2024-01-19 11:55')]
+
+
+def test_cache_fills_head_interior_and_tail_once(tmp_path):
+    history = _history()
+    available = history[history.index >= '2024-01-10']
+    # Дыра, которую источник заполнить не может (нет котировок)
+    available = available.drop(available.index[(available.index >= '2024-02-05 10:00')
+                                                & (available.index < '2024-02-05 12:00')])
+    fetcher = FakeFetcher(available)
+    cache = OHLCVCache(str(tmp_path), fetcher)
+    cache.store('EUR/USD', '5min', available[(available.index < '2024-01-15') | (available.index >= '2024-01-17')]
+                .loc[:'2024-02-10'])
+
+    df = cache.get('EUR/USD', '5min', start='2024-01-01', end='2024-02-20')
+    assert df.index.equals(available[available.index <= '2024-02-20'].index)
+
+    # Повторный запуск (в том числе новым экземпляром): голова и дыры уже проверены
+    fetcher.calls.clear()
+    again = OHLCVCache(str(tmp_path), fetcher).get('EUR/USD', '5min', start='2024-01-01', end='2024-02-20')
+    assert fetcher.calls == []
+    assert again.index.equals(df.index)
+
+    # Более ранний start запрашивает только непроверенную часть головы
+    cache.get('EUR/USD', '5min', start='2023-12-25', end='2024-02-20')
+    assert fetcher.calls == [(pd.Timestamp('2023-12-25'), pd.Timestamp('2023-12-31 23:55'))]
+
+
+def test_cache_without_fetcher_is_read_only(tmp_path):
+    history = _history()
+    OHLCVCache(str(tmp_path)).store('EUR/USD', '5min', history.iloc[:100])
+    df = OHLCVCache(str(tmp_path)).get('EUR/USD', '5min', end=history.index[49])
+    assert df.index.equals(history.index[:50])
@@ -0,0 +1,37 @@
+# tests/test_liquidity.py
+import numpy as np
+import pytest
+
+from src.core.amd_cycle import label_amd_phases
+from src.core.liquidity import LiquiditySweepDetector, detect_liquidity_sweeps
+
+
+def _random_walk(n=1500, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0.0, 2e-4, n))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    high = np.maximum(open_, close) + np.abs(rng.normal(0.0, 1e-4, n))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0.0, 1e-4, n))
+    return high, low, close
+
+
+@pytest.mark.parametrize('is_sweeping_below_ssl', [True, False])
+@pytest.mark.parametrize('recovery_bars', [1, 3])
+def test_streaming_detector_matches_batch(recovery_bars, is_sweeping_below_ssl):
+    high, low, close = _random_walk()
+    level = float(np.median(close))
+    sweeps = detect_liquidity_sweeps(high, low, close, level, is_sweeping_below_ssl, recovery_bars=recovery_bars)
+
+    detector = LiquiditySweepDetector(level, is_sweeping_below_ssl, recovery_bars=recovery_bars)
+    confirmed = [i for i in range(len(close)) if detector.update(high[i], low[i], close[i])[0]]
+    assert confirmed == sweeps['recovery_index'][sweeps['confirmed']].tolist()
+
+
+def test_recovery_bars_below_one_rejected_everywhere():
+    high, low, close = _random_walk(100)
+    with pytest.raises(ValueError):
+        detect_liquidity_sweeps(high, low, close, float(close[0]), recovery_bars=0)
+    with pytest.raises(ValueError):
+        LiquiditySweepDetector(float(close[0]), recovery_bars=0)
+    with pytest.raises(ValueError):
+        label_amd_phases(high, low, close, np.full(len(close), 1e-4), recovery_bars=0)
@@ -0,0 +1,22 @@
+# tests/test_optimizer.py
+import pandas as pd
+
+from src.backtest.optimizer import engine_kwargs_with_durations
+from src.utils.context_alignment import ContextCursor
+
+
+def test_default_engine_kwargs_do_not_expose_unclosed_context_bars():
+    execution_index = pd.date_range('2024-01-01 10:00', periods=6, freq='5min')
+    context_index = pd.date_range('2024-01-01 10:00', periods=2, freq='15min')
+
+    kwargs = engine_kwargs_with_durations(None, '15min', '5min')
+    cursor = ContextCursor(context_index, execution_index, kwargs['context_bar_duration'],
+                           kwargs['execution_bar_duration'])
+    # M15 10:00 доступна только с M5 10:10 (обе закрываются в 10:15)
+    assert cursor.positions.tolist() == [0, 0, 1, 1, 1, 2]
+
+
+def test_explicit_durations_override_intervals():
+    kwargs = engine_kwargs_with_durations({'context_bar_duration': pd.Timedelta('1h')}, '15min', '5min')
+    assert kwargs['context_bar_duration'] == pd.Timedelta('1h')
+    assert kwargs['execution_bar_duration'] == pd.Timedelta('5min')
@@ -0,0 +1,103 @@
+# tests/test_poi_registry.py
+import random
+
+import numpy as np
+
+from src.core.indicators import atr
+from src.core.poi_registry import (
+    POIRegistry, ZONE_STATUS_ACTIVE, ZONE_STATUS_EXPIRED, ZONE_STATUS_INVERTED, ZONE_STATUS_MITIGATED, zone_schedule,
+)
+from src.core.pois import OrderBlockDetector
+
+
+def _statuses(events):
+    return {(zone['type'], zone['status']) for zone in events}
+
+
+def test_gap_down_through_bullish_fvg_inverts_it():
+    registry = POIRegistry()
+    registry.add_zone('bullish_fvg', 1.1, 1.0, 0)
+
+    events = registry.update(1, high=0.9, low=0.8, close=0.85)
+
+    assert ('bullish_fvg', ZONE_STATUS_INVERTED) in _statuses(events)
+    assert ('inverted_bearish_fvg', ZONE_STATUS_ACTIVE) in _statuses(events)
+    assert [zone['type'] for zone in registry.zones_at(1.05)] == ['inverted_bearish_fvg']
+
+
+def test_gap_up_through_bearish_fvg_inverts_it():
+    registry = POIRegistry()
+    registry.add_zone('bearish_fvg', 1.1, 1.0, 0)
+
+    events = registry.update(1, high=1.3, low=1.2, close=1.25)
+
+    assert ('bearish_fvg', ZONE_STATUS_INVERTED) in _statuses(events)
+    assert registry.zones_at(1.05, direction=-1) == []
+
+
+def test_bar_above_support_zone_does_not_touch_it():
+    registry = POIRegistry()
+    zone = registry.add_zone('bullish_ob', 1.1, 1.0, 0)
+
+    assert registry.update(1, high=1.3, low=1.2, close=1.25) == []
+    assert zone['status'] == ZONE_STATUS_ACTIVE
+
+    registry.update(2, high=1.2, low=1.05, close=1.15)
+    assert zone['status'] == ZONE_STATUS_MITIGATED
+
+
+def test_zones_overlapping_matches_brute_force_with_mixed_heights():
+    rng = random.Random(7)
+    registry = POIRegistry()
+    for i in range(2000):
+        bottom = rng.uniform(0.0, 10.0)
+        height = rng.choice([0.0, 0.01, 0.1, 1.0, 5.0]) * rng.random()
+        zone_type = rng.choice(['bullish_fvg', 'bullish_ob', 'bearish_fvg', 'bearish_ob'])
+        registry.add_zone(zone_type, bottom + height, bottom, i)
+        if i % 5 == 0:
+            registry._remove(rng.choice(list(registry._zones.values())))
+
+    for _ in range(500):
+        low = rng.uniform(-1.0, 11.0)
+        high = low + rng.choice([0.0, 0.3, 2.0]) * rng.random()
+        direction = rng.choice([None, 1, -1])
+        expected = sorted((zone for zone in registry.active_zones(direction)
+                           if zone['top'] >= low and zone['bottom'] <= high),
+                          key=lambda zone: (zone['bottom'], zone['id']))
+        assert registry.zones_overlapping(low, high, direction) == expected
+
+
+def test_zones_expire_after_max_age():
+    registry = POIRegistry(max_age_bars=10)
+    zone = registry.add_zone('bullish_fvg', 1.1, 1.0, 0)
+
+    registry.update(10, high=2.0, low=1.9, close=1.95)
+    assert zone['status'] == ZONE_STATUS_ACTIVE
+
+    events = registry.update(11, high=2.0, low=1.9, close=1.95)
+    assert zone in events and zone['status'] == ZONE_STATUS_EXPIRED
+    assert len(registry) == 0
+
+
+def test_zone_schedule_matches_per_bar_detection():
+    rng = np.random.default_rng(3)
+    close = 1.1 + np.cumsum(rng.normal(0.0, 2e-4, 3000))
+    open_ = np.concatenate(([1.1], close[:-1]))
+    wick = np.abs(rng.normal(0.0, 1e-4, (2, len(close))))
+    high, low = np.maximum(open_, close) + wick[0], np.minimum(open_, close) - wick[1]
+    atr_values = atr(high, low, close)
+
+    def run(registry):
+        events = []
+        for i in range(len(close)):
+            events.extend(dict(zone) for zone in registry.update(i, high[i], low[i], close[i], atr_value=atr_values[i],
+                                                                 open_price=open_[i]))
+        return events
+
+    detecting = POIRegistry(0.1, order_block_detector=OrderBlockDetector(), max_age_bars=300)
+    schedule = zone_schedule(open_, high, low, close, atr_values, 0.1, order_block_detector=OrderBlockDetector())
+    scheduled = POIRegistry(0.1, max_age_bars=300, zone_schedule=schedule)
+
+    expected = run(detecting)
+    assert any(zone['type'].endswith('_ob') for zone in expected)
+    assert run(scheduled) == expected
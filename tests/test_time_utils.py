@@ -0,0 +1,49 @@
+# tests/test_time_utils.py
+from datetime import datetime, time
+
+import pandas as pd
+import pytest
+import pytz
+
+from src.config import TRADING_SESSIONS_UTC
+from src.utils.time_utils import SessionCalendar, is_within_trading_session
+
+
+def _reference_lookup(current_dt_utc, sessions_config):
+    # Исходная проверка по datetime.time до компиляции календаря
+    current = current_dt_utc.time()
+    for name, times in sessions_config.items():
+        start = datetime.strptime(times['start'], '%H:%M').time()
+        end = datetime.strptime(times['end'], '%H:%M').time()
+        if start <= end and start <= current <= end:
+            return True, name
+        if start > end and (current >= start or current <= end):
+            return True, name
+    return False, None
+
+
+SESSIONS = [
+    {'London': {'start': '07:00', 'end': '16:00'}},
+    {'Asia': {'start': '22:00', 'end': '05:00'}, 'Point': {'start': '12:00', 'end': '12:00'}},
+    TRADING_SESSIONS_UTC,
+]
+
+
+@pytest.mark.parametrize('sessions', SESSIONS)
+def test_lookup_matches_exact_time_comparison(sessions):
+    index = pd.date_range('2024-01-01', '2024-01-02', freq='7s', tz='UTC')
+    expected = [_reference_lookup(moment, sessions) for moment in index.to_pydatetime()]
+    assert [is_within_trading_session(moment, sessions) for moment in index.to_pydatetime()] == expected
+
+    names = SessionCalendar(sessions).session_names
+    ids = SessionCalendar(sessions).session_ids(index)
+    assert [names[i] if i >= 0 else None for i in ids] == [name for _, name in expected]
+
+
+def test_session_end_minute_boundary():
+    sessions = {'London': {'start': '07:00', 'end': '16:00'}}
+    day = datetime(2024, 1, 1).date()
+    assert is_within_trading_session(datetime.combine(day, time(16, 0), pytz.utc), sessions)[0]
+    assert not is_within_trading_session(datetime.combine(day, time(16, 0, 3), pytz.utc), sessions)[0]
+    assert not is_within_trading_session(datetime.combine(day, time(16, 0, 0, 1), pytz.utc), sessions)[0]
+    assert is_within_trading_session(datetime.combine(day, time(15, 59, 59), pytz.utc), sessions)[0]